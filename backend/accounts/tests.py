@@ -1,3 +1,66 @@
+from django.contrib.auth.models import User
+from django.db import transaction
 from django.test import TestCase
+from accounts import urls as accounts_urls
+from crm.models import UserConfig
+from crm.testing import QueryCountMixin, discover_routes
 
-# Create your tests here.
+class QueryCountTests(QueryCountMixin, TestCase):
+    """
+    Every endpoint in accounts/urls.py must keep its query count independent
+    of the number of users.
+    """
+    SKIPPED = {
+        'logout/': 'ends the session of the test client',
+    }
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.force_login(self.admin)
+        self.routes = discover_routes(accounts_urls, '/api/auth/')
+
+    def make_user(self, i):
+        user = User.objects.create_user(f'user{i}', f'user{i}@example.com')
+        UserConfig.objects.create(user=user, see_all_clients=True)
+        return user
+
+    def populate(self, rows):
+        def populate(n):
+            while len(rows) < n:
+                rows.append(self.make_user(len(rows)))
+        return populate
+
+    def test_every_route_is_covered(self):
+        covered = {'user', 'login/', 'me/'}
+        for key, route in self.routes.items():
+            self.assertTrue(key in covered or key in self.SKIPPED, f"{route} has no query count test")
+
+    def test_user_actions_have_constant_query_counts(self):
+        route = self.routes['user']
+        numbers = iter(range(10 ** 6))
+        payloads = {
+            'create': lambda: {'username': f'new{next(numbers)}', 'password': 'secret', 'config': {'see_all_clients': True}},
+            'update': lambda: {'first_name': 'Ada', 'config': {'see_all_tasks': True}},
+        }
+        for action, (method, detail, _) in route.actions.items():
+            # Each action starts from the admin alone
+            with self.subTest(action=action), transaction.atomic():
+                rows = []
+
+                def request(action=action, method=method, detail=detail):
+                    url = route.action_url(action, rows[0].pk if detail else None)
+                    if action in payloads:
+                        return getattr(self.client, method)(url, payloads[action](), content_type='application/json')
+                    return self.client.get(url)
+
+                self.assertConstantQueries(self.populate(rows), request, f"user {action}")
+                transaction.set_rollback(True)
+
+    def test_login_and_me_have_constant_query_counts(self):
+        rows = []
+        self.assertConstantQueries(
+            self.populate(rows),
+            lambda: self.client.post('/api/auth/login/', {'username': 'admin', 'password': 'admin'}, content_type='application/json'),
+            'login', budget=8
+        )
+        self.assertConstantQueries(self.populate(rows), lambda: self.client.get(self.routes['me/'].url), 'me', budget=4)
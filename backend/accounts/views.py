@@ -39,7 +39,7 @@ class UserView(APIView):
 from rest_framework import viewsets
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all().order_by('id')
+    queryset = User.objects.select_related('config').order_by('id')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
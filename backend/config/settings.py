@@ -21,10 +21,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-5z8@z#mo^xt2y9y)=67i!a1#a$z4pi560cu$oi&j9$ev@*9i_7'
+SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-5z8@z#mo^xt2y9y)=67i!a1#a$z4pi560cu$oi&j9$ev@*9i_7')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', 'True').lower() == 'true'
 
 ALLOWED_HOSTS = ["*"]
 
@@ -47,14 +47,20 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its latency covers the other middleware
+    'crm.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Before CsrfViewMiddleware, which parses the request body
+    'crm.middleware.RequestSizeLimitMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Last, it runs the view itself when profiling
+    'crm.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -89,6 +95,56 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'crm_password'),
         'HOST': os.environ.get('POSTGRES_HOST', 'db'),
         'PORT': '5432',
+        # Persistent connections are validated before reuse instead of being
+        # reopened on every request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# psycopg connection pool (one per worker process). Recommended under ASGI,
+# where persistent connections are not reused across requests. Pooling and
+# CONN_MAX_AGE are mutually exclusive.
+if os.environ.get('DB_POOL', 'False').lower() == 'true':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# CRM_CACHE_BACKEND picks the backend: "redis" (CRM_CACHE_LOCATION) is the
+# one to share between processes, and docker-compose runs it for the web,
+# scheduler, exports and campaigns containers. Invalidations (e.g. of the
+# workflow registry) must reach every process. "locmem" is the default for a
+# single process (runserver, tests) and keeps entries for a short time only;
+# "file" is shared by processes that see the same directory. "db" needs
+# `createcachetable` and puts the cache in the database it offloads, so hot
+# per-request lookups skip it (see crm.services.lookups).
+
+CRM_CACHE_BACKEND = os.environ.get('CRM_CACHE_BACKEND', 'locmem')
+CRM_CACHE_TIMEOUT = int(os.environ.get('CRM_CACHE_TIMEOUT', 30 if CRM_CACHE_BACKEND == 'locmem' else 300))
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'crm'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', '/tmp/crm_cache'),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'crm_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://localhost:6379/1'),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CRM_CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('CRM_CACHE_LOCATION', CACHE_BACKENDS[CRM_CACHE_BACKEND][1]),
+        'TIMEOUT': CRM_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        } if CRM_CACHE_BACKEND != 'redis' else {},
     }
 }
 
@@ -128,12 +184,29 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# Collected by `python manage.py collectstatic` and served by nginx in production
+STATIC_ROOT = os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Logging
+# https://docs.djangoproject.com/en/4.2/topics/logging/
+# crm.* messages (e.g. slow queries) go to stderr
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'crm': {'handlers': ['console'], 'level': os.environ.get('CRM_LOG_LEVEL', 'INFO')},
+    },
+}
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -167,3 +240,69 @@ REST_FRAMEWORK = {
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
 GOOGLE_REDIRECT_URI = os.environ.get('GOOGLE_REDIRECT_URI', 'http://localhost:8000/api/crm/google/callback/')
+GOOGLE_AUTH_URI = os.environ.get('GOOGLE_AUTH_URI', 'https://accounts.google.com/o/oauth2/auth')
+GOOGLE_TOKEN_URI = os.environ.get('GOOGLE_TOKEN_URI', 'https://oauth2.googleapis.com/token')
+# Overrides the Gmail API root, e.g. http://localhost:8025/ for the fake Gmail server
+GMAIL_API_ENDPOINT = os.environ.get('GMAIL_API_ENDPOINT')
+# Upper bound on concurrent Google calls per worker process (async views)
+GMAIL_MAX_CONCURRENCY = int(os.environ.get('GMAIL_MAX_CONCURRENCY', 16))
+
+# Outgoing email uploads
+# Uploads larger than this are spooled to temporary files instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+# Hard limit on the whole send request (body + attachments), checked before parsing
+EMAIL_MAX_REQUEST_SIZE = int(os.environ.get('EMAIL_MAX_REQUEST_SIZE', 25 * 1024 * 1024))
+# Size at which the generated MIME message moves from memory to a temporary file
+EMAIL_SPOOL_MEMORY_SIZE = 1024 * 1024
+# Messages above this size are sent with a resumable upload
+EMAIL_RESUMABLE_THRESHOLD = int(os.environ.get('EMAIL_RESUMABLE_THRESHOLD', 5 * 1024 * 1024))
+
+# Bulk email campaigns (python manage.py run_campaigns)
+CAMPAIGN_BATCH_SIZE = int(os.environ.get('CAMPAIGN_BATCH_SIZE', 100))
+# Concurrent Gmail sends per running campaign
+CAMPAIGN_MAX_CONCURRENCY = int(os.environ.get('CAMPAIGN_MAX_CONCURRENCY', 4))
+# Highest rate_per_second a campaign may ask for
+CAMPAIGN_MAX_RATE = float(os.environ.get('CAMPAIGN_MAX_RATE', 10))
+# Sends per recipient, including retries of failed ones, before giving up
+CAMPAIGN_MAX_ATTEMPTS = int(os.environ.get('CAMPAIGN_MAX_ATTEMPTS', 3))
+
+# Time-based workflow triggers (python manage.py run_scheduler)
+SCHEDULER_BATCH_SIZE = int(os.environ.get('SCHEDULER_BATCH_SIZE', 500))
+SCHEDULER_INTERVAL = float(os.environ.get('SCHEDULER_INTERVAL', 60))
+
+# Saved view counts in the sidebar (kept up to date from signals)
+# Views with relative dates (today, past_n_days, ...) are recomputed this often
+SAVED_VIEW_COUNT_RELATIVE_TTL = int(os.environ.get('SAVED_VIEW_COUNT_RELATIVE_TTL', 300))
+# Every count is recomputed after this long, bounding drift from bulk updates
+SAVED_VIEW_COUNT_MAX_AGE = int(os.environ.get('SAVED_VIEW_COUNT_MAX_AGE', 24 * 3600))
+# Saves trust "some view of this type is counted" for this long per process
+SAVED_VIEW_COUNT_TRACKING_CHECK = float(os.environ.get('SAVED_VIEW_COUNT_TRACKING_CHECK', 5))
+
+# Per-view request metrics, served on /api/crm/metrics/ (staff only)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+# Seconds covered by the p50/p95/p99 of the rolling histograms
+METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', 300))
+# Queries slower than this are logged with the code that ran them (0 disables)
+METRICS_SLOW_QUERY_MS = float(os.environ.get('METRICS_SLOW_QUERY_MS', 0))
+# Directory the worker processes share their metrics through, so /metrics/
+# reports all of them; empty keeps them per process (one process, runserver)
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+
+# Background exports (POST export-view, python manage.py run_exports)
+EXPORT_DIR = os.environ.get('EXPORT_DIR', BASE_DIR / 'exports')
+# Rows read and serialized at a time
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+# Finished exports are kept (and reused for identical requests) this long
+EXPORT_RETENTION_HOURS = float(os.environ.get('EXPORT_RETENTION_HOURS', 24))
+
+# Per-request profiles for staff ("X-Profile: cprofile|sample" or ?_profile=...),
+# listed and downloaded on /api/crm/profiles/
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True').lower() == 'true'
+# Shared by all workers, so any of them can serve a profile
+PROFILING_DIR = os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles')
+# Newest profiles kept, older ones are deleted
+PROFILING_RETENTION = int(os.environ.get('PROFILING_RETENTION', 50))
+PROFILING_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILING_SAMPLE_INTERVAL_MS', 1))
+
+# Statement timeout for filter EXPLAIN ANALYZE (workflows/clients explain endpoints)
+EXPLAIN_STATEMENT_TIMEOUT_MS = int(os.environ.get('EXPLAIN_STATEMENT_TIMEOUT_MS', 10000))
@@ -1,5 +1,7 @@
 from .clients import ClientAdmin, SavedViewAdmin
 from .tasks import TaskAdmin
 from .notes import NoteAdmin
-from .emails import EmailAdmin, EmailTemplateAdmin
+from .emails import EmailAdmin, EmailContentAdmin, EmailTemplateAdmin, EmailThreadAdmin
 from .tokens import GoogleTokenAdmin
+from .campaigns import CampaignAdmin
+from .exports import ExportJobAdmin
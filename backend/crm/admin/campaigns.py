@@ -0,0 +1,14 @@
+from django.contrib import admin
+from crm.models.campaigns import Campaign, CampaignFailure
+
+class CampaignFailureInline(admin.TabularInline):
+    model = CampaignFailure
+    fields = ('client', 'error', 'attempts', 'updated_at')
+    readonly_fields = fields
+    extra = 0
+
+@admin.register(Campaign)
+class CampaignAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'status', 'sent_count', 'failed_count', 'total_count', 'created_at')
+    list_filter = ('status',)
+    inlines = (CampaignFailureInline,)
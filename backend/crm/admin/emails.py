@@ -1,5 +1,5 @@
 from django.contrib import admin
-from crm.models.emails import Email, EmailTemplate
+from crm.models.emails import Email, EmailContent, EmailTemplate, EmailThread
 
 @admin.register(EmailTemplate)
 class EmailTemplateAdmin(admin.ModelAdmin):
@@ -9,3 +9,15 @@ class EmailTemplateAdmin(admin.ModelAdmin):
 @admin.register(Email)
 class EmailAdmin(admin.ModelAdmin):
     list_display = ('subject', 'from_email', 'to_email', 'timestamp')
+    raw_id_fields = ('html_content', 'text_content', 'email_thread')
+
+@admin.register(EmailThread)
+class EmailThreadAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'user', 'client', 'message_count', 'last_message_at')
+    search_fields = ('subject', 'thread_id')
+    raw_id_fields = ('client',)
+
+@admin.register(EmailContent)
+class EmailContentAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'size', 'compressed', 'created_at')
+    search_fields = ('content_hash',)
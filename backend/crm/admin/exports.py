@@ -0,0 +1,7 @@
+from django.contrib import admin
+from crm.models.exports import ExportJob
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'owner', 'view_type', 'file_format', 'status', 'rows_written', 'total_count', 'created_at')
+    list_filter = ('status', 'view_type', 'file_format')
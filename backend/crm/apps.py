@@ -7,3 +7,5 @@ class CrmConfig(AppConfig):
 
     def ready(self):
         import crm.signals.workflow_handlers
+        import crm.signals.version_handlers
+        import crm.signals.view_count_handlers
@@ -0,0 +1,156 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+
+KEY_PREFIX = 'crm'
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+_MISSING = object()
+# Striped locks coalesce concurrent recomputes of the same key inside one process
+_local_locks = [threading.Lock() for _ in range(64)]
+_stats = defaultdict(lambda: defaultdict(int))
+_stats_lock = threading.Lock()
+
+def _cache():
+    return caches[getattr(settings, 'CRM_CACHE_ALIAS', 'default')]
+
+def is_database_backed():
+    """
+    True when the cache lives in the database, where a lookup costs more
+    queries than it saves on cheap single-row reads.
+    """
+    return isinstance(_cache(), DatabaseCache)
+
+def _default_timeout():
+    return getattr(settings, 'CRM_CACHE_TIMEOUT', 300)
+
+def _record(namespace, event, amount=1):
+    with _stats_lock:
+        _stats[namespace][event] += amount
+
+def _generation_key(namespace):
+    return f"{KEY_PREFIX}:gen:{namespace}"
+
+def _new_generation():
+    # Random, so an evicted generation never resurrects entries written under
+    # an older one, and two concurrent invalidations never settle on the same
+    # value (incr is a read and a write on the database backend)
+    return secrets.randbits(62)
+
+def get_generations(namespaces):
+    """
+    Returns {namespace: generation} fetched in one cache round-trip,
+    initializing the namespaces that have no generation yet.
+    """
+    cache = _cache()
+    keys = {_generation_key(ns): ns for ns in namespaces}
+    found = cache.get_many(list(keys))
+    generations = {}
+    for key, namespace in keys.items():
+        if key not in found:
+            cache.add(key, _new_generation(), timeout=None)
+            found[key] = cache.get(key, _new_generation())
+        generations[namespace] = found[key]
+    return generations
+
+def make_key(namespace, key, depends_on=()):
+    """
+    Builds a namespaced cache key that embeds the generation of the namespace
+    and of every namespace it depends on, so bumping any of them orphans it.
+    """
+    namespaces = [namespace, *depends_on]
+    generations = get_generations(namespaces)
+    version = ':'.join(str(generations[ns]) for ns in namespaces)
+    raw = f"{version}:{key}"
+    if len(raw) > 150:
+        raw = hashlib.sha1(raw.encode()).hexdigest()
+    return f"{KEY_PREFIX}:{namespace}:{raw}"
+
+def invalidate(*namespaces):
+    """
+    Orphans every entry stored under the given namespaces (or depending on them).
+    """
+    cache = _cache()
+    for namespace in namespaces:
+        cache.set(_generation_key(namespace), _new_generation(), timeout=None)
+        _record(namespace, 'invalidations')
+
+def get(namespace, key, depends_on=(), default=None):
+    value = _cache().get(make_key(namespace, key, depends_on), _MISSING)
+    if value is _MISSING:
+        _record(namespace, 'misses')
+        return default
+    _record(namespace, 'hits')
+    return value
+
+def set(namespace, key, value, depends_on=(), timeout=_MISSING):
+    if timeout is _MISSING:
+        timeout = _default_timeout()
+    _cache().set(make_key(namespace, key, depends_on), value, timeout)
+
+def get_or_compute(namespace, key, compute, depends_on=(), timeout=_MISSING):
+    """
+    Returns the cached value for key, calling compute() on a miss.
+
+    Recomputes are single-flight: inside a process concurrent callers wait on
+    a striped lock, across processes they wait on a short-lived lock entry in
+    the shared cache and reuse the value written by whoever holds it.
+    """
+    if timeout is _MISSING:
+        timeout = _default_timeout()
+    cache = _cache()
+    full_key = make_key(namespace, key, depends_on)
+
+    value = cache.get(full_key, _MISSING)
+    if value is not _MISSING:
+        _record(namespace, 'hits')
+        return value
+    _record(namespace, 'misses')
+
+    local_lock = _local_locks[hash(full_key) % len(_local_locks)]
+    with local_lock:
+        value = cache.get(full_key, _MISSING)
+        if value is not _MISSING:
+            _record(namespace, 'waits')
+            return value
+
+        lock_key = f"{full_key}:lock"
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            # Another process is computing this value, wait for it
+            deadline = time.monotonic() + LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                value = cache.get(full_key, _MISSING)
+                if value is not _MISSING:
+                    _record(namespace, 'waits')
+                    return value
+            lock_key = None
+
+        try:
+            started = time.perf_counter()
+            value = compute()
+            _record(namespace, 'computes')
+            _record(namespace, 'compute_ms', int((time.perf_counter() - started) * 1000))
+            cache.set(full_key, value, timeout)
+        finally:
+            if lock_key:
+                cache.delete(lock_key)
+        return value
+
+def stats():
+    """
+    Per-namespace hit/miss/compute counters for this process.
+    Owner-scoped namespaces ("workflow:12") are folded into their model label.
+    """
+    totals = defaultdict(lambda: defaultdict(int))
+    with _stats_lock:
+        for namespace, counters in _stats.items():
+            for event, amount in counters.items():
+                totals[namespace.split(':', 1)[0]][event] += amount
+    return {namespace: dict(counters) for namespace, counters in totals.items()}
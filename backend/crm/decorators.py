@@ -0,0 +1,45 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import BasicAuthentication, CSRFCheck
+from rest_framework.exceptions import AuthenticationFailed
+
+def async_login_required(view):
+    """
+    Session and HTTP Basic authentication for plain async Django views, which
+    DRF's authentication classes do not cover. Like DRF, CSRF is only checked
+    for session users, and failures are answered the way DRF answers them.
+    """
+    @csrf_exempt
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if user.is_authenticated:
+            check = CSRFCheck(lambda request: None)
+            check.process_request(request)
+            reason = check.process_view(request, None, (), {})
+            if reason:
+                return JsonResponse({'detail': f'CSRF Failed: {reason}'}, status=403)
+        else:
+            try:
+                result = await sync_to_async(BasicAuthentication().authenticate)(request)
+            except AuthenticationFailed as e:
+                return JsonResponse({'detail': str(e.detail)}, status=403)
+            if result is None:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+            user = result[0]
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+def max_request_size(setting):
+    """
+    Limits the whole request to the number of bytes in settings.<setting>,
+    enforced by crm.middleware.RequestSizeLimitMiddleware before the body
+    is parsed. Must be the outermost decorator.
+    """
+    def decorator(view):
+        view.max_request_size_setting = setting
+        return view
+    return decorator
@@ -0,0 +1,338 @@
+"""
+Minimal in-process stand-in for the Gmail API (messages.list/get/send,
+history.list, getProfile) and Google's OAuth endpoints, used by benchmarks
+and load tests so GoogleService can run end to end without network access.
+Latency, jitter and an error rate (429/503 answers) are configurable, and
+new mail can arrive at a fixed rate.
+
+Point the backend at it with:
+    GMAIL_API_ENDPOINT=http://localhost:8025/
+    GOOGLE_AUTH_URI=http://localhost:8025/auth
+    GOOGLE_TOKEN_URI=http://localhost:8025/token
+    OAUTHLIB_INSECURE_TRANSPORT=1  (the OAuth code exchange runs over http)
+"""
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlparse, parse_qs
+
+MESSAGE_PATH = re.compile(r'^/gmail/v1/users/[^/]+/messages/(?P<id>[^/]+)$')
+SCOPES = ['https://www.googleapis.com/auth/gmail.readonly', 'https://www.googleapis.com/auth/gmail.send']
+# Gmail's answers to throttled and failing requests
+ERRORS = [
+    (429, 'rateLimitExceeded', 'User-rate limit exceeded'),
+    (503, 'backendError', 'The service is currently unavailable'),
+]
+
+def _part(mime_type, text):
+    return {'mimeType': mime_type, 'body': {'data': base64.urlsafe_b64encode(text.encode()).decode()}}
+
+class FakeGmailState:
+    def __init__(self, messages=10, latency_ms=0, jitter_ms=0, error_rate=0.0, senders=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.senders = senders or [f"client{i}@example.com" for i in range(max(messages, 1))]
+        self.lock = threading.Lock()
+        self.mailbox = {}
+        # history.list records, one per added message, in historyId order
+        self.history = []
+        self.history_id = 1000
+        self.sent = []
+        self.uploads = {}
+        self.request_count = 0
+        self.error_count = 0
+        for i in range(messages):
+            self.add_message(
+                from_email=self.senders[i % len(self.senders)],
+                subject=f"Message {i}",
+                body=f"Hello from client {i}"
+            )
+
+    def add_message(self, from_email, subject, body, to_email='me@example.com', thread_id=None, labels=('INBOX',), html=None):
+        message_id = uuid.uuid4().hex[:16]
+        content = _part('text/plain', body)
+        if html:
+            # Like most mail clients send it
+            content = {'mimeType': 'multipart/alternative', 'parts': [content, _part('text/html', html)]}
+        with self.lock:
+            self.history_id += 1
+            message = {
+                'id': message_id,
+                'threadId': thread_id or message_id,
+                'labelIds': list(labels),
+                'historyId': str(self.history_id),
+                'internalDate': str(int(time.time() * 1000)),
+                'payload': {
+                    'headers': [
+                        {'name': 'From', 'value': f"Client <{from_email}>"},
+                        {'name': 'To', 'value': to_email},
+                        {'name': 'Subject', 'value': subject},
+                    ],
+                    **content,
+                },
+            }
+            self.mailbox[message_id] = message
+            summary = {'id': message_id, 'threadId': message['threadId'], 'labelIds': message['labelIds']}
+            self.history.append({
+                'id': str(self.history_id),
+                'messages': [summary],
+                'messagesAdded': [{'message': summary}],
+            })
+        return message_id
+
+    def add_random_message(self):
+        sender = self.random.choice(self.senders)
+        return self.add_message(sender, f"Update from {sender}", f"Hello, a new message from {sender}.")
+
+    def fail_next(self):
+        """
+        Whether to answer the current request with an error, per error_rate.
+        """
+        if not self.error_rate:
+            return None
+        with self.lock:
+            if self.random.random() >= self.error_rate:
+                return None
+            self.error_count += 1
+            return self.random.choice(ERRORS)
+
+    def delay(self):
+        with self.lock:
+            self.request_count += 1
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        delay = max(self.latency_ms + jitter, 0)
+        if delay:
+            time.sleep(delay / 1000)
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeGmail/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _begin(self):
+        """
+        Applies the latency and returns False after answering with an error.
+        """
+        self.state.delay()
+        error = self.state.fail_next()
+        if error:
+            status, reason, message = error
+            self._read_body()
+            self._json({'error': {'code': status, 'message': message, 'errors': [{'reason': reason, 'message': message}]}}, status=status)
+            return False
+        return True
+
+    def _json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _page(self, items, query):
+        # pageToken is the offset of the page
+        limit = int(query.get('maxResults', ['100'])[0])
+        offset = int(query.get('pageToken', ['0'])[0])
+        page = items[offset:offset + limit]
+        next_token = str(offset + limit) if offset + limit < len(items) else None
+        return page, next_token
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == '/auth':
+            # Consent granted at once: back to the app with a code
+            redirect = query.get('redirect_uri', [''])[0]
+            params = {'code': uuid.uuid4().hex, 'scope': query.get('scope', [''])[0]}
+            if 'state' in query:
+                params['state'] = query['state'][0]
+            self.send_response(302)
+            self.send_header('Location', f"{redirect}{'&' if '?' in redirect else '?'}{urlencode(params)}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if not self._begin():
+            return
+
+        if re.match(r'^/gmail/v1/users/[^/]+/messages$', url.path):
+            with self.state.lock:
+                # Newest first, like Gmail
+                messages = list(reversed(self.state.mailbox.values()))
+            page, next_token = self._page(messages, query)
+            payload = {
+                'messages': [{'id': m['id'], 'threadId': m['threadId']} for m in page],
+                'resultSizeEstimate': len(messages),
+            }
+            if next_token:
+                payload['nextPageToken'] = next_token
+            return self._json(payload)
+
+        if re.match(r'^/gmail/v1/users/[^/]+/history$', url.path):
+            try:
+                start = int(query.get('startHistoryId', [''])[0])
+            except ValueError:
+                return self._json({'error': {'code': 400, 'message': 'Invalid startHistoryId'}}, status=400)
+            with self.state.lock:
+                records = [record for record in self.state.history if int(record['id']) > start]
+                history_id = self.state.history_id
+            page, next_token = self._page(records, query)
+            payload = {'historyId': str(history_id)}
+            if page:
+                payload['history'] = page
+            if next_token:
+                payload['nextPageToken'] = next_token
+            return self._json(payload)
+
+        if re.match(r'^/gmail/v1/users/[^/]+/profile$', url.path):
+            with self.state.lock:
+                return self._json({
+                    'emailAddress': 'me@example.com',
+                    'messagesTotal': len(self.state.mailbox),
+                    'threadsTotal': len({m['threadId'] for m in self.state.mailbox.values()}),
+                    'historyId': str(self.state.history_id),
+                })
+
+        match = MESSAGE_PATH.match(url.path)
+        if match:
+            message = self.state.mailbox.get(match.group('id'))
+            if not message:
+                return self._json({'error': {'code': 404, 'message': 'Not Found'}}, status=404)
+            return self._json(message)
+
+        return self._json({'error': {'code': 404, 'message': 'Not Found'}}, status=404)
+
+    def do_POST(self):
+        if not self._begin():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self._read_body()
+
+        if url.path == '/token':
+            token = {'access_token': uuid.uuid4().hex, 'expires_in': 3600, 'token_type': 'Bearer'}
+            form = parse_qs(body.decode())
+            if form.get('grant_type', [''])[0] == 'authorization_code':
+                token['refresh_token'] = uuid.uuid4().hex
+                token['scope'] = ' '.join(SCOPES)
+            return self._json(token)
+
+        if re.match(r'^/gmail/v1/users/[^/]+/messages/send$', url.path):
+            payload = json.loads(body or b'{}')
+            return self._json(self._record_sent(payload.get('threadId'), len(payload.get('raw', '')), 'raw'))
+
+        if re.match(r'^/upload/gmail/v1/users/[^/]+/messages/send$', url.path):
+            upload_type = query.get('uploadType', ['multipart'])[0]
+            if upload_type == 'resumable':
+                # Metadata only, the message follows in PUT requests to the session URL
+                session_id = uuid.uuid4().hex
+                metadata = json.loads(body) if body.strip() else {}
+                with self.state.lock:
+                    self.state.uploads[session_id] = {'threadId': metadata.get('threadId'), 'received': 0}
+                host, port = self.server.server_address[:2]
+                self.send_response(200)
+                self.send_header('Location', f"http://{host}:{port}/upload/session/{session_id}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            # multipart/related: JSON metadata part followed by the message/rfc822 part
+            match = re.search(rb'"threadId"\s*:\s*"([^"]+)"', body)
+            thread_id = match.group(1).decode() if match else None
+            return self._json(self._record_sent(thread_id, len(body), 'multipart'))
+
+        return self._json({'error': {'code': 404, 'message': 'Not Found'}}, status=404)
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        match = re.match(r'^/upload/session/(?P<id>[^/]+)$', url.path)
+        upload = self.state.uploads.get(match.group('id')) if match else None
+        if not upload:
+            return self._json({'error': {'code': 404, 'message': 'Not Found'}}, status=404)
+
+        chunk = self._read_body()
+        upload['received'] += len(chunk)
+        # Content-Range: bytes 0-262143/1048576 (total is "*" until known)
+        total = self.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+        if total != '*' and upload['received'] >= int(total):
+            self.state.delay()
+            self.state.uploads.pop(match.group('id'), None)
+            return self._json(self._record_sent(upload['threadId'], upload['received'], 'resumable'))
+
+        self.send_response(308)
+        self.send_header('Range', f"bytes=0-{upload['received'] - 1}")
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _record_sent(self, thread_id, size, upload_type):
+        # Sent mail shows up in the mailbox and in history.list like in Gmail
+        message_id = self.state.add_message('me@example.com', '(sent)', '', thread_id=thread_id, labels=('SENT',))
+        thread_id = self.state.mailbox[message_id]['threadId']
+        with self.state.lock:
+            self.state.sent.append({'id': message_id, 'threadId': thread_id, 'size': size, 'upload': upload_type})
+        return {'id': message_id, 'threadId': thread_id, 'labelIds': ['SENT']}
+
+class FakeGmailServer:
+    """
+    Threaded fake Gmail server. Use as a context manager or call start()/stop().
+    """
+    def __init__(self, host='127.0.0.1', port=0, arrivals_per_second=0, **state_options):
+        self.httpd = ThreadingHTTPServer((host, port), FakeGmailHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = FakeGmailState(**state_options)
+        self.thread = None
+        self.arrivals_per_second = arrivals_per_second
+        self._stopped = threading.Event()
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def _deliver(self):
+        # New inbound mail at a steady rate, so syncs keep finding work
+        interval = 1 / self.arrivals_per_second
+        while not self._stopped.wait(interval):
+            self.state.add_random_message()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.start_arrivals()
+        return self
+
+    def start_arrivals(self):
+        if self.arrivals_per_second:
+            threading.Thread(target=self._deliver, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,200 @@
+"""
+Scripted user journeys for `python manage.py loadtest --journeys`.
+
+Every virtual user logs in with its own account and repeatedly picks a
+journey by weight: browsing saved views, searching, opening a client's
+timeline, creating a task, sending an email or syncing the inbox. Each HTTP
+call is timed under a step name (e.g. "timeline.notes"). The email journeys
+need the backend pointed at the fake Gmail server (python manage.py
+fake_gmail), and connect_gmail() runs the OAuth flow against it.
+"""
+import json
+import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+API = '/api/crm'
+SEARCH_TERMS = ['acme', 'corp', 'labs', 'nova', 'summit', 'group', '12', 'stark']
+TASK_TITLES = ['Follow up call', 'Send proposal', 'Prepare demo', 'Check invoice']
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class Session:
+    """
+    Cookie-based API session of one virtual user. Calls record
+    (step, seconds, status) samples; failed calls raise StepFailed.
+    """
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.jar = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.jar))
+        self.samples = []
+        self.client_ids = []
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.jar if cookie.name == 'csrftoken'), '')
+
+    def call(self, step, method, path, params=None, data=None):
+        url = f"{self.base_url}{path}"
+        if params:
+            url = f"{url}?{urllib.parse.urlencode(params)}"
+        body = json.dumps(data).encode() if data is not None else None
+        headers = {'Content-Type': 'application/json', 'X-CSRFToken': self.csrf_token()}
+        request = urllib.request.Request(url, data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                content = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            self.samples.append((step, time.perf_counter() - started, e.code))
+            raise StepFailed(step, e.code)
+        except OSError as e:
+            self.samples.append((step, time.perf_counter() - started, type(e).__name__))
+            raise StepFailed(step, type(e).__name__)
+        self.samples.append((step, time.perf_counter() - started, status))
+        if response.headers.get_content_type() == 'application/json' and content:
+            return json.loads(content)
+        return content
+
+    def login(self, username, password):
+        self.call('login', 'POST', '/api/auth/login/', data={'username': username, 'password': password})
+
+    def remember_clients(self, page):
+        results = page.get('results', []) if isinstance(page, dict) else []
+        ids = [client['id'] for client in results]
+        if ids:
+            # A bounded sample of the clients this user has seen
+            self.client_ids = (self.client_ids + ids)[-200:]
+
+class StepFailed(Exception):
+    def __init__(self, step, status):
+        super().__init__(f"{step}: {status}")
+        self.step = step
+        self.status = status
+
+def connect_gmail(session):
+    """
+    Runs the Google OAuth flow against the fake server: the backend's auth
+    URL redirects straight back to the callback with a code.
+    """
+    auth_url = session.call('gmail.auth_url', 'GET', f'{API}/google/auth/')['url']
+    opener = urllib.request.build_opener(NoRedirect)
+    try:
+        opener.open(auth_url, timeout=session.timeout)
+        raise StepFailed('gmail.consent', 'no redirect')
+    except urllib.error.HTTPError as e:
+        if e.code != 302:
+            raise StepFailed('gmail.consent', e.code)
+        callback = urllib.parse.urlparse(e.headers['Location'])
+    session.call('gmail.callback', 'GET', callback.path, params=dict(urllib.parse.parse_qsl(callback.query)))
+
+def _client_id(session, rng):
+    if not session.client_ids:
+        session.remember_clients(session.call('clients.list', 'GET', f'{API}/clients/'))
+    return rng.choice(session.client_ids) if session.client_ids else None
+
+def browse_views(session, rng):
+    view_type = rng.choice(['client', 'task'])
+    views = session.call('views.list', 'GET', f'{API}/saved-views/', {'view_type': view_type})
+    session.call('views.counts', 'GET', f'{API}/saved-views/counts/', {'view_type': view_type})
+    if not views:
+        return
+    view = rng.choice(views)
+    path = f'{API}/clients/' if view_type == 'client' else f'{API}/tasks/'
+    page = session.call(f'views.{view_type}_list', 'GET', path, {'view_id': view['id']})
+    if view_type == 'client':
+        session.remember_clients(page)
+    if isinstance(page, dict) and page.get('next'):
+        session.call(f'views.{view_type}_page', 'GET', path, {'view_id': view['id'], 'page': 2})
+
+def search(session, rng):
+    term = rng.choice(SEARCH_TERMS)
+    session.remember_clients(session.call('search.clients', 'GET', f'{API}/clients/', {'search': term}))
+    session.call('search.tasks', 'GET', f'{API}/tasks/', {'search': term})
+
+def open_timeline(session, rng):
+    client_id = _client_id(session, rng)
+    if client_id is None:
+        return
+    session.call('timeline.client', 'GET', f'{API}/clients/{client_id}/')
+    session.call('timeline.notes', 'GET', f'{API}/notes/', {'client_id': client_id})
+    session.call('timeline.tasks', 'GET', f'{API}/tasks/', {'client_id': client_id})
+    session.call('timeline.emails', 'GET', f'{API}/emails/', {'client_id': client_id})
+
+def create_task(session, rng):
+    client_id = _client_id(session, rng)
+    if client_id is None:
+        return
+    session.call('task.create', 'POST', f'{API}/tasks/', data={
+        'title': rng.choice(TASK_TITLES),
+        'client': client_id,
+        'priority': rng.choice(['low', 'medium', 'high']),
+    })
+
+def send_email(session, rng):
+    client_id = _client_id(session, rng)
+    if client_id is None:
+        return
+    client = session.call('email.client', 'GET', f'{API}/clients/{client_id}/')
+    session.call('email.send', 'POST', f'{API}/emails/send/', data={
+        'to_email': client['email'],
+        'subject': 'Following up',
+        'body': '<p>Hello, just following up on our last conversation.</p>' * rng.randint(1, 20),
+        'client_id': client_id,
+    })
+
+def sync(session, rng):
+    session.call('email.sync', 'POST', f'{API}/emails/sync/')
+
+JOURNEYS = {
+    'browse': browse_views,
+    'search': search,
+    'timeline': open_timeline,
+    'create_task': create_task,
+    'send_email': send_email,
+    'sync': sync,
+}
+# Share of each journey in the default mix
+DEFAULT_MIX = {'browse': 35, 'search': 20, 'timeline': 25, 'create_task': 10, 'send_email': 5, 'sync': 5}
+
+def parse_mix(value):
+    """
+    "browse=3,search=1" -> {'browse': 3, 'search': 1}, a bare name weighs 1.
+    """
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in JOURNEYS:
+            raise ValueError(f"Unknown journey {name!r}, choose from {', '.join(JOURNEYS)}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+def run_user(session, mix, deadline, think_ms, seed):
+    """
+    Runs journeys picked by weight until deadline. Returns {journey: runs}
+    and {step: failures}.
+    """
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    runs = {}
+    failures = {}
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        try:
+            JOURNEYS[name](session, rng)
+            runs[name] = runs.get(name, 0) + 1
+        except StepFailed as e:
+            key = f"{e.step} {e.status}"
+            failures[key] = failures.get(key, 0) + 1
+        remaining = deadline - time.monotonic()
+        if think_ms and remaining > 0:
+            # Exponential think time around the mean, like independent users
+            time.sleep(min(rng.expovariate(1000 / think_ms), remaining))
+    return runs, failures
@@ -0,0 +1,234 @@
+"""
+Pure-Python backend for the filter language: evaluates a filter tree against
+an already loaded model instance (or a dict of field values) with the same
+result as filtering the table with build_q_object, without a query.
+
+Semantics follow PostgreSQL: comparisons with NULL are false, exact and
+contains are case-sensitive, the i-variants compare upper-cased text.
+"""
+import datetime
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+from django.utils import timezone
+from crm.filter_optimizer import optimize_filters, USER_FIELDS
+
+class UnsupportedFilter(ValueError):
+    """
+    The filter uses something only the database can evaluate (e.g. a
+    multi-valued relation); callers fall back to a query.
+    """
+
+# Fields whose text form in Python matches the database's cast to text
+TEXT_FIELDS = (models.CharField, models.TextField, models.IntegerField, models.AutoField)
+
+PATTERN_LOOKUPS = {
+    'contains': lambda value, pattern: pattern in value,
+    'icontains': lambda value, pattern: pattern.upper() in value.upper(),
+    'startswith': lambda value, pattern: value.startswith(pattern),
+    'istartswith': lambda value, pattern: value.upper().startswith(pattern.upper()),
+    'endswith': lambda value, pattern: value.endswith(pattern),
+    'iendswith': lambda value, pattern: value.upper().endswith(pattern.upper()),
+    'iexact': lambda value, pattern: value.upper() == pattern.upper(),
+}
+
+COMPARISONS = {
+    'gt': lambda value, other: value > other,
+    'gte': lambda value, other: value >= other,
+    'lt': lambda value, other: value < other,
+    'lte': lambda value, other: value <= other,
+}
+
+def _resolve_field(model, path):
+    """
+    Follows a "client__name" style path and returns (attribute names, field).
+    """
+    parts = path.split('__')
+    attrs = []
+    field = None
+    for index, part in enumerate(parts):
+        if model is None:
+            return parts, None
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            if part == 'pk':
+                field = model._meta.pk
+            else:
+                raise UnsupportedFilter(f"Unknown field {path}")
+        if field.many_to_many or field.one_to_many:
+            raise UnsupportedFilter(f"{path} spans a multi-valued relation")
+        last = index == len(parts) - 1
+        if field.is_relation and last:
+            # Filtering on a foreign key compares its id
+            attrs.append(field.attname)
+            field = field.target_field
+        else:
+            attrs.append(field.name)
+        model = field.related_model if field.is_relation else None
+    return attrs, field
+
+def _getter(path, attrs):
+    def get(obj):
+        if isinstance(obj, dict):
+            # Dicts (e.g. from .values()) are keyed by lookup path or attname
+            for key in (path, '__'.join(attrs)):
+                if key in obj:
+                    value = obj[key]
+                    return value.pk if isinstance(value, models.Model) else value
+            if len(attrs) == 1:
+                raise UnsupportedFilter(f"No value for {path}")
+            obj = obj.get(attrs[0]) if attrs[0] in obj else None
+            if obj is None:
+                raise UnsupportedFilter(f"No value for {path}")
+            return get_path(obj, attrs[1:])
+        return get_path(obj, attrs)
+
+    def get_path(value, path_attrs):
+        for attr in path_attrs:
+            value = getattr(value, attr, None)
+            if value is None:
+                return None
+        return value
+    return get
+
+def _to_python(field, value):
+    if field is None:
+        return value
+    try:
+        value = field.to_python(value)
+    except ValidationError as e:
+        raise UnsupportedFilter(str(e))
+    if isinstance(field, models.DateTimeField) and isinstance(value, datetime.datetime) and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+def _compare_value(field, value):
+    # Values read from instances or dicts are converted like lookup values
+    if value is None or field is None:
+        return value
+    if isinstance(field, models.DateTimeField) and isinstance(value, datetime.datetime):
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+    try:
+        return field.to_python(value)
+    except ValidationError:
+        return value
+
+def _local_date(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value
+
+def _condition(cond, user, model):
+    path = cond['field']
+    operator = cond['operator']
+    value = cond['value']
+    if not isinstance(path, str):
+        raise UnsupportedFilter(f"Invalid field {path!r}")
+    attrs, field = _resolve_field(model, path)
+    get = _getter(path, attrs)
+
+    def current(obj):
+        return _compare_value(field, get(obj))
+
+    if path in USER_FIELDS:
+        # Mirrors build_q_object: list -> __in, 'me' -> the user, operator ignored
+        def resolve(v):
+            return user.id if v == 'me' and user else v
+        if operator == 'in':
+            allowed = {_to_python(field, resolve(v)) for v in value if v is not None}
+            return lambda obj: current(obj) in allowed
+        if value is None:
+            return lambda obj: get(obj) is None
+        target = _to_python(field, resolve(value))
+        return lambda obj: current(obj) == target
+
+    if operator == 'isnull':
+        return lambda obj: (get(obj) is None) == value
+
+    if operator in ('exact', 'iexact') and value is None:
+        # Django turns exact/iexact None into isnull
+        return lambda obj: get(obj) is None
+
+    if operator == 'exact':
+        target = _to_python(field, value)
+        return lambda obj: current(obj) == target
+
+    if operator == 'in':
+        allowed = {_to_python(field, v) for v in value if v is not None}
+        return lambda obj: current(obj) in allowed
+
+    if operator in PATTERN_LOOKUPS or operator in COMPARISONS:
+        if value is None:
+            raise UnsupportedFilter(f"None is not a valid value for {operator}")
+
+    if operator in PATTERN_LOOKUPS:
+        if field is not None and not isinstance(field, TEXT_FIELDS):
+            raise UnsupportedFilter(f"{operator} on {path} depends on the database text format")
+        match = PATTERN_LOOKUPS[operator]
+        pattern = str(value)
+
+        def check_pattern(obj):
+            v = get(obj)
+            return v is not None and match(str(v), pattern)
+        return check_pattern
+
+    if operator in COMPARISONS:
+        compare = COMPARISONS[operator]
+        target = _to_python(field, value)
+
+        def check_comparison(obj):
+            v = current(obj)
+            return v is not None and compare(v, target)
+        return check_comparison
+
+    if operator == 'between':
+        start, end = (_to_python(field, v) for v in value)
+
+        def check_between(obj):
+            v = current(obj)
+            return v is not None and start <= v <= end
+        return check_between
+
+    # Relative dates are computed when evaluated, like build_q_object computes
+    # them when the query is built
+    if operator in ('today', 'yesterday', 'tomorrow', 'after_today', 'before_today'):
+        offset = {'yesterday': -1, 'tomorrow': 1}.get(operator, 0)
+        compare = {'after_today': COMPARISONS['gt'], 'before_today': COMPARISONS['lt']}.get(operator, lambda a, b: a == b)
+
+        def check_day(obj):
+            v = current(obj)
+            return v is not None and compare(_local_date(v), timezone.now().date() + datetime.timedelta(days=offset))
+        return check_day
+
+    if operator in ('past_n_days', 'future_n_days'):
+        n = int(value) if value else 0
+        if operator == 'past_n_days':
+            delta, compare = -datetime.timedelta(days=n), COMPARISONS['gte']
+        else:
+            delta, compare = datetime.timedelta(days=n), COMPARISONS['lte']
+
+        def check_window(obj):
+            v = current(obj)
+            # A DateField compares the bound's date, like the database does
+            return v is not None and compare(v, _to_python(field, timezone.now() + delta))
+        return check_window
+
+    raise UnsupportedFilter(f"Operator {operator} is not supported")
+
+def _compile(node, user, model):
+    if 'logic' not in node:
+        return _condition(node, user, model)
+    predicates = [_compile(child, user, model) for child in node['conditions']]
+    if node['logic'] == 'OR':
+        return lambda obj: any(predicate(obj) for predicate in predicates)
+    return lambda obj: all(predicate(obj) for predicate in predicates)
+
+def compile_predicate(filters, user=None, model=None):
+    """
+    Compiles a filter tree into predicate(obj) -> bool. Raises
+    UnsupportedFilter when the tree needs the database.
+    """
+    tree = optimize_filters(filters, model)
+    if not tree:
+        return lambda obj: True
+    return _compile(tree, user, model)
@@ -0,0 +1,262 @@
+"""
+Normalizes filter trees ({logic, conditions: [{field, operator, value} | group]})
+before build_q_object compiles them, so the SQL stays small:
+
+- empty groups, single-child groups and groups nested in a group of the same
+  logic are flattened away,
+- duplicated conditions are removed,
+- ORs of exact/in on the same field are folded into one __in,
+- contradictions (AND of different exact values, isnull both ways, in [])
+  collapse to a condition matching nothing, tautologies (isnull both ways in
+  an OR) to no condition,
+- conditions are ordered from most to least selective.
+
+The result always compiles to a Q object matching the same rows as the input.
+"""
+import json
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+
+# build_q_object ignores the operator for these: list -> __in, 'me' -> user
+USER_FIELDS = ('owner', 'assigned_to')
+
+# Contradictions are only derived for fields whose Python value compares like SQL
+COMPARABLE_FIELDS = (models.CharField, models.TextField, models.IntegerField, models.BooleanField, models.AutoField)
+
+NEVER = {'field': 'pk', 'operator': 'in', 'value': []}
+
+# Markers for subtrees that compile to Q() (ignored by both AND and OR in
+# build_q_object), that always match, or that never match
+EMPTY = 'empty'
+ALWAYS = 'always'
+
+OPERATOR_RANK = {
+    'exact': 0, 'in': 1, 'today': 1, 'yesterday': 1, 'tomorrow': 1,
+    'between': 2, 'range': 2,
+    'gt': 3, 'gte': 3, 'lt': 3, 'lte': 3, 'past_n_days': 3, 'future_n_days': 3,
+    'after_today': 3, 'before_today': 3,
+    'isnull': 4, 'startswith': 5, 'istartswith': 5,
+}
+GROUP_RANK = 10
+
+def _is_group(node):
+    return isinstance(node, dict) and 'logic' in node
+
+def _is_never(node):
+    return node == NEVER
+
+def _key(node):
+    return json.dumps(node, sort_keys=True, default=str)
+
+def _as_bool(value):
+    return value if isinstance(value, bool) else str(value).lower() == 'true'
+
+def _model_field(model, name):
+    if model is None or not isinstance(name, str):
+        return None
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if isinstance(field, COMPARABLE_FIELDS) and not field.is_relation else None
+
+def _normalize(field, value):
+    """
+    Python value the database compares for an exact lookup, or raises
+    ValueError if it cannot be determined.
+    """
+    if field is None or isinstance(value, (list, dict)):
+        raise ValueError(value)
+    try:
+        return field.to_python(value)
+    except (ValidationError, TypeError):
+        raise ValueError(value)
+
+def _value_key(field, value):
+    try:
+        return ('value', _normalize(field, value))
+    except ValueError:
+        return ('raw', _key(value))
+
+def _condition(cond):
+    """
+    Canonical form of a single condition, EMPTY if it compiles to Q() or
+    NEVER if it cannot match.
+    """
+    field = cond.get('field')
+    operator = cond.get('operator', 'exact')
+    value = cond.get('value')
+
+    if field in USER_FIELDS:
+        if isinstance(value, list):
+            return {'field': field, 'operator': 'in', 'value': value} if value else NEVER
+        return {'field': field, 'operator': 'exact', 'value': value}
+
+    if operator == 'isnull':
+        return {'field': field, 'operator': 'isnull', 'value': _as_bool(value)}
+    if operator == 'in':
+        value = value if isinstance(value, list) else [value]
+        return {'field': field, 'operator': 'in', 'value': value} if value else NEVER
+    if operator == 'between' and not (isinstance(value, list) and len(value) == 2):
+        return EMPTY
+    return {'field': field, 'operator': operator, 'value': value}
+
+def _dedupe(nodes):
+    seen = set()
+    unique = []
+    for node in nodes:
+        key = _key(node)
+        if key not in seen:
+            seen.add(key)
+            unique.append(node)
+    return unique
+
+def _foldable(node):
+    # exact/in conditions whose rows are exactly "field IN values"
+    if _is_group(node):
+        return False
+    if node['field'] in USER_FIELDS:
+        return node['operator'] == 'in' or node['value'] is not None
+    if node['operator'] == 'in':
+        return True
+    return node['operator'] == 'exact' and node['value'] is not None and not isinstance(node['value'], (list, dict))
+
+def _fold_or(nodes, model):
+    """
+    Merges exact/in conditions on the same field into a single "in".
+    """
+    folded = []
+    by_field = {}
+    for node in nodes:
+        if not _foldable(node):
+            folded.append(node)
+            continue
+        values = node['value'] if node['operator'] == 'in' else [node['value']]
+        if node['field'] in by_field:
+            by_field[node['field']]['value'].extend(values)
+            continue
+        merged = {'field': node['field'], 'operator': 'in', 'value': list(values)}
+        by_field[node['field']] = merged
+        folded.append(merged)
+
+    for field_name, merged in by_field.items():
+        model_field = _model_field(model, field_name)
+        seen = set()
+        values = []
+        for value in merged['value']:
+            key = _value_key(model_field, value)
+            if key not in seen:
+                seen.add(key)
+                values.append(value)
+        merged['value'] = values
+        if (len(values) == 1 and field_name not in USER_FIELDS
+                and values[0] is not None and not isinstance(values[0], (list, dict))):
+            merged['operator'] = 'exact'
+            merged['value'] = values[0]
+    return folded
+
+def _is_tautology(nodes):
+    # "field is null OR field is not null"
+    isnull = {}
+    for node in nodes:
+        if not _is_group(node) and node['operator'] == 'isnull' and node['field'] not in USER_FIELDS:
+            isnull.setdefault(node['field'], set()).add(node['value'])
+    return any(len(values) == 2 for values in isnull.values())
+
+def _is_contradiction(nodes, model):
+    allowed = {}
+    isnull = {}
+    for node in nodes:
+        if _is_group(node) or node['field'] in USER_FIELDS:
+            continue
+        field_name, operator, value = node['field'], node['operator'], node['value']
+        if operator == 'isnull':
+            isnull.setdefault(field_name, set()).add(value)
+            continue
+        if operator not in ('exact', 'in') or (operator == 'exact' and value is None):
+            continue
+        model_field = _model_field(model, field_name)
+        if model_field is None:
+            continue
+        values = value if operator == 'in' else [value]
+        try:
+            # NULL never equals anything, also not inside IN (...)
+            normalized = {_normalize(model_field, v) for v in values if v is not None}
+        except (ValueError, TypeError):
+            continue
+        if field_name in allowed:
+            allowed[field_name] &= normalized
+        else:
+            allowed[field_name] = normalized
+        isnull.setdefault(field_name, set()).add(False)
+
+    if any(not values for values in allowed.values()):
+        return True
+    return any(len(values) == 2 for values in isnull.values())
+
+def _rank(node):
+    if _is_group(node):
+        return GROUP_RANK + len(node['conditions'])
+    return OPERATOR_RANK.get(node['operator'], 6)
+
+def _optimize(node, model):
+    """
+    Returns a canonical condition or group, NEVER, EMPTY or ALWAYS.
+    """
+    if not _is_group(node):
+        return _condition(node) if isinstance(node, dict) else EMPTY
+
+    logic = 'OR' if str(node.get('logic', 'AND')).upper() == 'OR' else 'AND'
+    children = []
+    saw_never = saw_always = False
+    for child in node.get('conditions', []):
+        result = _optimize(child, model)
+        if result == EMPTY:
+            continue
+        if result == ALWAYS:
+            saw_always = True
+            continue
+        if _is_never(result):
+            saw_never = True
+            continue
+        if _is_group(result) and result['logic'] == logic:
+            children.extend(result['conditions'])
+        else:
+            children.append(result)
+
+    if logic == 'AND':
+        if saw_never:
+            return NEVER
+        children = _dedupe(children)
+        if _is_contradiction(children, model):
+            return NEVER
+        if not children:
+            return ALWAYS if saw_always else EMPTY
+    else:
+        if saw_always:
+            return ALWAYS
+        children = _fold_or(_dedupe(children), model)
+        if _is_tautology(children):
+            return ALWAYS
+        if not children:
+            return NEVER if saw_never else EMPTY
+
+    children.sort(key=_rank)
+    if len(children) == 1:
+        return children[0]
+    return {'logic': logic, 'conditions': children}
+
+def optimize_filters(filters, model=None):
+    """
+    Returns an equivalent, normalized copy of a filter tree. model (Client,
+    Task, ...) enables value-aware rules such as contradiction detection.
+    """
+    if not filters or not isinstance(filters, dict):
+        return {}
+    # The root is always a group, even without "logic"
+    result = _optimize({**filters, 'logic': filters.get('logic', 'AND')}, model)
+    if result in (EMPTY, ALWAYS):
+        return {}
+    if not _is_group(result):
+        result = {'logic': 'AND', 'conditions': [result]}
+    return result
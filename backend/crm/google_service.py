@@ -1,20 +1,61 @@
 import datetime
 import os
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
 from django.conf import settings
 from crm.models import GoogleToken, Email, Client
 from django.utils import timezone
 import base64
+import tempfile
+from urllib.parse import urlparse
+from crm.lazy import lazy_import
+from crm.services.email_content import body_fields
+from crm.services.email_threads import save_email
+from crm.services.mime_stream import write_mime_message
+
+# The Google client libraries load on first use, not with every worker and command
+google_requests = lazy_import('google.auth.transport.requests')
+google_credentials = lazy_import('google.oauth2.credentials')
+oauth_flow = lazy_import('google_auth_oauthlib.flow')
+discovery = lazy_import('googleapiclient.discovery')
+google_http = lazy_import('googleapiclient.http')
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly', 'https://www.googleapis.com/auth/gmail.send']
 
+# Resumable upload chunk size, must be a multiple of 256 KB
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+def endpoint_http_request(http, postproc, uri, *args, **kwargs):
+    """
+    googleapiclient only swaps the host of media upload URLs when api_endpoint is
+    overridden, keeping https. This keeps the scheme of GMAIL_API_ENDPOINT too,
+    so uploads also reach a plain http fake server.
+    """
+    endpoint = urlparse(settings.GMAIL_API_ENDPOINT)
+    parsed = urlparse(uri)
+    if parsed.netloc == endpoint.netloc:
+        uri = parsed._replace(scheme=endpoint.scheme).geturl()
+    return google_http.HttpRequest(http, postproc, uri, *args, **kwargs)
+
+def message_bodies(payload):
+    """
+    (html, text) of a Gmail message payload: the first text/html and
+    text/plain parts, looking into nested multiparts.
+    """
+    bodies = {}
+    parts = [payload]
+    while parts:
+        part = parts.pop(0)
+        mime_type = part.get('mimeType', '')
+        if mime_type.startswith('multipart/'):
+            parts = part.get('parts', []) + parts
+        elif mime_type in ('text/html', 'text/plain') and mime_type not in bodies and part.get('body', {}).get('data'):
+            bodies[mime_type] = base64.urlsafe_b64decode(part['body']['data']).decode(errors='replace')
+    return bodies.get('text/html'), bodies.get('text/plain')
+
 class GoogleService:
     def __init__(self, user):
         self.user = user
         self.credentials = self._get_credentials()
+        self._gmail = None
 
     def _get_credentials(self):
         try:
@@ -24,17 +65,17 @@ class GoogleService:
             if expiry and expiry.tzinfo:
                 expiry = expiry.astimezone(datetime.timezone.utc).replace(tzinfo=None)
 
-            creds = Credentials(
+            creds = google_credentials.Credentials(
                 token=token_obj.access_token,
                 refresh_token=token_obj.refresh_token,
-                token_uri="https://oauth2.googleapis.com/token",
+                token_uri=settings.GOOGLE_TOKEN_URI,
                 client_id=settings.GOOGLE_CLIENT_ID,
                 client_secret=settings.GOOGLE_CLIENT_SECRET,
                 expiry=expiry
             )
             
             if creds.expired and creds.refresh_token:
-                creds.refresh(Request())
+                creds.refresh(google_requests.Request())
                 token_obj.access_token = creds.token
                 token_obj.expires_at = creds.expiry
                 token_obj.save()
@@ -44,19 +85,48 @@ class GoogleService:
             return None
 
     @staticmethod
-    def get_auth_url():
-        flow = Flow.from_client_config(
+    def build_flow():
+        return oauth_flow.Flow.from_client_config(
             {
                 "web": {
                     "client_id": settings.GOOGLE_CLIENT_ID,
                     "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "auth_uri": settings.GOOGLE_AUTH_URI,
+                    "token_uri": settings.GOOGLE_TOKEN_URI,
                 }
             },
             scopes=SCOPES,
             redirect_uri=settings.GOOGLE_REDIRECT_URI
         )
+
+    @staticmethod
+    def exchange_code(code):
+        """Exchanges an OAuth authorization code for credentials (blocking HTTP call)."""
+        flow = GoogleService.build_flow()
+        flow.fetch_token(code=code)
+        return flow.credentials
+
+    def build_gmail(self):
+        # GMAIL_API_ENDPOINT points the client at a fake server for local benchmarks
+        if settings.GMAIL_API_ENDPOINT:
+            return discovery.build(
+                'gmail', 'v1',
+                credentials=self.credentials,
+                client_options={'api_endpoint': settings.GMAIL_API_ENDPOINT},
+                requestBuilder=endpoint_http_request
+            )
+        return discovery.build('gmail', 'v1', credentials=self.credentials)
+
+    def get_gmail(self):
+        # Built once per GoogleService; the client is not thread-safe, so
+        # concurrent senders need one GoogleService per thread
+        if self._gmail is None:
+            self._gmail = self.build_gmail()
+        return self._gmail
+
+    @staticmethod
+    def get_auth_url():
+        flow = GoogleService.build_flow()
         authorization_url, state = flow.authorization_url(
             access_type='offline',
             include_granted_scopes='true',
@@ -65,10 +135,13 @@ class GoogleService:
         return authorization_url, state
 
     def fetch_emails(self):
+        # Imported here, the workflow actions themselves depend on GoogleService
+        from crm.services.workflow_events import emit_email_received
+
         if not self.credentials:
             return []
 
-        service = build('gmail', 'v1', credentials=self.credentials)
+        service = self.get_gmail()
         results = service.users().messages().list(userId='me', maxResults=10).execute()
         messages = results.get('messages', [])
 
@@ -86,15 +159,7 @@ class GoogleService:
             from_email = next((h['value'] for h in headers if h['name'].lower() == 'from'), '')
             to_email = next((h['value'] for h in headers if h['name'].lower() == 'to'), '')
             
-            # Simple body extraction
-            body = ""
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    if part['mimeType'] == 'text/plain':
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode()
-                        break
-            elif 'body' in payload and 'data' in payload['body']:
-                body = base64.urlsafe_b64decode(payload['body']['data']).decode()
+            html_body, text_body = message_bodies(payload)
 
             # Parse from_email to get actual address
             if '<' in from_email:
@@ -103,71 +168,46 @@ class GoogleService:
             # Find matching client
             client = Client.objects.filter(email=from_email).first()
 
-            email_obj = Email.objects.create(
+            email_obj = save_email(Email(
                 message_id=msg['id'],
                 thread_id=msg_data['threadId'],
                 subject=subject,
-                body=body,
+                **body_fields(html_body, text_body),
                 from_email=from_email,
                 to_email=to_email,
                 timestamp=timezone.now(), # Ideally parse from header 'Date'
                 client=client,
                 user=self.user
-            )
+            ))
             synced_emails.append(email_obj)
-        
+            emit_email_received(email_obj)
+
         return synced_emails
 
     def send_email(self, to_email, subject, body, attachments=None, thread_id=None, in_reply_to=None):
         if not self.credentials:
             return None
 
-        service = build('gmail', 'v1', credentials=self.credentials)
-        
-        from email.mime.multipart import MIMEMultipart
-        from email.mime.text import MIMEText
-        from email.mime.base import MIMEBase
-        from email import encoders
-        import mimetypes
-        import base64
-
-        if attachments:
-            message = MIMEMultipart()
-            message['to'] = to_email
-            message['subject'] = subject
-            if in_reply_to:
-                message['In-Reply-To'] = in_reply_to
-                message['References'] = in_reply_to
-            message.attach(MIMEText(body, 'html'))
-
-            for attachment in attachments:
-                content_type, encoding = mimetypes.guess_type(attachment.name)
-                if content_type is None or encoding is not None:
-                    content_type = 'application/octet-stream'
-                
-                main_type, sub_type = content_type.split('/', 1)
-                part = MIMEBase(main_type, sub_type)
-                part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', f'attachment; filename="{attachment.name}"')
-                message.attach(part)
-        else:
-            message = MIMEText(body, 'html')
-            message['to'] = to_email
-            message['subject'] = subject
-            if in_reply_to:
-                message['In-Reply-To'] = in_reply_to
-                message['References'] = in_reply_to
-        
-        raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        
-        body_data = {'raw': raw}
-        if thread_id:
-            body_data['threadId'] = thread_id
-        
-        try:
-            sent_message = service.users().messages().send(userId='me', body=body_data).execute()
-            return sent_message
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            return None
+        service = self.get_gmail()
+
+        # The message is spooled to disk past EMAIL_SPOOL_MEMORY_SIZE and sent as a
+        # media upload (no second base64 pass over the whole message). Large
+        # messages use a resumable upload so only one chunk is in memory at a time.
+        with tempfile.SpooledTemporaryFile(max_size=settings.EMAIL_SPOOL_MEMORY_SIZE) as message_file:
+            size = write_mime_message(message_file, to_email, subject, body, attachments, in_reply_to)
+            message_file.seek(0)
+            media = google_http.MediaIoBaseUpload(
+                message_file,
+                mimetype='message/rfc822',
+                chunksize=UPLOAD_CHUNK_SIZE,
+                resumable=size > settings.EMAIL_RESUMABLE_THRESHOLD
+            )
+
+            body_data = {'threadId': thread_id} if thread_id else None
+
+            try:
+                sent_message = service.users().messages().send(userId='me', body=body_data, media_body=media).execute()
+                return sent_message
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                return None
@@ -0,0 +1,25 @@
+"""
+Facades for heavy libraries (pandas, the Google client) that most requests
+and management commands never use. The module is imported on first
+attribute access, so `pd = lazy_import('pandas')` at the top of a module
+costs nothing until `pd.DataFrame` is reached. See
+`python manage.py startup_benchmark`.
+"""
+import importlib
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Only reached for attributes the facade itself lacks
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{' (loaded)' if self._module is not None else ''}>"
+
+def lazy_import(name):
+    return LazyModule(name)
@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from crm.devtools.fake_gmail import FakeGmailServer
+from crm.google_service import GoogleService
+from crm.models.tokens import GoogleToken
+from crm.services.google_executor import run_google
+
+class Command(BaseCommand):
+    help = (
+        'Compares Gmail sync concurrency of blocking workers vs the async executor '
+        'against a local fake Gmail server. Creates a "gmail-bench" user in the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency-ms', type=int, default=300, help='Fake Gmail latency per call')
+        parser.add_argument('--requests', type=int, default=20, help='Concurrent sync requests')
+        parser.add_argument('--sync-workers', type=int, default=4, help='Blocking workers to model (e.g. gunicorn sync workers)')
+        parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+
+    def handle(self, *args, **options):
+        server = FakeGmailServer(messages=10, latency_ms=options['latency_ms']).start()
+        settings.GMAIL_API_ENDPOINT = server.url
+        settings.GOOGLE_TOKEN_URI = f"{server.url}token"
+
+        user, _ = User.objects.get_or_create(username='gmail-bench')
+        GoogleToken.objects.update_or_create(
+            user=user,
+            defaults={
+                'access_token': 'bench',
+                'refresh_token': 'bench',
+                'expires_at': timezone.now() + datetime.timedelta(days=1),
+            }
+        )
+
+        def sync():
+            return GoogleService(user).fetch_emails()
+
+        try:
+            # Warm up: the first sync stores the fake inbox, later ones only list it
+            sync()
+            blocking = self.run_blocking(sync, options['requests'], options['sync_workers'])
+            concurrent = asyncio.run(self.run_async(sync, options['requests']))
+        finally:
+            server.stop()
+
+        result = {
+            'latency_ms': options['latency_ms'],
+            'requests': options['requests'],
+            'blocking_workers': options['sync_workers'],
+            'executor_size': settings.GMAIL_MAX_CONCURRENCY,
+            'blocking': blocking,
+            'async': concurrent,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(
+            f"{options['requests']} syncs at {options['latency_ms']} ms Gmail latency\n"
+            f"  blocking ({options['sync_workers']} workers): {blocking['wall_s']} s total, "
+            f"a cheap request queued behind them waits {blocking['probe_wait_ms']} ms\n"
+            f"  async (executor of {settings.GMAIL_MAX_CONCURRENCY}): {concurrent['wall_s']} s total, "
+            f"a cheap request waits {concurrent['probe_wait_ms']} ms"
+        )
+
+    def run_blocking(self, sync, requests, workers):
+        # Each sync occupies a worker for the whole Google round-trip, so any
+        # other request has to queue behind them
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            started = time.perf_counter()
+            futures = [pool.submit(sync) for _ in range(requests)]
+            probe_submitted = time.perf_counter()
+            probe = pool.submit(time.perf_counter)
+            probe_wait = probe.result() - probe_submitted
+            for future in futures:
+                future.result()
+            wall = time.perf_counter() - started
+        return {'wall_s': round(wall, 2), 'probe_wait_ms': round(probe_wait * 1000, 1)}
+
+    async def run_async(self, sync, requests):
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(run_google(sync)) for _ in range(requests)]
+        # A cheap request only needs the event loop, which stays free
+        probe_submitted = time.perf_counter()
+        await asyncio.sleep(0)
+        probe_wait = time.perf_counter() - probe_submitted
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - started
+        return {'wall_s': round(wall, 2), 'probe_wait_ms': round(probe_wait * 1000, 1)}
@@ -0,0 +1,73 @@
+import json
+import time
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from crm.services.templating import get_compiled
+
+# Only the placeholders the replace chain knows, so both fill in the same fields
+SUBJECT = 'Hello {{client_name}}, an update on your account'
+BODY = (
+    '<p>Hi {{client_name}},</p>\n'
+    '<p>We have {{client_email}} and {{client_phone}} on file for you. '
+    'Please let us know if anything changed.</p>\n' * 5
+    + '<p>Best regards,<br>The team</p>'
+)
+
+def render_replace_chain(template, client):
+    # What execute_workflow_action did before templates were compiled: one
+    # full string scan per placeholder, client_name only in the subject
+    subject = template.subject.replace('{{client_name}}', client.name)
+    body = template.body.replace('{{client_name}}', client.name)
+    body = body.replace('{{client_email}}', client.email or '')
+    body = body.replace('{{client_phone}}', client.phone or '')
+    return subject, body
+
+class Command(BaseCommand):
+    help = 'Compares rendering an EmailTemplate with the old str.replace chain vs the compiled template engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=20000)
+        parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+
+    def handle(self, *args, **options):
+        # Unsaved stand-ins keep the benchmark free of database access
+        template = SimpleNamespace(pk=0, updated_at=timezone.now(), subject=SUBJECT, body=BODY)
+        owner = SimpleNamespace(first_name='Ada', get_full_name=lambda: 'Ada Lovelace')
+        clients = [
+            SimpleNamespace(
+                name=f'Client {i} & Sons', email=f'client{i}@example.com',
+                phone=f'+1 555 {i:07d}', address=f'{i} Main Street',
+            )
+            for i in range(options['recipients'])
+        ]
+
+        started = time.perf_counter()
+        for client in clients:
+            render_replace_chain(template, client)
+        replace_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        render_subject, render_body = get_compiled(template)
+        for client in clients:
+            context = {'client': client, 'owner': owner}
+            render_subject(context)
+            render_body(context)
+        compiled_s = time.perf_counter() - started
+
+        result = {
+            'recipients': options['recipients'],
+            'body_chars': len(BODY),
+            'replace_chain': {'seconds': round(replace_s, 3), 'per_second': int(options['recipients'] / replace_s)},
+            'compiled': {'seconds': round(compiled_s, 3), 'per_second': int(options['recipients'] / compiled_s)},
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write(
+            f"{options['recipients']} recipients, {len(BODY)} character body\n"
+            f"  replace chain: {result['replace_chain']['seconds']} s ({result['replace_chain']['per_second']}/s, "
+            f"no escaping)\n"
+            f"  compiled:      {result['compiled']['seconds']} s ({result['compiled']['per_second']}/s, "
+            f"escaped)"
+        )
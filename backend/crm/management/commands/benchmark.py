@@ -0,0 +1,262 @@
+import fnmatch
+import json
+import subprocess
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm import cache, metrics
+from crm.management.commands.loadtest import percentile
+from crm.models import Client, Task, SavedView, Workflow
+from crm.services.view_counts import NAMESPACE as VIEW_COUNT_NAMESPACE
+from crm.services.workflow_events import REGISTRY_NAMESPACE
+
+API = '/api/crm'
+# Task sort fields, including the ones mapped to a related column
+TASK_SORTS = ['created_at', 'due_date', 'priority', 'status', 'title', 'client_name', 'assigned_to_name']
+SEARCH_TERM = 'acme'
+
+class Command(BaseCommand):
+    help = (
+        'Measures latency, throughput and query counts of the CRM API hot paths in process, '
+        'optionally comparing with an earlier run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float,
+                            help='Generate a dataset at this scale first (see generate_dataset), resumed if already there')
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the generated dataset')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per case')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per case before measuring')
+        parser.add_argument('--export-rows', type=int, default=2000, help='Rows per export-view request')
+        parser.add_argument('--workflows', type=int, default=10,
+                            help='CLIENT_CREATED workflows subscribed during the create and run_matches cases')
+        parser.add_argument('--only', action='append', help='Run the cases matching this pattern, repeatable (e.g. "tasks.*")')
+        parser.add_argument('--output', help='Write the result as JSON to this file')
+        parser.add_argument('--compare', help='JSON result of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=10, help='Percent change reported as a regression')
+
+    def handle(self, *args, **options):
+        if options['scale']:
+            call_command('generate_dataset', scale=options['scale'], seed=options['seed'],
+                         state=f"benchmark_dataset_{options['seed']}.json", stdout=self.stdout)
+        if not Client.objects.exists():
+            raise CommandError('No clients to benchmark against, pass --scale or run generate_dataset first')
+
+        user, _ = User.objects.get_or_create(username='benchmark', defaults={'email': 'benchmark@example.com'})
+        if not user.is_staff:
+            user.is_staff = True
+            user.save(update_fields=['is_staff'])
+        api = APIClient()
+        api.force_authenticate(user)
+
+        result = {'meta': self.meta(options), 'cases': {}}
+        # Everything the benchmark creates (views, workflows, clients, tasks) is rolled back
+        with transaction.atomic():
+            for name, method, path, data, setup, mutating in self.cases(user, options):
+                if options['only'] and not any(fnmatch.fnmatch(name, pattern) for pattern in options['only']):
+                    continue
+                repeat = max(1, options['repeat'] // 10) if name.startswith(('exports.', 'workflows.run_matches')) else options['repeat']
+                result['cases'][name] = case = self.measure(api, method, path, data, setup, mutating, repeat, options['warmup'])
+                self.stdout.write(
+                    f"{name:<40} p50 {case['p50_ms']:>9.1f} ms  p95 {case['p95_ms']:>9.1f} ms  "
+                    f"{case['throughput_rps']:>8.1f} req/s  {case['queries']:>5} queries"
+                    + (f"  HTTP {case['status']}" if case['status'] >= 400 else '')
+                )
+            transaction.set_rollback(True)
+        # Drop whatever was cached from the rolled back rows
+        cache.invalidate('client', 'task', 'savedview', f'workflow:{user.pk}', REGISTRY_NAMESPACE, VIEW_COUNT_NAMESPACE)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(f"Result written to {options['output']}")
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), result, options['threshold'], options['only'])
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5
+            ).stdout.strip()
+        except OSError:
+            commit = ''
+        return {
+            'commit': commit,
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'rows': {
+                'clients': Client.objects.count(),
+                'tasks': Task.objects.count(),
+            },
+            'repeat': options['repeat'],
+            'export_rows': options['export_rows'],
+            'workflows': options['workflows'],
+        }
+
+    def cases(self, user, options):
+        """
+        Yields (name, method, path, data, setup, mutating). setup runs untimed
+        before every request, mutating requests are rolled back after each one.
+        """
+        clients = Client.objects.count()
+        tasks = Task.objects.count()
+        recent = {'logic': 'AND', 'conditions': [{'field': 'created_at', 'operator': 'past_n_days', 'value': 90}]}
+        filtered = {'logic': 'AND', 'conditions': [
+            {'field': 'name', 'operator': 'icontains', 'value': SEARCH_TERM},
+            {'field': 'phone', 'operator': 'isnull', 'value': False},
+            recent,
+        ]}
+
+        yield 'clients.list', 'get', f'{API}/clients/', {}, None, False
+        yield 'clients.search', 'get', f'{API}/clients/', {'search': SEARCH_TERM}, None, False
+        yield 'clients.filters', 'get', f'{API}/clients/', {'filters': json.dumps(filtered)}, None, False
+        # Offset pagination gets slower the further it goes
+        for fraction in (0.5, 0.99):
+            page = max(1, int(clients / 20 * fraction))
+            yield f'clients.page_{int(fraction * 100)}pct', 'get', f'{API}/clients/', {'page': page}, None, False
+
+        for field in TASK_SORTS:
+            for direction in ('asc', 'desc'):
+                yield (f'tasks.sort.{field}.{direction}', 'get', f'{API}/tasks/',
+                       {'sort': json.dumps({'field': field, 'direction': direction})}, None, False)
+        yield 'tasks.page_99pct', 'get', f'{API}/tasks/', {'page': max(1, int(tasks / 20 * 0.99))}, None, False
+
+        views = {
+            'recent_clients': SavedView.objects.create(
+                name='Benchmark: recent clients', user=user, view_type='client',
+                filters=recent, sorting={'field': 'created_at', 'direction': 'desc'}),
+            'overdue_tasks': SavedView.objects.create(
+                name='Benchmark: overdue tasks', user=user, view_type='task',
+                filters={'logic': 'AND', 'conditions': [
+                    {'field': 'status', 'operator': 'in', 'value': ['todo', 'in_progress']},
+                    {'field': 'due_date', 'operator': 'before_today'},
+                ]},
+                sorting={'field': 'due_date', 'direction': 'asc'}),
+            'tasks_by_client_name': SavedView.objects.create(
+                name='Benchmark: tasks by client name', user=user, view_type='task',
+                filters={'logic': 'AND', 'conditions': [{'field': 'client__name', 'operator': 'icontains', 'value': SEARCH_TERM}]}),
+        }
+        for label, view in views.items():
+            path = f'{API}/clients/' if view.view_type == 'client' else f'{API}/tasks/'
+            yield f'saved_views.{label}', 'get', path, {'view_id': view.pk}, None, False
+        yield 'saved_views.counts', 'get', f'{API}/saved-views/counts/', {}, None, False
+
+        # Cold misses the crm.cache entry, warm is the repeated preview while editing
+        yield ('workflows.preview_count.cold', 'post', f'{API}/workflows/preview_count/', {'filters': filtered},
+               lambda: cache.invalidate('client'), False)
+        yield 'workflows.preview_count.warm', 'post', f'{API}/workflows/preview_count/', {'filters': filtered}, None, False
+
+        bounds = Client.objects.aggregate(low=Min('id'), high=Max('id'))
+        client_range = {'logic': 'AND', 'conditions': [
+            {'field': 'id', 'operator': 'between', 'value': [bounds['low'], bounds['low'] + options['export_rows'] - 1]}]}
+        bounds = Task.objects.aggregate(low=Min('id'), high=Max('id'))
+        task_range = {'logic': 'AND', 'conditions': [
+            {'field': 'id', 'operator': 'between', 'value': [bounds['low'] or 0, (bounds['low'] or 0) + options['export_rows'] - 1]}]}
+        for file_format in ('csv', 'xlsx'):
+            yield (f'exports.clients.{file_format}', 'get', f'{API}/clients/export-view/',
+                   {'file_format': file_format, 'filters': json.dumps(client_range)}, None, False)
+            yield (f'exports.tasks.{file_format}', 'get', f'{API}/tasks/export-view/',
+                   {'file_format': file_format, 'filters': json.dumps(task_range)}, None, False)
+
+        # Client creation without subscribers, then with --workflows CLIENT_CREATED workflows
+        new_client = {'name': 'Benchmark client', 'email': 'new.client@benchmark.example', 'phone': '555-0000'}
+        yield 'workflows.client_create.none', 'post', f'{API}/clients/', new_client, None, True
+        workflows = [
+            Workflow.objects.create(
+                name=f'Benchmark {i}', owner=user, trigger_type='CLIENT_CREATED', action_type='CREATE_TASK',
+                action_config={'task_title': 'Welcome call', 'due_days': 3},
+                filters={'logic': 'AND', 'conditions': [{'field': 'phone', 'operator': 'isnull', 'value': False}]},
+            )
+            for i in range(options['workflows'])
+        ]
+        yield f'workflows.client_create.{len(workflows)}', 'post', f'{API}/clients/', new_client, None, True
+        if workflows:
+            yield ('workflows.run_matches', 'post', f'{API}/workflows/{workflows[0].pk}/run_matches/',
+                   {'filters': filtered}, None, True)
+
+    def measure(self, api, method, path, data, setup, mutating, repeat, warmup):
+        send = getattr(api, method)
+        kwargs = {'format': 'json'} if method == 'post' else {}
+        latencies = []
+        queries = []
+        status = size = 0
+
+        executed = 0
+        def count_query(execute, sql, params, many, context):
+            nonlocal executed
+            executed += 1
+            return execute(sql, params, many, context)
+
+        # MetricsMiddleware appends its wrapper on first use, which would
+        # then be the one popped when the block below exits
+        metrics.install(connection)
+        for i in range(warmup + repeat):
+            if setup:
+                setup()
+            executed = 0
+            with connection.execute_wrapper(count_query):
+                if mutating:
+                    with transaction.atomic():
+                        started = time.perf_counter()
+                        # Work deferred to on_commit (workflow dispatch) is part of the cost
+                        with TestCase.captureOnCommitCallbacks(execute=True):
+                            response = send(path, data, **kwargs)
+                        elapsed = time.perf_counter() - started
+                        transaction.set_rollback(True)
+                else:
+                    started = time.perf_counter()
+                    response = send(path, data, **kwargs)
+                    elapsed = time.perf_counter() - started
+            if i >= warmup:
+                latencies.append(elapsed)
+                queries.append(executed)
+            status = response.status_code
+            size = len(response.content)
+
+        latencies.sort()
+        return {
+            'requests': repeat,
+            'status': status,
+            'bytes': size,
+            # Median, cache reloads show up in max_queries
+            'queries': sorted(queries)[len(queries) // 2],
+            'max_queries': max(queries),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2),
+            'throughput_rps': round(len(latencies) / sum(latencies), 1),
+        }
+
+    def compare(self, before, after, threshold, only):
+        self.stdout.write(f"\nCompared with {before['meta'].get('commit') or 'the earlier run'} "
+                          f"({before['meta']['rows']['clients']} clients, {before['meta']['database']}):")
+        regressions = 0
+        for name, case in after['cases'].items():
+            old = before['cases'].get(name)
+            if old is None:
+                self.stdout.write(f"  {name:<40} new")
+                continue
+            change = (case['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0.0
+            line = (f"  {name:<40} p50 {old['p50_ms']:>9.1f} -> {case['p50_ms']:>9.1f} ms ({change:+.0f}%)  "
+                    f"queries {old['queries']} -> {case['queries']}")
+            if change > threshold or case['queries'] > old['queries']:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            elif change < -threshold or case['queries'] < old['queries']:
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(line)
+        if not only:
+            for name in sorted(before['cases'].keys() - after['cases'].keys()):
+                self.stdout.write(f"  {name:<40} removed")
+        self.stdout.write(f"{regressions} regression(s) over {threshold:g}%")
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from crm.devtools.fake_gmail import FakeGmailServer
+from crm.models import Client
+
+class Command(BaseCommand):
+    help = 'Runs a local fake Gmail/OAuth server for benchmarks and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8025)
+        parser.add_argument('--latency-ms', type=int, default=0, help='Delay added to every request')
+        parser.add_argument('--jitter-ms', type=int, default=0, help='Random +/- variation of the delay')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of API and token requests answered with 429 or 503')
+        parser.add_argument('--messages', type=int, default=10, help='Messages in the fake inbox')
+        parser.add_argument('--arrivals-per-second', type=float, default=0, help='New inbound messages per second')
+        parser.add_argument('--client-senders', type=int, default=0,
+                            help='Send mail from the addresses of this many clients in the database, so synced mail links to them')
+        parser.add_argument('--seed', type=int, help='Seed of the latency, error and sender choices')
+
+    def handle(self, *args, **options):
+        senders = None
+        if options['client_senders']:
+            senders = list(
+                Client.objects.exclude(email='').order_by('id').values_list('email', flat=True)[:options['client_senders']]
+            ) or None
+        server = FakeGmailServer(
+            host=options['host'],
+            port=options['port'],
+            arrivals_per_second=options['arrivals_per_second'],
+            messages=options['messages'],
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            senders=senders,
+            seed=options['seed'],
+        )
+        self.stdout.write(f"Fake Gmail listening on {server.url}")
+        self.stdout.write(f"  GMAIL_API_ENDPOINT={server.url}")
+        self.stdout.write(f"  GOOGLE_AUTH_URI={server.url}auth")
+        self.stdout.write(f"  GOOGLE_TOKEN_URI={server.url}token")
+        self.stdout.write("  OAUTHLIB_INSECURE_TRANSPORT=1")
+        server.start_arrivals()
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
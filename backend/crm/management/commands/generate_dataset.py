@@ -0,0 +1,158 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max
+from django.utils import timezone
+from crm import cache
+from crm.models import EmailThread
+from crm.services import dataset
+from crm.services.email_threads import rebuild_threads
+from crm.services.view_counts import reset_counts
+from crm.versioning import bump_versions
+
+class Command(BaseCommand):
+    help = 'Generates a synthetic CRM dataset at production scale, resumable and deterministic per seed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.01,
+                            help='Fraction of 1M clients, 10M tasks, 5M notes and 5M emails (default 0.01)')
+        for table in dataset.BASE_SCALE:
+            parser.add_argument(f'--{table}', type=int, help=f'Number of {table}, overrides --scale')
+        parser.add_argument('--users', type=int, default=20, help='Users owning the data (dataset_user_000, ...)')
+        parser.add_argument('--password', help='Password of the generated users, unusable by default')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Rows per transaction')
+        parser.add_argument('--state', default='generate_dataset.json', help='Progress file used to resume')
+        parser.add_argument('--restart', action='store_true', help='Plan a new dataset even if the state file exists')
+
+    def create_users(self, count, password):
+        hashed = make_password(password)
+        usernames = [f'dataset_user_{i:03d}' for i in range(count)]
+        User.objects.bulk_create(
+            [User(username=name, email=f'{name}@dataset.example', password=hashed) for name in usernames],
+            ignore_conflicts=True
+        )
+        if password:
+            User.objects.filter(username__in=usernames).update(password=hashed)
+        users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+        return [users[name].id for name in usernames], [users[name].email for name in usernames]
+
+    def reserve_ids(self, counts):
+        """
+        First id of a free range per table. On PostgreSQL the sequence is moved
+        past the range, so rows created meanwhile do not collide with it.
+        """
+        bases = {}
+        for table, model in dataset.MODELS.items():
+            bases[table] = (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+            if connection.vendor == 'postgresql' and counts[table]:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)",
+                        [model._meta.db_table, bases[table] + counts[table] - 1]
+                    )
+        return bases
+
+    def plan(self, options):
+        counts = dataset.scaled_counts(options['scale'], {table: options[table] for table in dataset.BASE_SCALE})
+        if counts['clients'] == 0 and any(counts[table] for table in ('tasks', 'notes', 'emails')):
+            raise CommandError('Tasks, notes and emails need at least one client')
+        user_ids, user_emails = self.create_users(options['users'], options['password'])
+        return {
+            'seed': options['seed'],
+            'counts': counts,
+            'chunk_size': options['chunk_size'],
+            'now': timezone.now().isoformat(),
+            'user_ids': user_ids,
+            'user_emails': user_emails,
+            'bases': self.reserve_ids(counts),
+            'chunks': {table: dataset.chunk_ranges(count, options['chunk_size']) for table, count in counts.items()},
+        }
+
+    def save_state(self, path, state):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def handle(self, *args, **options):
+        path = options['state']
+        if os.path.exists(path) and not options['restart']:
+            with open(path) as f:
+                state = json.load(f)
+            self.stdout.write(f"Resuming the dataset planned in {path} (seed {state['plan']['seed']}), --restart plans a new one")
+        else:
+            state = {'plan': self.plan(options), 'done': {table: [] for table in dataset.BASE_SCALE}}
+            self.save_state(path, state)
+        plan = state['plan']
+        self.stdout.write('Target: ' + ', '.join(f"{count} {table}" for table, count in plan['counts'].items()))
+
+        started = time.monotonic()
+        # Concurrent writers only pay off on PostgreSQL, SQLite locks the whole file
+        workers = options['workers'] if connection.vendor == 'postgresql' else 1
+        for phase in dataset.PHASES:
+            pending = [
+                (table, chunk)
+                for table in phase
+                for chunk in range(len(plan['chunks'][table]))
+                if chunk not in state['done'][table]
+            ]
+            self.run_phase(plan, state, path, pending, workers)
+
+        self.finish(plan)
+        elapsed = time.monotonic() - started
+        total = sum(plan['counts'].values())
+        self.stdout.write(self.style.SUCCESS(f"Dataset complete: {total} rows in {elapsed:.1f}s"))
+
+    def run_phase(self, plan, state, path, pending, workers):
+        if not pending:
+            return
+        written = 0
+        phase_started = last_report = time.monotonic()
+
+        def completed(table, chunk, rows):
+            nonlocal written, last_report
+            state['done'][table].append(chunk)
+            self.save_state(path, state)
+            written += rows
+            now = time.monotonic()
+            if now - last_report >= 2 or len(state['done'][table]) == len(plan['chunks'][table]):
+                last_report = now
+                done = len(state['done'][table])
+                rate = written / max(now - phase_started, 1e-9)
+                self.stdout.write(f"{table}: {done}/{len(plan['chunks'][table])} chunks, {rate:,.0f} rows/s")
+
+        if workers <= 1:
+            for table, chunk in pending:
+                completed(*dataset.write_chunk(plan, table, chunk))
+            return
+
+        # Workers are spawned (not forked) so they open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+            futures = [pool.submit(dataset.write_chunk, plan, table, chunk) for table, chunk in pending]
+            for future in as_completed(futures):
+                completed(*future.result())
+
+    def finish(self, plan):
+        # Threads are aggregated from the generated emails in one pass
+        if plan['counts']['emails']:
+            self.stdout.write(f"Email threads: {rebuild_threads(plan['user_ids']):,}")
+        # Bulk writes bypass the model signals
+        tables = [dataset.MODELS[table]._meta.db_table for table in dataset.BASE_SCALE] + [EmailThread._meta.db_table]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {', '.join(tables)}")
+        scopes = ['client', 'task', 'note', *[f'email:{user_id}' for user_id in plan['user_ids']]]
+        bump_versions(*scopes)
+        cache.invalidate(*scopes)
+        reset_counts()
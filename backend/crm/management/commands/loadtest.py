@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.cookiejar import CookieJar
+from django.core.management.base import BaseCommand, CommandError
+from crm.devtools import journeys
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        'p50': round(percentile(latencies, 50) * 1000, 1),
+        'p95': round(percentile(latencies, 95) * 1000, 1),
+        'p99': round(percentile(latencies, 99) * 1000, 1),
+        'max': round((latencies[-1] if latencies else 0) * 1000, 1),
+    }
+
+class Command(BaseCommand):
+    help = (
+        'Runs a closed-loop HTTP load test against a running server (runserver, gunicorn, nginx): '
+        'a round-robin of paths, or scripted user journeys with --journeys'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the running server')
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request, repeatable (round-robin)')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--duration', type=float, default=20, help='Seconds to run')
+        parser.add_argument('--username', help='Log in through /api/auth/login/ before the run')
+        parser.add_argument('--password')
+        parser.add_argument('--label', default='', help='Name of this run in the report (e.g. runserver, gunicorn)')
+        parser.add_argument('--output', help='Append the result as JSON to this file')
+        parser.add_argument('--journeys', nargs='?', const='default',
+                            help='Run user journeys instead of paths: "default" or a weighted mix such as '
+                                 '"browse=3,search=2,timeline=2,create_task,send_email,sync"')
+        parser.add_argument('--user-pattern',
+                            help='Username of virtual user n, e.g. "dataset_user_{n:03d}" (default: --username for all)')
+        parser.add_argument('--user-count', type=int, default=1, help='Distinct accounts used by --user-pattern')
+        parser.add_argument('--think-ms', type=float, default=1000, help='Mean pause between journeys')
+        parser.add_argument('--connect-gmail', action='store_true',
+                            help='Connect every user to Gmail first (the backend must use the fake Gmail server)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def login(self, base_url, username, password, jar):
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+        request = urllib.request.Request(
+            f"{base_url}/api/auth/login/",
+            data=json.dumps({'username': username, 'password': password}).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            opener.open(request, timeout=10).read()
+        except urllib.error.HTTPError as e:
+            raise CommandError(f"Login failed with HTTP {e.code}")
+
+    def handle(self, *args, **options):
+        if options['journeys']:
+            return self.run_journeys(options)
+        base_url = options['url'].rstrip('/')
+        paths = options['paths'] or ['/api/crm/clients/']
+        jar = CookieJar()
+        if options['username']:
+            self.login(base_url, options['username'], options['password'] or '', jar)
+
+        latencies = []
+        errors = {}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def worker(offset):
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+            i = offset
+            local_latencies = []
+            local_errors = {}
+            while time.monotonic() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    with opener.open(f"{base_url}{path}", timeout=30) as response:
+                        response.read()
+                    local_latencies.append(time.perf_counter() - started)
+                except urllib.error.HTTPError as e:
+                    local_errors[str(e.code)] = local_errors.get(str(e.code), 0) + 1
+                except Exception as e:
+                    local_errors[type(e).__name__] = local_errors.get(type(e).__name__, 0) + 1
+            with lock:
+                latencies.extend(local_latencies)
+                for key, count in local_errors.items():
+                    errors[key] = errors.get(key, 0) + count
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        result = {
+            'label': options['label'],
+            'url': base_url,
+            'paths': paths,
+            'concurrency': options['concurrency'],
+            'duration_s': round(elapsed, 2),
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+            'latency_ms': latency_summary(latencies),
+        }
+
+        self.stdout.write(
+            f"{result['label'] or base_url}: {result['requests']} requests, "
+            f"{result['throughput_rps']} req/s, p50 {result['latency_ms']['p50']} ms, "
+            f"p95 {result['latency_ms']['p95']} ms, p99 {result['latency_ms']['p99']} ms, "
+            f"errors {sum(errors.values())}"
+        )
+        if options['output']:
+            with open(options['output'], 'a') as f:
+                f.write(json.dumps(result) + '\n')
+
+    def run_journeys(self, options):
+        try:
+            mix = journeys.DEFAULT_MIX if options['journeys'] == 'default' else journeys.parse_mix(options['journeys'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not options['user_pattern'] and not options['username']:
+            raise CommandError('Journeys need --username or --user-pattern')
+        base_url = options['url'].rstrip('/')
+        deadline = time.monotonic() + options['duration']
+        sessions = []
+        results = []
+        lock = threading.Lock()
+
+        def virtual_user(n):
+            session = journeys.Session(base_url)
+            username = options['user_pattern'].format(n=n % options['user_count']) if options['user_pattern'] else options['username']
+            try:
+                session.login(username, options['password'] or '')
+                if options['connect_gmail']:
+                    journeys.connect_gmail(session)
+            except journeys.StepFailed as e:
+                with lock:
+                    results.append(({}, {f"{e.step} {e.status}": 1}))
+                    sessions.append(session)
+                return
+            outcome = journeys.run_user(session, mix, deadline, options['think_ms'], seed=options['seed'] * 100003 + n)
+            with lock:
+                results.append(outcome)
+                sessions.append(session)
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=virtual_user, args=(n,)) for n in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        steps = {}
+        for session in sessions:
+            for step, seconds, status in session.samples:
+                steps.setdefault(step, []).append(seconds)
+        runs = {}
+        failures = {}
+        for journey_runs, journey_failures in results:
+            for name, count in journey_runs.items():
+                runs[name] = runs.get(name, 0) + count
+            for key, count in journey_failures.items():
+                failures[key] = failures.get(key, 0) + count
+        requests = sum(len(latencies) for latencies in steps.values())
+
+        result = {
+            'label': options['label'],
+            'url': base_url,
+            'journeys': mix,
+            'concurrency': options['concurrency'],
+            'think_ms': options['think_ms'],
+            'duration_s': round(elapsed, 2),
+            'requests': requests,
+            'throughput_rps': round(requests / elapsed, 1) if elapsed else 0,
+            'journeys_completed': runs,
+            'failures': failures,
+            'steps': {step: {'count': len(latencies), 'latency_ms': latency_summary(latencies)} for step, latencies in sorted(steps.items())},
+        }
+
+        self.stdout.write(
+            f"{result['label'] or base_url}: {options['concurrency']} users, {requests} requests, "
+            f"{result['throughput_rps']} req/s, {sum(runs.values())} journeys, {sum(failures.values())} failed"
+        )
+        for step, data in result['steps'].items():
+            latency = data['latency_ms']
+            self.stdout.write(
+                f"  {step:<22} {data['count']:>6}  p50 {latency['p50']:>8} ms  p95 {latency['p95']:>8} ms  p99 {latency['p99']:>8} ms"
+            )
+        for key, count in sorted(failures.items()):
+            self.stdout.write(self.style.ERROR(f"  failed {key}: {count}"))
+        if options['output']:
+            with open(options['output'], 'a') as f:
+                f.write(json.dumps(result) + '\n')
@@ -0,0 +1,60 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from crm.models.campaigns import Campaign
+from crm.services.campaign_service import HEARTBEAT_SECONDS, run_campaign
+
+class Command(BaseCommand):
+    help = 'Sends queued email campaigns, resuming interrupted ones from their cursor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, help='Run (or resume) a single campaign and exit')
+        parser.add_argument('--once', action='store_true', help='Exit when no campaign is waiting')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--stale-minutes', type=int, default=10,
+                            help='Running campaigns without a heartbeat for this long are considered orphaned and resumed')
+
+    def claim_next(self, stale_minutes):
+        stale_before = timezone.now() - datetime.timedelta(minutes=stale_minutes)
+        candidates = Campaign.objects.filter(
+            Q(status='queued') | Q(status='running', updated_at__lt=stale_before)
+        ).order_by('created_at').values_list('id', 'status', 'updated_at')
+        for campaign_id, status, updated_at in candidates[:10]:
+            # Conditional update: only one runner wins the claim
+            claimed = Campaign.objects.filter(id=campaign_id, status=status, updated_at=updated_at).update(
+                status='running', updated_at=timezone.now()
+            )
+            if claimed:
+                return Campaign.objects.select_related('owner', 'template', 'view').get(id=campaign_id)
+        return None
+
+    def handle(self, *args, **options):
+        if options['campaign']:
+            campaign = Campaign.objects.select_related('owner', 'template', 'view').filter(id=options['campaign']).first()
+            if not campaign:
+                raise CommandError(f"Campaign {options['campaign']} not found")
+            if campaign.status == 'completed':
+                raise CommandError(f"Campaign {campaign.id} is already completed")
+            Campaign.objects.filter(id=campaign.id).update(status='running')
+            status = run_campaign(campaign, options['batch_size'], self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Campaign {campaign.id}: {status}"))
+            return
+
+        if options['stale_minutes'] * 60 < 2 * HEARTBEAT_SECONDS:
+            raise CommandError(f"--stale-minutes must cover at least two heartbeats ({2 * HEARTBEAT_SECONDS} seconds)")
+        while True:
+            campaign = self.claim_next(options['stale_minutes'])
+            if campaign:
+                try:
+                    status = run_campaign(campaign, options['batch_size'], self.stdout)
+                    self.stdout.write(self.style.SUCCESS(f"Campaign {campaign.id}: {status}"))
+                except Exception as e:
+                    Campaign.objects.filter(id=campaign.id).update(status='failed', last_error=str(e))
+                    self.stdout.write(self.style.ERROR(f"Campaign {campaign.id} failed: {e}"))
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,60 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from crm.models.exports import ExportJob
+from crm.services.export_service import delete_expired_exports, run_export
+
+class Command(BaseCommand):
+    help = 'Renders queued client and task exports and removes expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', type=int, help='Render a single export job and exit')
+        parser.add_argument('--once', action='store_true', help='Exit when no export is waiting')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds between polls')
+        parser.add_argument('--chunk-size', type=int)
+        parser.add_argument('--stale-minutes', type=int, default=10,
+                            help='Running exports without progress for this long are considered orphaned and restarted')
+
+    def claim_next(self, stale_minutes):
+        stale_before = timezone.now() - datetime.timedelta(minutes=stale_minutes)
+        candidates = ExportJob.objects.filter(
+            Q(status='queued') | Q(status='running', updated_at__lt=stale_before)
+        ).order_by('created_at').values_list('id', 'status', 'updated_at')
+        for job_id, status, updated_at in candidates[:10]:
+            # Conditional update: only one runner wins the claim
+            claimed = ExportJob.objects.filter(id=job_id, status=status, updated_at=updated_at).update(
+                status='running', updated_at=timezone.now()
+            )
+            if claimed:
+                return ExportJob.objects.select_related('owner').get(id=job_id)
+        return None
+
+    def run(self, job, chunk_size):
+        try:
+            status = run_export(job, chunk_size, self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Export {job.id}: {status}"))
+        except Exception as e:
+            ExportJob.objects.filter(id=job.id).update(status='failed', last_error=str(e), finished_at=timezone.now())
+            self.stdout.write(self.style.ERROR(f"Export {job.id} failed: {e}"))
+
+    def handle(self, *args, **options):
+        if options['job']:
+            job = ExportJob.objects.select_related('owner').filter(id=options['job']).first()
+            if not job:
+                raise CommandError(f"Export {options['job']} not found")
+            self.run(job, options['chunk_size'])
+            return
+
+        while True:
+            deleted = delete_expired_exports()
+            if deleted:
+                self.stdout.write(f"Removed {deleted} expired exports")
+            job = self.claim_next(options['stale_minutes'])
+            if job:
+                self.run(job, options['chunk_size'])
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
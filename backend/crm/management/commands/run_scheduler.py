@@ -0,0 +1,41 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from crm.services.scheduler import run_scheduler
+
+class Command(BaseCommand):
+    help = (
+        'Fires time-based workflow triggers (TASK_OVERDUE, CLIENT_CREATED_DAYS_AGO). '
+        'Run a single scheduler process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one pass and exit')
+        parser.add_argument('--interval', type=float, default=settings.SCHEDULER_INTERVAL, help='Seconds between passes')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--now', help='Run one pass as if it were this ISO datetime (frozen clock)')
+
+    def run_pass(self, now, batch_size):
+        results = run_scheduler(now=now, batch_size=batch_size)
+        handled = {name: count for name, count in results.items() if count}
+        if handled:
+            summary = ', '.join(f"{name}: {count}" for name, count in handled.items())
+            self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} {summary}")
+
+    def handle(self, *args, **options):
+        if options['now']:
+            now = parse_datetime(options['now'])
+            if now is None:
+                raise CommandError(f"Invalid datetime: {options['now']}")
+            if timezone.is_naive(now):
+                now = timezone.make_aware(now)
+            self.run_pass(now, options['batch_size'])
+            return
+
+        while True:
+            self.run_pass(None, options['batch_size'])
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,66 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from pathlib import Path
+
+class Command(BaseCommand):
+    help = 'Verifies that the database, cache and static files are ready before serving traffic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-static', action='store_true', help='Do not require collected static files')
+
+    def handle(self, *args, **options):
+        errors = []
+        warnings = []
+
+        # 1. Database reachable
+        try:
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f"Database: OK ({connection.vendor}, {elapsed:.1f} ms)")
+        except Exception as e:
+            errors.append(f"Database unreachable: {e}")
+
+        # 2. Migrations applied
+        if not errors:
+            executor = MigrationExecutor(connection)
+            plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+            if plan:
+                errors.append(f"{len(plan)} unapplied migrations, run `python manage.py migrate`")
+            else:
+                self.stdout.write("Migrations: OK")
+
+        # 3. Cache round-trip
+        try:
+            cache.set('crm:selfcheck', 'ok', 10)
+            if cache.get('crm:selfcheck') != 'ok':
+                raise RuntimeError('value not returned')
+            self.stdout.write(f"Cache: OK ({settings.CACHES['default']['BACKEND']})")
+        except Exception as e:
+            errors.append(f"Cache unavailable: {e}")
+
+        # 4. Static files collected
+        if not options['skip_static']:
+            if (Path(settings.STATIC_ROOT) / 'admin').is_dir():
+                self.stdout.write(f"Static files: OK ({settings.STATIC_ROOT})")
+            else:
+                errors.append(f"Static files missing in {settings.STATIC_ROOT}, run `python manage.py collectstatic`")
+
+        # 5. Production settings
+        if settings.DEBUG:
+            warnings.append('DEBUG is enabled')
+        if settings.SECRET_KEY.startswith('django-insecure-'):
+            warnings.append('SECRET_KEY is the insecure development key')
+        if not settings.GOOGLE_CLIENT_ID or not settings.GOOGLE_CLIENT_SECRET:
+            warnings.append('Google credentials are not configured, email sync and send will fail')
+
+        for warning in warnings:
+            self.stdout.write(self.style.WARNING(f"Warning: {warning}"))
+        if errors:
+            raise CommandError('Self-check failed:\n' + '\n'.join(f"  - {e}" for e in errors))
+        self.stdout.write(self.style.SUCCESS('Self-check passed'))
@@ -0,0 +1,121 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Optional or rarely used libraries that should only load when a request needs them
+HEAVY_MODULES = (
+    'pandas', 'numpy', 'openpyxl', 'pyarrow',
+    'googleapiclient', 'google_auth_oauthlib', 'google.oauth2', 'oauthlib',
+)
+# What each stage runs in a fresh interpreter, after the timer starts
+STAGES = {
+    # Every management command
+    'setup': 'import django; django.setup()',
+    # A gunicorn worker: the ASGI application, then the URLconf loaded by its first request
+    'worker': (
+        'from config.asgi import application; '
+        'from importlib import import_module; from django.conf import settings; '
+        'import_module(settings.ROOT_URLCONF)'
+    ),
+}
+# ru_maxrss survives exec, so the RSS of the fresh interpreter is read from /proc where there is one
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+{code}
+seconds = time.perf_counter() - started
+try:
+    with open('/proc/self/status') as f:
+        rss_mb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:')) / 1024
+except OSError:
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{
+    'seconds': seconds,
+    'rss_mb': rss_mb,
+    'modules': len(sys.modules),
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+class Command(BaseCommand):
+    help = (
+        'Measures import time and memory of Django setup and of an API worker, each in fresh interpreters, '
+        'and which heavy libraries they load'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per stage')
+        parser.add_argument('--imports', type=int, default=0,
+                            help='Also list the N packages a worker spends most import time in (python -X importtime)')
+        parser.add_argument('--output', help='Write the result as JSON to this file')
+        parser.add_argument('--check', action='store_true',
+                            help='Fail when a stage loads one of the heavy libraries')
+
+    def run_probe(self, code, *flags):
+        probe = subprocess.run(
+            [sys.executable, *flags, '-c', PROBE.format(code=code, heavy=HEAVY_MODULES)],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')},
+        )
+        if probe.returncode:
+            raise CommandError(f"Startup probe failed:\n{probe.stderr[-2000:]}")
+        return json.loads(probe.stdout.strip().splitlines()[-1]), probe.stderr
+
+    def handle(self, *args, **options):
+        # The bare interpreter, subtracted to get what the project adds
+        baseline = [self.run_probe('pass')[0] for _ in range(options['repeat'])]
+        base_seconds = statistics.median(run['seconds'] for run in baseline)
+        base_rss = statistics.median(run['rss_mb'] for run in baseline)
+        result = {'python': {'seconds': base_seconds, 'rss_mb': base_rss}, 'stages': {}}
+        self.stdout.write(f"{'python':<8} {base_seconds * 1000:>8.0f} ms  {base_rss:>7.1f} MB RSS")
+
+        failures = []
+        for name, code in STAGES.items():
+            runs = [self.run_probe(code)[0] for _ in range(options['repeat'])]
+            stage = result['stages'][name] = {
+                'seconds': statistics.median(run['seconds'] for run in runs),
+                'max_seconds': max(run['seconds'] for run in runs),
+                'rss_mb': statistics.median(run['rss_mb'] for run in runs),
+                'modules': runs[0]['modules'],
+                'heavy': runs[0]['heavy'],
+            }
+            self.stdout.write(
+                f"{name:<8} {stage['seconds'] * 1000:>8.0f} ms  {stage['rss_mb']:>7.1f} MB RSS "
+                f"(+{stage['rss_mb'] - base_rss:.1f} MB)  {stage['modules']:>5} modules"
+                + (f"  loads {', '.join(stage['heavy'])}" if stage['heavy'] else '')
+            )
+            if stage['heavy']:
+                failures.append(f"{name} loads {', '.join(stage['heavy'])}")
+
+        if options['imports']:
+            _, stderr = self.run_probe(STAGES['worker'], '-X', 'importtime')
+            result['import_time'] = self.import_time_by_package(stderr, options['imports'])
+            self.stdout.write("\nImport time of a worker by package:")
+            for package, micros in result['import_time']:
+                self.stdout.write(f"  {micros / 1000:>8.1f} ms  {package}")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(f"Result written to {options['output']}")
+        if options['check'] and failures:
+            raise CommandError('; '.join(failures))
+
+    def import_time_by_package(self, stderr, limit):
+        """
+        [(top-level package, microseconds)] summed from the self times
+        -X importtime reports for its modules, slowest first.
+        """
+        packages = {}
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            own, _, module = line[len('import time:'):].split('|')
+            if own.strip().isdigit():
+                package = module.strip().split('.')[0]
+                packages[package] = packages.get(package, 0) + int(own)
+        return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
@@ -0,0 +1,412 @@
+"""
+In-process request metrics: per-view query counts, DB time, serialization
+time and latency, recorded by crm.middleware.MetricsMiddleware.
+
+Every sample goes into a rolling histogram (the last METRICS_WINDOW seconds,
+for p50/p95/p99) and into running totals. render_prometheus() exposes both in
+the Prometheus text format as summaries.
+
+Metrics are recorded per worker process. With METRICS_DIR set, every worker
+also writes them to a file of its own there (once a second, from a
+background thread) and the worker serving the scrape merges all files, so
+the series cover every worker and survive worker restarts. Files of workers
+that exited are folded into one archive file.
+"""
+import bisect
+import contextvars
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from django.conf import settings
+from crm import cache
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+def _geometric(start, stop, factor):
+    bounds = []
+    value = start
+    while value < stop:
+        bounds.append(value)
+        value *= factor
+    bounds.append(stop)
+    return bounds
+
+SECONDS_BOUNDS = _geometric(0.0005, 60.0, 1.25)
+# Exact up to 20, then integer buckets growing by 25%
+COUNT_BOUNDS = sorted(set(range(21)) | {round(b) for b in _geometric(20, 10000, 1.25)})
+
+# name: (help, histogram bounds, integer values)
+METRICS = {
+    'duration_seconds': ('Total request latency', SECONDS_BOUNDS, False),
+    'db_seconds': ('Time spent in database queries', SECONDS_BOUNDS, False),
+    'serialization_seconds': ('Time spent rendering the response data', SECONDS_BOUNDS, False),
+    'queries': ('Database queries per request', COUNT_BOUNDS, True),
+}
+
+class RollingHistogram:
+    """
+    Bucket counts over a sliding window of `slots` slots of `slot_seconds`
+    each. Quantiles are interpolated within the bucket they fall in (between
+    the integers of the bucket for integer values).
+    """
+    def __init__(self, bounds, window, integer=False, slots=10):
+        self.bounds = bounds
+        self.integer = integer
+        self.slot_seconds = window / slots
+        self.slots = [(None, None)] * slots
+
+    def _slot(self, now):
+        tick = int(now // self.slot_seconds)
+        index = tick % len(self.slots)
+        slot_tick, counts = self.slots[index]
+        if slot_tick != tick:
+            counts = [0] * (len(self.bounds) + 1)
+            self.slots[index] = (tick, counts)
+        return counts
+
+    def observe(self, value, now):
+        self._slot(now)[bisect.bisect_left(self.bounds, value)] += 1
+
+    def merge(self, slots):
+        """
+        Adds the (tick, counts) slots of the same histogram kept elsewhere.
+        """
+        for tick, counts in slots:
+            index = tick % len(self.slots)
+            slot_tick, mine = self.slots[index]
+            if slot_tick == tick:
+                for i, count in enumerate(counts):
+                    mine[i] += count
+            elif slot_tick is None or slot_tick < tick:
+                self.slots[index] = (tick, list(counts))
+
+    def quantiles(self, quantiles, now):
+        oldest = int(now // self.slot_seconds) - len(self.slots) + 1
+        merged = [0] * (len(self.bounds) + 1)
+        for tick, counts in self.slots:
+            if tick is not None and tick >= oldest:
+                for i, count in enumerate(counts):
+                    merged[i] += count
+        total = sum(merged)
+        if not total:
+            return {}
+
+        result = {}
+        for q in quantiles:
+            rank = q * total
+            seen = 0
+            for i, count in enumerate(merged):
+                if count and seen + count >= rank:
+                    lower = self.bounds[i - 1] if i > 0 else 0.0
+                    upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                    if self.integer:
+                        lower = min(lower + 1, upper) if i > 0 else upper
+                    result[q] = lower + (upper - lower) * (rank - seen) / count
+                    break
+                seen += count
+        return result
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._sums = defaultdict(float)
+        self._counts = defaultdict(int)
+        self._errors = defaultdict(int)
+
+    def _histogram(self, key):
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            _, bounds, integer = METRICS[key[1]]
+            histogram = self._histograms[key] = RollingHistogram(bounds, settings.METRICS_WINDOW, integer)
+        return histogram
+
+    def record(self, view, values, status):
+        # Wall clock time, so histograms of different processes line up
+        now = time.time()
+        with self._lock:
+            for name, value in values.items():
+                key = (view, name)
+                self._histogram(key).observe(value, now)
+                self._sums[key] += value
+                self._counts[key] += 1
+            if status >= 500:
+                self._errors[view] += 1
+
+    def state(self):
+        """
+        Everything recorded, as JSON-compatible lists for merge().
+        """
+        with self._lock:
+            return {
+                'histograms': [
+                    [view, name, [[tick, list(counts)] for tick, counts in histogram.slots if tick is not None]]
+                    for (view, name), histogram in self._histograms.items()
+                ],
+                'sums': [[view, name, value] for (view, name), value in self._sums.items()],
+                'counts': [[view, name, value] for (view, name), value in self._counts.items()],
+                'errors': [[view, count] for view, count in self._errors.items()],
+            }
+
+    def merge(self, state):
+        with self._lock:
+            for view, name, slots in state['histograms']:
+                self._histogram((view, name)).merge(slots)
+            for view, name, value in state['sums']:
+                self._sums[(view, name)] += value
+            for view, name, value in state['counts']:
+                self._counts[(view, name)] += value
+            for view, count in state['errors']:
+                self._errors[view] += count
+
+    def snapshot(self):
+        """
+        {(view, metric): {'quantiles': {q: value}, 'sum': ..., 'count': ...}}
+        and {view: 5xx responses}.
+        """
+        now = time.time()
+        with self._lock:
+            metrics = {
+                key: {
+                    'quantiles': histogram.quantiles(QUANTILES, now),
+                    'sum': self._sums[key],
+                    'count': self._counts[key],
+                }
+                for key, histogram in self._histograms.items()
+            }
+            return metrics, dict(self._errors)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._sums.clear()
+            self._counts.clear()
+            self._errors.clear()
+
+registry = Registry()
+
+FLUSH_INTERVAL = 1.0
+ARCHIVE_FILE = 'archive.json'
+
+_dirty = threading.Event()
+_worker = {'key': None, 'pid': None, 'path': None}
+_worker_lock = threading.Lock()
+
+def _start_flushing():
+    """
+    Marks this process's metrics for the next flush, picking its file in
+    METRICS_DIR and starting the flush thread first in a new process.
+    """
+    _dirty.set()
+    key = (os.getpid(), settings.METRICS_DIR)
+    if _worker['key'] == key:
+        return
+    with _worker_lock:
+        if _worker['key'] != key:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            if _worker['pid'] != os.getpid():
+                threading.Thread(target=_flush_loop, name='crm-metrics-flush', daemon=True).start()
+            # Unique even when the pid of an exited worker is reused
+            name = f'worker-{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+            _worker.update(key=key, pid=os.getpid(), path=os.path.join(settings.METRICS_DIR, name))
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if _dirty.is_set():
+            try:
+                flush()
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", settings.METRICS_DIR, e)
+
+def _write(path, state):
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(state, f)
+    os.replace(temporary, path)
+
+def flush():
+    """
+    Writes this process's metrics to its file in METRICS_DIR.
+    """
+    _start_flushing()
+    _dirty.clear()
+    _write(_worker['path'], {'pid': os.getpid(), **registry.state(), 'cache': cache.stats()})
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+@contextmanager
+def _locked(directory):
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Removed by a concurrent archive run
+        return None
+
+def _merge_cache_stats(totals, stats):
+    for namespace, counters in stats.items():
+        for event, amount in counters.items():
+            totals[namespace][event] += amount
+
+def record(view, values, status):
+    """
+    Records one request of view in this process's registry.
+    """
+    registry.record(view, values, status)
+    if settings.METRICS_DIR:
+        _start_flushing()
+
+def collect():
+    """
+    (metrics, errors, cache stats) as in Registry.snapshot() and
+    crm.cache.stats(): of this process, or with METRICS_DIR of every worker
+    that wrote there, including the ones that exited.
+    """
+    if not settings.METRICS_DIR:
+        return (*registry.snapshot(), cache.stats())
+
+    flush()
+    directory = settings.METRICS_DIR
+    combined = Registry()
+    cache_stats = defaultdict(lambda: defaultdict(int))
+    with _locked(directory):
+        archive = Registry()
+        archive_cache = defaultdict(lambda: defaultdict(int))
+        archived = _read(os.path.join(directory, ARCHIVE_FILE))
+        if archived:
+            archive.merge(archived)
+            _merge_cache_stats(archive_cache, archived['cache'])
+
+        exited = []
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith('worker-') and name.endswith('.json')):
+                continue
+            state = _read(os.path.join(directory, name))
+            if state is None:
+                continue
+            if _is_running(state['pid']):
+                combined.merge(state)
+                _merge_cache_stats(cache_stats, state['cache'])
+            else:
+                archive.merge(state)
+                _merge_cache_stats(archive_cache, state['cache'])
+                exited.append(name)
+
+        if exited:
+            _write(os.path.join(directory, ARCHIVE_FILE), {**archive.state(), 'cache': archive_cache})
+            for name in exited:
+                os.remove(os.path.join(directory, name))
+    combined.merge(archive.state())
+    _merge_cache_stats(cache_stats, archive_cache)
+    return (*combined.snapshot(), {namespace: dict(counters) for namespace, counters in cache_stats.items()})
+
+class RequestStats:
+    def __init__(self, view):
+        self.view = view
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+
+_current = contextvars.ContextVar('crm_request_stats', default=None)
+
+def start_request(view):
+    stats = RequestStats(view)
+    return stats, _current.set(stats)
+
+def end_request(token):
+    _current.reset(token)
+
+def current_request():
+    return _current.get()
+
+def _caller(stack):
+    # Innermost frame of our own code, skipping Django, DRF and this module
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(stack):
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename and not frame.filename.endswith('metrics.py'):
+            return f"{os.path.relpath(frame.filename, base_dir)}:{frame.lineno} in {frame.name}"
+    return 'unknown'
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper: counts and times every query of the current
+    request and reports those slower than METRICS_SLOW_QUERY_MS.
+    """
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        threshold = settings.METRICS_SLOW_QUERY_MS
+        if threshold and elapsed * 1000 >= threshold:
+            view = stats.view if stats else '-'
+            logger.warning("Slow query (%.1f ms) in %s from %s: %s", elapsed * 1000, view, _caller(traceback.extract_stack()), sql[:500])
+
+def install(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_prometheus():
+    """
+    All metrics in the Prometheus text exposition format (version 0.0.4).
+    """
+    metrics, errors, cache_stats = collect()
+    lines = []
+    for name, (help_text, _, _) in METRICS.items():
+        metric = f'crm_request_{name}'
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} summary')
+        for (view, metric_name), data in sorted(metrics.items()):
+            if metric_name != name:
+                continue
+            labels = f'view="{_escape(view)}"'
+            for q, value in sorted(data['quantiles'].items()):
+                lines.append(f'{metric}{{{labels},quantile="{q}"}} {value:.6g}')
+            lines.append(f'{metric}_sum{{{labels}}} {data["sum"]:.6g}')
+            lines.append(f'{metric}_count{{{labels}}} {data["count"]}')
+
+    lines.append('# HELP crm_request_errors_total Responses with a 5xx status')
+    lines.append('# TYPE crm_request_errors_total counter')
+    for view, count in sorted(errors.items()):
+        lines.append(f'crm_request_errors_total{{view="{_escape(view)}"}} {count}')
+
+    lines.append('# HELP crm_cache_events_total crm.cache hits, misses, computes and invalidations')
+    lines.append('# TYPE crm_cache_events_total counter')
+    for namespace, counters in sorted(cache_stats.items()):
+        for event, amount in sorted(counters.items()):
+            if event == 'compute_ms':
+                continue
+            lines.append(f'crm_cache_events_total{{namespace="{_escape(namespace)}",event="{event}"}} {amount}')
+    return '\n'.join(lines) + '\n'
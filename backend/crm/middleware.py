@@ -0,0 +1,209 @@
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse
+from crm import metrics, profiling
+from crm.uploads import RequestSizeLimitHandler
+
+logger = logging.getLogger(__name__)
+
+def _install_on_new_connection(sender, connection, **kwargs):
+    metrics.install(connection)
+
+def view_tag(view_func, method):
+    """
+    "ClientViewSet.list", "SavedViewViewSet.counts", "UserConfigView.get" or
+    the function name of plain views.
+    """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'unknown')
+    actions = getattr(view_func, 'actions', None) or {}
+    return f"{cls.__name__}.{actions.get(method.lower(), method.lower())}"
+
+class MetricsMiddleware:
+    """
+    Records query count, DB time, serialization time and latency of every
+    request under its view (see crm.metrics). Disabled with METRICS_ENABLED.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Async views query from worker threads, whose connections are new
+        connection_created.connect(_install_on_new_connection, dispatch_uid='crm_metrics_install')
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, token = metrics.start_request('unmatched')
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self._record(stats, started, response)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request('unmatched')
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self._record(stats, started, response)
+        return response
+
+    def _record(self, stats, started, response):
+        metrics.record(stats.view, {
+            'duration_seconds': time.perf_counter() - started,
+            'db_seconds': stats.db_seconds,
+            'serialization_seconds': stats.serialization_seconds,
+            'queries': stats.queries,
+        }, response.status_code)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Runs on the thread of sync views, also under ASGI
+        for connection in connections.all(initialized_only=True):
+            metrics.install(connection)
+        stats = metrics.current_request()
+        if stats is not None:
+            stats.view = view_tag(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered (data to JSON) after the view returns
+        stats = metrics.current_request()
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.serialization_seconds += time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
+
+def format_size(size):
+    for unit, scale in (('MB', 1024 * 1024), ('KB', 1024)):
+        if size >= scale:
+            return f"{size / scale:.3g} {unit}"
+    return f"{size} bytes"
+
+class RequestSizeLimitMiddleware:
+    """
+    Rejects requests to views marked with crm.decorators.max_request_size
+    that exceed the limit, with a 413. Must come before CsrfViewMiddleware,
+    which reads request.POST: the Content-Length is checked and multipart
+    bodies are parsed here, behind a RequestSizeLimitHandler that stops
+    at the limit whatever the Content-Length claims.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        setting = getattr(view_func, 'max_request_size_setting', None)
+        if setting is None:
+            return None
+        max_size = getattr(settings, setting)
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > max_size:
+            return self.too_large(max_size)
+        if request.content_type == 'multipart/form-data':
+            size_limit = RequestSizeLimitHandler(request, max_size)
+            request.upload_handlers.insert(0, size_limit)
+            request.POST  # parsed now, through the handler
+            if size_limit.exceeded:
+                return self.too_large(max_size)
+        return None
+
+    def too_large(self, max_size):
+        return JsonResponse({"error": f"Request exceeds {format_size(max_size)}"}, status=413)
+
+class ProfilingMiddleware:
+    """
+    Profiles the view and response rendering of staff requests that ask for
+    it (see crm.profiling) and returns the profile id in X-Profile-Id. Other
+    requests only pay for a header lookup. Disabled with PROFILING_ENABLED.
+
+    A view that raises is profiled too. Its exception is raised again once
+    the profile is saved, and Django turns it into the usual error response,
+    which MetricsMiddleware counts. process_exception hooks would not see
+    it, so no middleware in MIDDLEWARE may rely on one.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Runs on the thread of sync views, also under ASGI, so the profile
+        # covers this request only. Async views are not profiled.
+        mode = profiling.requested_mode(request)
+        if mode is None or iscoroutinefunction(view_func) or not request.user.is_staff:
+            return None
+
+        def view():
+            # The exception is returned, so the profile is kept
+            try:
+                response = view_func(request, *view_args, **view_kwargs)
+                if callable(getattr(response, 'render', None)):
+                    response.render()
+            except Exception as e:
+                return None, e
+            return response, None
+
+        stats = metrics.current_request()
+        queries, db_seconds = (stats.queries, stats.db_seconds) if stats else (0, 0.0)
+        started = time.perf_counter()
+        (response, error), profile_stats, stacks = profiling.profile_call(mode, view)
+        meta = {
+            'mode': mode,
+            'view': view_tag(view_func, request.method),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': request.user.get_username(),
+            'status': response.status_code if error is None else 500,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'queries': stats.queries - queries if stats else None,
+            'db_ms': round((stats.db_seconds - db_seconds) * 1000, 1) if stats else None,
+        }
+        if error is not None:
+            meta['error'] = repr(error)
+        try:
+            profile_id = profiling.save(meta, profile_stats, stacks)
+        except OSError as e:
+            logger.warning("Could not save profile of %s: %s", meta['view'], e)
+            profile_id = None
+        if error is not None:
+            raise error
+        if profile_id is not None:
+            response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0019_campaign'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflow',
+            name='trigger_config',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='workflow',
+            name='trigger_type',
+            field=models.CharField(choices=[('CLIENT_CREATED', 'Client Created'), ('CLIENT_UPDATED', 'Client Updated'), ('TASK_STATUS_CHANGED', 'Task Status Changed'), ('TASK_OVERDUE', 'Task Overdue'), ('EMAIL_RECEIVED', 'Email Received')], max_length=50),
+        ),
+    ]
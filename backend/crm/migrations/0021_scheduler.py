@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0020_workflow_triggers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('processed_until', models.DateTimeField()),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='workflow',
+            name='trigger_type',
+            field=models.CharField(choices=[('CLIENT_CREATED', 'Client Created'), ('CLIENT_UPDATED', 'Client Updated'), ('TASK_STATUS_CHANGED', 'Task Status Changed'), ('TASK_OVERDUE', 'Task Overdue'), ('EMAIL_RECEIVED', 'Email Received'), ('CLIENT_CREATED_DAYS_AGO', 'Days After Client Created')], max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='crm_client_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['due_date', 'id'], name='crm_task_due_date_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0021_scheduler'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkflowExecution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_key', models.CharField(max_length=255)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workflow_executions', to='crm.client')),
+                ('workflow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='executions', to='crm.workflow')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('workflow', 'client', 'event_key'), name='crm_workflow_execution_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,129 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:15
+
+import hashlib
+import html
+import re
+import zlib
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+HTML_TAG = re.compile(r'<\s*/?\s*[a-zA-Z][a-zA-Z0-9]*(\s[^>]*)?/?>')
+BLOCK_TAGS = re.compile(r'<\s*(br|/p|/div|/li|/tr|/h[1-6]|/blockquote)\b[^>]*>', re.IGNORECASE)
+TAGS = re.compile(r'<[^>]*>')
+
+
+def move_bodies(apps, schema_editor):
+    # Frozen copy of crm.services.email_content, which may change later
+    Email = apps.get_model('crm', 'Email')
+    EmailContent = apps.get_model('crm', 'EmailContent')
+    last_id = 0
+    while True:
+        batch = list(
+            Email.objects.filter(id__gt=last_id).exclude(body__isnull=True).exclude(body='')
+            .order_by('id').values_list('id', 'body')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        hashes = {pk: hashlib.sha256(body.encode()).hexdigest() for pk, body in batch}
+        existing = set(EmailContent.objects.filter(content_hash__in=set(hashes.values())).values_list('content_hash', flat=True))
+        contents = {}
+        for pk, body in batch:
+            key = hashes[pk]
+            if key in existing or key in contents:
+                continue
+            raw = body.encode()
+            packed = zlib.compress(raw, 6)
+            compressed = len(packed) < len(raw)
+            contents[key] = EmailContent(content_hash=key, data=packed if compressed else raw, compressed=compressed, size=len(raw))
+        EmailContent.objects.bulk_create(contents.values(), ignore_conflicts=True)
+        ids = dict(EmailContent.objects.filter(content_hash__in=set(hashes.values())).values_list('content_hash', 'id'))
+        emails = []
+        for pk, body in batch:
+            is_html = bool(HTML_TAG.search(body))
+            text = html.unescape(TAGS.sub('', BLOCK_TAGS.sub(' ', body))) if is_html else body
+            emails.append(Email(
+                id=pk,
+                html_content_id=ids[hashes[pk]] if is_html else None,
+                text_content_id=None if is_html else ids[hashes[pk]],
+                snippet=' '.join(text[:800].split())[:200],
+            ))
+        _update(schema_editor, Email, emails, ['html_content_id', 'text_content_id', 'snippet'])
+
+
+def _update(schema_editor, Email, emails, fields):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        Email.objects.bulk_update(emails, fields)
+        return
+    # bulk_update builds a CASE per column and row, an UPDATE from VALUES is much cheaper
+    columns = [Email._meta.get_field(name).column for name in fields]
+    db_types = [Email._meta.get_field(name).db_type(connection) for name in fields]
+    values = ', '.join(['(%s' + ', %s' * len(fields) + ')'] * len(emails))
+    assignments = ', '.join(f'{column} = v.{column}::{db_type}' for column, db_type in zip(columns, db_types))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {Email._meta.db_table} SET {assignments} "
+            f"FROM (VALUES {values}) AS v(id, {', '.join(columns)}) WHERE {Email._meta.db_table}.id = v.id",
+            [value for email in emails for value in [email.id] + [getattr(email, name) for name in fields]],
+        )
+
+
+def restore_bodies(apps, schema_editor):
+    Email = apps.get_model('crm', 'Email')
+    EmailContent = apps.get_model('crm', 'EmailContent')
+    last_id = 0
+    while True:
+        batch = list(
+            Email.objects.filter(id__gt=last_id).exclude(html_content=None, text_content=None)
+            .order_by('id').values_list('id', 'html_content_id', 'text_content_id')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        contents = {
+            pk: zlib.decompress(bytes(data)) if compressed else bytes(data)
+            for pk, data, compressed in EmailContent.objects.filter(
+                id__in={html_id or text_id for _, html_id, text_id in batch}
+            ).values_list('id', 'data', 'compressed')
+        }
+        emails = [Email(id=pk, body=contents[html_id or text_id].decode()) for pk, html_id, text_id in batch]
+        _update(schema_editor, Email, emails, ['body'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0025_exportjob_typed_formats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('data', models.BinaryField()),
+                ('compressed', models.BooleanField(default=True)),
+                ('size', models.PositiveIntegerField(help_text='Uncompressed size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='snippet',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='html_content',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='crm.emailcontent'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='text_content',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='crm.emailcontent'),
+        ),
+        migrations.RunPython(move_bodies, restore_bodies),
+    ]
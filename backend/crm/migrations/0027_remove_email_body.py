@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Separate from 0026: PostgreSQL cannot alter a table with pending foreign key checks in the same transaction
+
+    dependencies = [
+        ('crm', '0026_email_content'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='email',
+            name='body',
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:32
+
+import django.db.models.deletion
+from email.utils import getaddresses
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def build_threads(apps, schema_editor):
+    # Frozen copy of crm.services.email_threads.rebuild_threads
+    Email = apps.get_model('crm', 'Email')
+    EmailThread = apps.get_model('crm', 'EmailThread')
+    rows = Email.objects.order_by('user_id', 'thread_id', 'timestamp', 'id').values_list(
+        'user_id', 'thread_id', 'subject', 'snippet', 'from_email', 'to_email', 'timestamp', 'client_id'
+    )
+    batch = []
+    thread = None
+    for user_id, thread_id, subject, snippet, from_email, to_email, timestamp, client_id in rows.iterator(chunk_size=BATCH_SIZE):
+        if thread is None or (thread.user_id, thread.thread_id) != (user_id, thread_id):
+            if len(batch) >= BATCH_SIZE:
+                EmailThread.objects.bulk_create(batch)
+                batch = []
+            thread = EmailThread(user_id=user_id, thread_id=thread_id, subject=subject or '', participants=[])
+            batch.append(thread)
+        thread.message_count += 1
+        found = {address.lower() for _, address in getaddresses([from_email or '', to_email or ''])} - {'', 'me'}
+        thread.participants = sorted(set(thread.participants) | found)
+        thread.last_message_at = timestamp
+        thread.snippet = snippet
+        if client_id:
+            thread.client_id = client_id
+    EmailThread.objects.bulk_create(batch)
+    Email.objects.update(email_thread=models.Subquery(EmailThread.objects.filter(
+        user_id=models.OuterRef('user_id'), thread_id=models.OuterRef('thread_id')
+    ).values('id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0027_remove_email_body'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailThread',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.CharField(max_length=255)),
+                ('subject', models.CharField(blank=True, default='', max_length=512)),
+                ('snippet', models.CharField(blank=True, default='', max_length=200)),
+                ('participants', models.JSONField(blank=True, default=list)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_message_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='email_threads', to='crm.client')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_threads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='email_thread',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='emails', to='crm.emailthread'),
+        ),
+        migrations.AddIndex(
+            model_name='emailthread',
+            index=models.Index(fields=['user', '-last_message_at', '-id'], name='crm_thread_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailthread',
+            index=models.Index(fields=['client', '-last_message_at', '-id'], name='crm_thread_client_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='emailthread',
+            constraint=models.UniqueConstraint(fields=('user', 'thread_id'), name='crm_emailthread_user_thread_uniq'),
+        ),
+        migrations.RunPython(build_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0028_email_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('next_at', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CampaignFailure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('error', models.TextField(blank=True, default='')),
+                ('attempts', models.IntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failures', to='crm.campaign')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_failures', to='crm.client')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('campaign', 'client'), name='crm_campaign_failure_unique')],
+            },
+        ),
+    ]
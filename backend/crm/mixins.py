@@ -0,0 +1,62 @@
+import hashlib
+import json
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from crm.versioning import get_versions
+
+class ConditionalGetMixin:
+    """
+    Adds ETag/Last-Modified headers to list and retrieve actions and answers
+    matching If-None-Match/If-Modified-Since requests with 304 Not Modified.
+
+    The validators are derived from DataVersion counters instead of hashing the
+    response, so a 304 costs a single query on the version table. ViewSets opt in
+    by listing the scopes their responses depend on; "{user}" is replaced with
+    the requesting user's id:
+
+        version_scopes = ('client', 'savedview', 'userconfig:{user}')
+    """
+    version_scopes = ()
+
+    def get_version_scopes(self):
+        user_id = self.request.user.pk
+        return [scope.format(user=user_id) for scope in self.version_scopes]
+
+    def get_conditional_validators(self):
+        versions = get_versions(self.get_version_scopes())
+        user = self.request.user
+        seed = json.dumps([
+            user.pk,
+            user.is_staff,
+            user.is_superuser,
+            self.request.get_full_path(),
+            self.request.META.get('HTTP_ACCEPT', ''),
+            sorted((scope, version) for scope, (version, _) in versions.items()),
+        ])
+        etag = quote_etag(hashlib.sha1(seed.encode()).hexdigest())
+        timestamps = [updated_at for _, updated_at in versions.values() if updated_at]
+        last_modified = int(max(timestamps).timestamp()) if timestamps else None
+        return etag, last_modified
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if not self.version_scopes or request.method not in ('GET', 'HEAD'):
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified = self.get_conditional_validators()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
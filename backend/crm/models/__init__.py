@@ -1,7 +1,10 @@
-from .clients import Client, SavedView
+from .clients import Client, SavedView, SavedViewCount
 from .tasks import Task
 from .notes import Note
-from .emails import Email, EmailTemplate
+from .emails import Email, EmailContent, EmailTemplate, EmailThread
 from .tokens import GoogleToken
 from .user_config import UserConfig
-from .workflows import Workflow
+from .workflows import Workflow, WorkflowExecution, SchedulerWatermark
+from .versions import DataVersion
+from .campaigns import Campaign, CampaignFailure, RateLimitBucket
+from .exports import ExportJob
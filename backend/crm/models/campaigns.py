@@ -0,0 +1,72 @@
+from django.db import models
+from django.contrib.auth.models import User
+from .clients import Client, SavedView
+from .emails import EmailTemplate
+
+class Campaign(models.Model):
+    STATUS_CHOICES = (
+        ('draft', 'Draft'),
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('paused', 'Paused'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=255)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='campaigns')
+    template = models.ForeignKey(EmailTemplate, on_delete=models.PROTECT, related_name='campaigns')
+    # Recipients: clients matching the saved view's filters, or the ad-hoc filters
+    view = models.ForeignKey(SavedView, on_delete=models.SET_NULL, null=True, blank=True, related_name='campaigns')
+    filters = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    # Sends per second for this campaign's owner (Gmail quota friendly)
+    rate_per_second = models.FloatField(default=2.0)
+
+    total_count = models.IntegerField(default=0)
+    sent_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    # Keyset cursor: recipients are processed by ascending client id, so a run
+    # resumes after the last fully recorded batch
+    last_client_id = models.BigIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+class CampaignFailure(models.Model):
+    """
+    A recipient the campaign could not send to. The cursor has moved past
+    it, so run_campaign retries it from here, up to CAMPAIGN_MAX_ATTEMPTS
+    sends in all.
+    """
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='failures')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='campaign_failures')
+    error = models.TextField(blank=True, default='')
+    attempts = models.IntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'client'], name='crm_campaign_failure_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign_id} / {self.client_id}"
+
+class RateLimitBucket(models.Model):
+    """
+    Shared state of a rate limit (see crm.services.rate_limit.SharedTokenBucket),
+    so every process sending for the same key draws from one budget.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    # Theoretical arrival time (epoch seconds) of the next send
+    next_at = models.FloatField(default=0)
+
+    def __str__(self):
+        return self.key
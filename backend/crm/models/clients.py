@@ -10,6 +10,11 @@ class Client(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'created_at', 'id'], name='crm_client_owner_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -30,3 +35,22 @@ class SavedView(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.view_type})"
+
+class SavedViewCount(models.Model):
+    """
+    Number of rows a user sees in a saved view, kept up to date as clients and
+    tasks change (see crm.services.view_counts). computed_at is None while the
+    count needs a recompute.
+    """
+    view = models.ForeignKey(SavedView, on_delete=models.CASCADE, related_name='counts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_view_counts')
+    count = models.IntegerField(default=0)
+    computed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['view', 'user'], name='crm_saved_view_count_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.view} for {self.user}: {self.count}"
@@ -1,12 +1,69 @@
+import zlib
 from django.db import models
 from django.contrib.auth.models import User
 from .clients import Client
 
+class EmailContent(models.Model):
+    """
+    One body part (HTML or plain text), shared by every email with the same
+    content. content_hash is the sha256 of the text, data is zlib-compressed
+    unless that does not make it smaller.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    data = models.BinaryField()
+    compressed = models.BooleanField(default=True)
+    size = models.PositiveIntegerField(help_text='Uncompressed size in bytes')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def text(self):
+        data = bytes(self.data)
+        return (zlib.decompress(data) if self.compressed else data).decode()
+
+    def __str__(self):
+        return f"EmailContent {self.content_hash[:12]} ({self.size} bytes)"
+
+class EmailThread(models.Model):
+    """
+    A Gmail thread of one mailbox, with aggregates kept up to date as its
+    emails are synced or sent (crm.services.email_threads).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='email_threads')
+    # Gmail's thread id, like Email.thread_id
+    thread_id = models.CharField(max_length=255)
+    client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True, related_name='email_threads')
+    subject = models.CharField(max_length=512, blank=True, default='')
+    snippet = models.CharField(max_length=200, blank=True, default='')
+    # Sorted addresses of everyone who sent or received a message, the mailbox owner ("me") excluded
+    participants = models.JSONField(default=list, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'thread_id'], name='crm_emailthread_user_thread_uniq'),
+        ]
+        indexes = [
+            # Thread lists, newest activity first, in cursor pagination order
+            models.Index(fields=['user', '-last_message_at', '-id'], name='crm_thread_activity_idx'),
+            models.Index(fields=['client', '-last_message_at', '-id'], name='crm_thread_client_idx'),
+        ]
+
+    def __str__(self):
+        return f"Thread: {self.subject} ({self.message_count})"
+
 class Email(models.Model):
     message_id = models.CharField(max_length=255, unique=True)
     thread_id = models.CharField(max_length=255)
+    # thread_id is Gmail's id, hence email_thread for the EmailThread row
+    email_thread = models.ForeignKey(EmailThread, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails')
     subject = models.CharField(max_length=512, blank=True, null=True)
-    body = models.TextField(blank=True, null=True)
+    # Bodies live in EmailContent, lists only read the snippet
+    snippet = models.CharField(max_length=200, blank=True, default='')
+    html_content = models.ForeignKey(EmailContent, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    text_content = models.ForeignKey(EmailContent, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     from_email = models.EmailField()
     to_email = models.EmailField()
     timestamp = models.DateTimeField()
@@ -17,6 +74,19 @@ class Email(models.Model):
     def __str__(self):
         return f"Email: {self.subject} from {self.from_email}"
 
+    @property
+    def body_html(self):
+        return self.html_content.text if self.html_content_id else None
+
+    @property
+    def body_text(self):
+        return self.text_content.text if self.text_content_id else None
+
+    @property
+    def body(self):
+        # HTML when there is an HTML part, like mail clients show it
+        return self.body_html if self.html_content_id else self.body_text
+
 class EmailTemplate(models.Model):
     name = models.CharField(max_length=255)
     subject = models.CharField(max_length=512)
@@ -0,0 +1,64 @@
+from django.db import models
+from django.contrib.auth.models import User
+from .clients import SavedView
+
+class ExportJob(models.Model):
+    """
+    A client or task export rendered by `python manage.py run_exports`.
+    params is the snapshot of the list query at enqueue time (the saved
+    view's filters and sorting are copied in), so later edits of the view
+    do not change the export. Jobs with the same filter_hash and
+    data_version produce the same file and are reused.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    FORMAT_CHOICES = (
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+        ('parquet', 'Parquet'),
+        ('jsonl', 'JSON Lines'),
+    )
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    view_type = models.CharField(max_length=20, choices=SavedView.VIEW_TYPES)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    params = models.JSONField(default=dict, blank=True)
+    columns = models.JSONField(default=list, blank=True)
+    # sha256 of owner, type, format, params and columns
+    filter_hash = models.CharField(max_length=64)
+    # sha256 of the DataVersion counters the export depends on
+    data_version = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+
+    total_count = models.IntegerField(blank=True, null=True)
+    rows_written = models.IntegerField(default=0)
+    # Name of the rendered file in EXPORT_DIR
+    file_name = models.CharField(max_length=255, blank=True, default='')
+    file_size = models.BigIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'filter_hash'], name='crm_exportjob_owner_hash_idx'),
+            models.Index(fields=['status', 'created_at'], name='crm_exportjob_status_idx'),
+        ]
+
+    @property
+    def progress(self):
+        if self.status == 'completed':
+            return 1.0
+        if not self.total_count:
+            return 0.0
+        return min(self.rows_written / self.total_count, 1.0)
+
+    def __str__(self):
+        return f"{self.view_type} export {self.pk} ({self.file_format})"
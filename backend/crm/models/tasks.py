@@ -24,5 +24,11 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Range scans of the scheduler (due_date crossing now), in keyset order
+            models.Index(fields=['due_date', 'id'], name='crm_task_due_date_idx'),
+        ]
+
     def __str__(self):
         return self.title
@@ -0,0 +1,17 @@
+from django.db import models
+
+class DataVersion(models.Model):
+    """
+    Monotonic change counter for a slice of CRM data.
+
+    A scope is either a model label ("client") or a model label narrowed to
+    one owner ("workflow:12"). Counters are bumped from model signals and
+    read by the conditional GET mixin to build ETags without touching the
+    tables the scope describes.
+    """
+    scope = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
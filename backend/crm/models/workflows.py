@@ -1,10 +1,15 @@
 from django.db import models
 from django.conf import settings
+from .clients import Client
 
 class Workflow(models.Model):
     TRIGGER_CHOICES = (
         ('CLIENT_CREATED', 'Client Created'),
-        # Add more triggers here in the future
+        ('CLIENT_UPDATED', 'Client Updated'),
+        ('TASK_STATUS_CHANGED', 'Task Status Changed'),
+        ('TASK_OVERDUE', 'Task Overdue'),
+        ('EMAIL_RECEIVED', 'Email Received'),
+        ('CLIENT_CREATED_DAYS_AGO', 'Days After Client Created'),
     )
 
     ACTION_CHOICES = (
@@ -18,6 +23,9 @@ class Workflow(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='workflows')
     
     trigger_type = models.CharField(max_length=50, choices=TRIGGER_CHOICES)
+    # Narrows the trigger (e.g. {"fields": ["email"]} for CLIENT_UPDATED,
+    # {"to_status": "done"} for TASK_STATUS_CHANGED, {"days": 3} for CLIENT_CREATED_DAYS_AGO)
+    trigger_config = models.JSONField(default=dict, blank=True)
     action_type = models.CharField(max_length=50, choices=ACTION_CHOICES)
     
     # Store configuration for the action (e.g., {"task_title": "Follow up", "due_days": 3})
@@ -32,3 +40,38 @@ class Workflow(models.Model):
 
     def __str__(self):
         return self.name
+
+class WorkflowExecution(models.Model):
+    """
+    One run of a workflow for a client and a triggering event. The unique
+    constraint makes dispatch idempotent: an event that is delivered twice, or
+    a retroactive run that is started twice, only runs the action once.
+    """
+    workflow = models.ForeignKey(Workflow, on_delete=models.CASCADE, related_name='executions')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='workflow_executions')
+    # e.g. "client" (creation and retroactive runs), "task:12:overdue:<due date>",
+    # "draft:<sha1>" (retroactive runs of unsaved changes)
+    event_key = models.CharField(max_length=255)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['workflow', 'client', 'event_key'], name='crm_workflow_execution_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.workflow_id} / {self.client_id} / {self.event_key}"
+
+class SchedulerWatermark(models.Model):
+    """
+    How far the scheduler has scanned a time-based trigger: everything up to
+    (processed_until, last_id) in the scan order has been handed off.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    processed_until = models.DateTimeField()
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
@@ -1,6 +1,16 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+class ActivityCursorPagination(CursorPagination):
+    """
+    Keyset pages by last activity, newest first, so a deep page costs the
+    same index range scan as the first one.
+    """
+    ordering = ('-last_message_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,265 @@
+"""
+On-demand profiles of single requests, taken by crm.middleware.ProfilingMiddleware
+for staff users who send "X-Profile: cprofile|sample" or "?_profile=cprofile|sample".
+
+cprofile is deterministic (every call, higher overhead), sample walks the
+stack of the request's thread every PROFILING_SAMPLE_INTERVAL_MS. Both cover
+the view and the rendering of its response. Profiles are written to
+PROFILING_DIR, so any worker can serve them, as a pstats file, a speedscope
+file and JSON metadata. Only the newest PROFILING_RETENTION are kept.
+"""
+import cProfile
+import datetime
+import json
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from django.conf import settings
+
+MODES = ('cprofile', 'sample')
+HEADER = 'HTTP_X_PROFILE'
+QUERY_PARAM = '_profile'
+PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+# Call paths below this share of the total are dropped from speedscope trees
+MIN_TREE_SHARE = 0.001
+
+def requested_mode(request):
+    """
+    The profiler asked for by the request, None when it asks for none.
+    """
+    value = request.META.get(HEADER) or request.GET.get(QUERY_PARAM)
+    if not value:
+        return None
+    value = value.lower()
+    if value in ('1', 'true'):
+        return 'cprofile'
+    return value if value in MODES else None
+
+def _func_key(code):
+    # The (file, line, name) keys of pstats
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+class Sampler:
+    """
+    Samples the stack of one thread from a background thread. Stacks are
+    kept from `base` (the frame that started the profile) down.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = {}
+        self.counts = {}
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and frame is not self.base:
+            stack.append(_func_key(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self, thread_id):
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                stack = self._stack(frame)
+                if stack:
+                    self.stacks[stack] = self.stacks.get(stack, 0) + (now - last)
+                    self.counts[stack] = self.counts.get(stack, 0) + 1
+            last = now
+
+    def runcall(self, func, *args, **kwargs):
+        self.base = sys._getframe()
+        self._stopped = threading.Event()
+        thread = threading.Thread(target=self._run, args=(threading.get_ident(),), daemon=True)
+        thread.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._stopped.set()
+            thread.join()
+
+    def pstats(self):
+        """
+        The samples as a pstats dict. Call counts are sample counts and
+        times are sampled wall time.
+        """
+        stats = {}
+        for stack, seconds in self.stacks.items():
+            samples = self.counts[stack]
+            seen = set()
+            for depth, func in enumerate(stack):
+                entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                leaf = depth == len(stack) - 1
+                entry[1] += samples
+                if leaf:
+                    entry[2] += seconds
+                if func not in seen:
+                    # Recursive frames count once towards inclusive time
+                    entry[0] += samples
+                    entry[3] += seconds
+                    seen.add(func)
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += samples
+                    caller[1] += samples
+                    caller[2] += seconds if leaf else 0.0
+                    caller[3] += seconds
+        return {
+            func: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+            for func, (cc, nc, tt, ct, callers) in stats.items()
+        }
+
+def _stats_tree(stats):
+    """
+    {stack: seconds} rebuilt from a cProfile call graph. cProfile keeps no
+    stacks, so a callee's time is split over its callers by their share of
+    its inclusive time, like most pstats flame graph tools do.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, values in callers.items():
+            callees.setdefault(caller, []).append((func, values[3]))
+    roots = [func for func, entry in stats.items() if not any(caller in stats for caller in entry[4])]
+    total = sum(stats[func][3] for func in roots) or 1.0
+    stacks = {}
+
+    def walk(func, seconds, path):
+        children = [(child, share) for child, share in callees.get(func, []) if child not in path]
+        spent = sum(share for _, share in children)
+        # Shares exceeding the caller's own time (recursion, rounding) are scaled down
+        scale = min(1.0, seconds / spent) if spent else 0.0
+        stack = path + (func,)
+        stacks[stack] = stacks.get(stack, 0.0) + max(seconds - spent * scale, 0.0)
+        for child, share in children:
+            if share * scale >= total * MIN_TREE_SHARE:
+                walk(child, share * scale, stack)
+
+    for func in roots:
+        walk(func, stats[func][3], ())
+    return stacks
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        # Built-ins, e.g. "<built-in method time.sleep>"
+        return name, None, None
+    return name, filename, line
+
+def speedscope(stacks, name):
+    """
+    {stack: seconds} in the speedscope file format, as one sampled profile.
+    """
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for stack, seconds in stacks.items():
+        if seconds <= 0:
+            continue
+        sample = []
+        for func in stack:
+            if func not in index:
+                label, filename, line = _label(func)
+                frame = {'name': label}
+                if filename:
+                    frame.update(file=filename, line=line)
+                index[func] = len(frames)
+                frames.append(frame)
+            sample.append(index[func])
+        samples.append(sample)
+        weights.append(round(seconds * 1000, 3))
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'crm.profiling',
+        'activeProfileIndex': 0,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': round(sum(weights), 3),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+
+def profile_call(mode, func, *args, **kwargs):
+    """
+    Runs func under the profiler of mode. Returns (result, pstats dict,
+    {stack: seconds}).
+    """
+    if mode == 'sample':
+        sampler = Sampler(settings.PROFILING_SAMPLE_INTERVAL_MS / 1000)
+        result = sampler.runcall(func, *args, **kwargs)
+        return result, sampler.pstats(), sampler.stacks
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args, **kwargs)
+    profiler.create_stats()
+    return result, profiler.stats, _stats_tree(profiler.stats)
+
+def _path(profile_id, suffix):
+    return os.path.join(settings.PROFILING_DIR, f"{profile_id}{suffix}")
+
+def save(meta, stats, stacks):
+    """
+    Writes a profile and drops the oldest ones past PROFILING_RETENTION.
+    Returns its id.
+    """
+    profile_id = uuid.uuid4().hex
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    meta = {'id': profile_id, 'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(), **meta}
+    with open(_path(profile_id, '.prof'), 'wb') as f:
+        # The format of pstats.Stats.dump_stats
+        marshal.dump(stats, f)
+    with open(_path(profile_id, '.speedscope.json'), 'w') as f:
+        json.dump(speedscope(stacks, f"{meta['method']} {meta['path']} ({meta['mode']})"), f)
+    # Metadata last, a profile is listed once its files are complete
+    with open(_path(profile_id, '.json'), 'w') as f:
+        json.dump(meta, f)
+    prune()
+    return profile_id
+
+def list_profiles():
+    """
+    Metadata of the stored profiles, newest first.
+    """
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(settings.PROFILING_DIR):
+        profile_id, _, suffix = name.partition('.')
+        if suffix != 'json' or not PROFILE_ID.match(profile_id):
+            continue
+        try:
+            with open(_path(profile_id, '.json')) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            # Removed by another worker in the meantime
+            continue
+    return sorted(profiles, key=lambda meta: meta['created_at'], reverse=True)
+
+def prune():
+    for meta in list_profiles()[settings.PROFILING_RETENTION:]:
+        for suffix in ('.json', '.prof', '.speedscope.json'):
+            try:
+                os.remove(_path(meta['id'], suffix))
+            except FileNotFoundError:
+                pass
+
+def profile_file(profile_id, file_format):
+    """
+    Path of a stored profile in file_format ("pstats" or "speedscope"),
+    None if there is no such profile.
+    """
+    if not PROFILE_ID.match(profile_id) or file_format not in ('pstats', 'speedscope'):
+        return None
+    path = _path(profile_id, '.prof' if file_format == 'pstats' else '.speedscope.json')
+    return path if os.path.exists(path) else None
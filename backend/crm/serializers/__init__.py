@@ -1,7 +1,9 @@
-from .clients import ClientSerializer, SavedViewSerializer
+from .clients import ClientSerializer, SavedViewSerializer, SavedViewCountSerializer
 from .tasks import TaskSerializer
 from .notes import NoteSerializer
-from .emails import EmailSerializer, EmailTemplateSerializer
+from .emails import EmailListSerializer, EmailSerializer, EmailTemplateSerializer, EmailThreadSerializer
 from .tokens import GoogleTokenSerializer
 from .user_config import UserConfigSerializer
 from .workflows import WorkflowSerializer
+from .campaigns import CampaignSerializer
+from .exports import ExportJobSerializer
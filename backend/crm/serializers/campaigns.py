@@ -0,0 +1,32 @@
+from django.conf import settings
+from rest_framework import serializers
+from crm.models.campaigns import Campaign
+
+class CampaignSerializer(serializers.ModelSerializer):
+    template_name = serializers.ReadOnlyField(source='template.name')
+
+    class Meta:
+        model = Campaign
+        fields = '__all__'
+        read_only_fields = (
+            'owner', 'status', 'total_count', 'sent_count', 'failed_count', 'last_client_id',
+            'last_error', 'started_at', 'finished_at', 'created_at', 'updated_at'
+        )
+
+    def validate_rate_per_second(self, value):
+        if not 0 < value <= settings.CAMPAIGN_MAX_RATE:
+            raise serializers.ValidationError(f'Must be above 0 and at most {settings.CAMPAIGN_MAX_RATE:g}')
+        return value
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        template = attrs.get('template')
+        if template and template.owner_id != user.id:
+            raise serializers.ValidationError({'template': 'Template not found'})
+        view = attrs.get('view')
+        # Like the saved view list: the user's own views and the system ones
+        if view and view.user_id != user.id and not view.is_system:
+            raise serializers.ValidationError({'view': 'View not found'})
+        if view and view.view_type != 'client':
+            raise serializers.ValidationError({'view': 'Campaigns need a client view'})
+        return attrs
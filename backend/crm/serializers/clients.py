@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from crm.models.clients import Client, SavedView
+from crm.models.clients import Client, SavedView, SavedViewCount
 
 class ClientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,3 +11,8 @@ class SavedViewSerializer(serializers.ModelSerializer):
         model = SavedView
         fields = '__all__'
         read_only_fields = ['user', 'is_system']
+
+class SavedViewCountSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedViewCount
+        fields = ['view', 'count', 'computed_at']
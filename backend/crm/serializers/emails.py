@@ -1,10 +1,33 @@
 from rest_framework import serializers
-from crm.models.emails import Email, EmailTemplate
+from crm.models.emails import Email, EmailTemplate, EmailThread
+
+EMAIL_LIST_FIELDS = [
+    'id', 'message_id', 'thread_id', 'email_thread', 'subject', 'snippet', 'from_email', 'to_email', 'timestamp',
+    'client', 'user', 'created_at',
+]
+
+class EmailListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Email
+        fields = EMAIL_LIST_FIELDS
 
 class EmailSerializer(serializers.ModelSerializer):
+    # Select html_content and text_content with the email
+    body = serializers.CharField(read_only=True, allow_null=True)
+    body_html = serializers.CharField(read_only=True, allow_null=True)
+    body_text = serializers.CharField(read_only=True, allow_null=True)
+
     class Meta:
         model = Email
-        fields = '__all__'
+        fields = EMAIL_LIST_FIELDS + ['body', 'body_html', 'body_text']
+
+class EmailThreadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EmailThread
+        fields = [
+            'id', 'thread_id', 'subject', 'snippet', 'participants', 'message_count', 'last_message_at',
+            'client', 'created_at',
+        ]
 
 class EmailTemplateSerializer(serializers.ModelSerializer):
     class Meta:
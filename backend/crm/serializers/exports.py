@@ -0,0 +1,17 @@
+from django.urls import reverse
+from rest_framework import serializers
+from crm.models.exports import ExportJob
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.ReadOnlyField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        exclude = ('filter_hash', 'data_version', 'file_name')
+        read_only_fields = [field.name for field in ExportJob._meta.fields]
+
+    def get_download_url(self, obj):
+        if obj.status != 'completed':
+            return None
+        return reverse('export-job-download', args=[obj.pk])
@@ -0,0 +1,220 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from crm.google_service import GoogleService
+from crm.models.campaigns import Campaign, CampaignFailure
+from crm.models.clients import Client
+from crm.models.emails import Email
+from crm.services.email_content import bulk_body_fields, split_body
+from crm.services.email_threads import record_emails
+from crm.services.rate_limit import get_bucket
+from crm.services.templating import get_compiled
+from crm.utils import build_q_object
+from crm.versioning import bump_versions
+
+# How often a running campaign refreshes updated_at, which tells runners
+# (run_campaigns --stale-minutes) that it is still alive
+HEARTBEAT_SECONDS = 30
+
+def campaign_recipients(campaign):
+    """
+    Clients the campaign targets, in keyset order. Like workflows, campaigns
+    match against all clients, not only the owner's.
+    """
+    filters = campaign.view.filters if campaign.view_id else campaign.filters
+    q_obj = build_q_object(filters, campaign.owner, Client)
+    return Client.objects.filter(q_obj).exclude(email='').order_by('id')
+
+def _record_progress(campaign, only_if=None, **updates):
+    """
+    Updates the campaign, only while its status is only_if if given (a
+    pause from the API wins over the runner). Returns whether it was updated.
+    """
+    campaigns = Campaign.objects.filter(pk=campaign.pk)
+    if only_if:
+        campaigns = campaigns.filter(status=only_if)
+    updated = campaigns.update(updated_at=timezone.now(), **updates)
+    # Queryset updates skip signals, keep ETags of the campaign list honest
+    bump_versions(f'campaign:{campaign.owner_id}')
+    return bool(updated)
+
+@contextmanager
+def _heartbeat(campaign):
+    """
+    Refreshes the campaign's updated_at every HEARTBEAT_SECONDS from a
+    thread while the block runs, so a batch that sends slowly (low rate,
+    large batch) is not taken for an orphaned campaign.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(HEARTBEAT_SECONDS):
+                Campaign.objects.filter(pk=campaign.pk, status='running').update(updated_at=timezone.now())
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'campaign-{campaign.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def run_campaign(campaign, batch_size=None, stdout=None):
+    """
+    Sends the campaign from its cursor onwards and returns the final status.
+
+    The template is compiled once. Recipients are loaded in batches by
+    ascending id; each batch is sent through the owner's token bucket on a
+    bounded pool (one Gmail client per thread), then its Email rows are
+    written with a single bulk_create and the cursor is advanced. A crash can
+    only re-send the batch that was in flight. Recipients whose send failed
+    are recorded as CampaignFailures and retried once the cursor is done.
+    """
+    batch_size = batch_size or settings.CAMPAIGN_BATCH_SIZE
+    owner = campaign.owner
+    template = campaign.template
+    render_subject, render_body = get_compiled(template)
+    bucket = get_bucket(owner.pk, campaign.rate_per_second)
+
+    if not GoogleService(owner).credentials:
+        _record_progress(campaign, status='failed', last_error='Google account is not connected')
+        return 'failed'
+
+    recipients = campaign_recipients(campaign)
+    updates = {'status': 'running'}
+    if not campaign.started_at:
+        updates['started_at'] = timezone.now()
+        updates['total_count'] = recipients.count()
+    _record_progress(campaign, **updates)
+
+    local = threading.local()
+
+    def send(client):
+        if not hasattr(local, 'service'):
+            local.service = GoogleService(owner)
+        context = {'client': client, 'owner': owner}
+        subject = render_subject(context)
+        body = render_body(context)
+        bucket.acquire()
+        try:
+            message = local.service.send_email(client.email, subject, body)
+        except Exception as e:
+            return client, subject, body, None, str(e)
+        return client, subject, body, message, None if message else 'Send failed'
+
+    def worker_send(client):
+        try:
+            return send(client)
+        finally:
+            close_old_connections()
+
+    def send_batch(pool, batch):
+        """Sends batch and stores the sent emails, returns {client_id: error} of the others."""
+        sent = []
+        errors = {}
+        now = timezone.now()
+        for client, subject, body, message, error in pool.map(worker_send, batch):
+            if message:
+                sent.append((client, subject, body, message))
+            else:
+                errors[client.pk] = error
+
+        # Bodies of one batch are stored together, identical ones once
+        bodies = bulk_body_fields([split_body(body) for _, _, body, _ in sent])
+        emails = [
+            Email(
+                message_id=message['id'],
+                thread_id=message['threadId'],
+                subject=subject,
+                from_email="me",
+                to_email=client.email,
+                timestamp=now,
+                client=client,
+                user=owner,
+                **body
+            )
+            for (client, subject, _, message), body in zip(sent, bodies)
+        ]
+        with transaction.atomic():
+            Email.objects.bulk_create(record_emails(emails), ignore_conflicts=True)
+        bump_versions(f'email:{owner.pk}')
+        return errors
+
+    def is_running():
+        # Stop between batches if the campaign was paused from the API
+        return Campaign.objects.filter(pk=campaign.pk, status='running').exists()
+
+    cursor = campaign.last_client_id
+    with _heartbeat(campaign), ThreadPoolExecutor(max_workers=settings.CAMPAIGN_MAX_CONCURRENCY) as pool:
+        while True:
+            if not is_running():
+                return _current_status(campaign)
+
+            batch = list(recipients.filter(id__gt=cursor)[:batch_size])
+            if not batch:
+                break
+
+            errors = send_batch(pool, batch)
+            with transaction.atomic():
+                CampaignFailure.objects.bulk_create([
+                    CampaignFailure(campaign=campaign, client_id=client_id, error=error)
+                    for client_id, error in errors.items()
+                ], ignore_conflicts=True)
+                cursor = batch[-1].id
+                progress = {
+                    'last_client_id': cursor,
+                    'sent_count': F('sent_count') + len(batch) - len(errors),
+                    'failed_count': F('failed_count') + len(errors),
+                }
+                if errors:
+                    progress['last_error'] = list(errors.values())[-1]
+                _record_progress(campaign, **progress)
+            if stdout:
+                stdout.write(f"Campaign {campaign.pk}: {len(batch) - len(errors)} sent, {len(errors)} failed, cursor {cursor}")
+
+        # Retry failed recipients, each pass takes the failures left by the one before
+        while True:
+            failures = list(
+                CampaignFailure.objects.filter(campaign=campaign, attempts__lt=settings.CAMPAIGN_MAX_ATTEMPTS)
+                .select_related('client').order_by('client_id')
+            )
+            if not failures:
+                break
+            for offset in range(0, len(failures), batch_size):
+                if not is_running():
+                    return _current_status(campaign)
+                chunk = failures[offset:offset + batch_size]
+                errors = send_batch(pool, [failure.client for failure in chunk])
+                now = timezone.now()
+                with transaction.atomic():
+                    CampaignFailure.objects.filter(
+                        pk__in=[failure.pk for failure in chunk if failure.client_id not in errors]
+                    ).delete()
+                    still_failing = [failure for failure in chunk if failure.client_id in errors]
+                    for failure in still_failing:
+                        failure.attempts += 1
+                        failure.error = errors[failure.client_id]
+                        failure.updated_at = now
+                    CampaignFailure.objects.bulk_update(still_failing, ['attempts', 'error', 'updated_at'])
+                    retried = len(chunk) - len(errors)
+                    _record_progress(
+                        campaign,
+                        sent_count=F('sent_count') + retried,
+                        failed_count=F('failed_count') - retried,
+                    )
+                if stdout:
+                    stdout.write(f"Campaign {campaign.pk}: {retried} of {len(chunk)} failed recipients sent on retry")
+
+    if not _record_progress(campaign, only_if='running', status='completed', finished_at=timezone.now()):
+        return _current_status(campaign)
+    return 'completed'
+
+def _current_status(campaign):
+    return Campaign.objects.filter(pk=campaign.pk).values_list('status', flat=True).first()
@@ -0,0 +1,262 @@
+"""
+Synthetic CRM data at production scale (python manage.py generate_dataset).
+
+Rows are generated in fixed-size chunks. Every chunk draws from its own
+random generator, seeded from (seed, table, chunk), and gets a reserved id
+range, so the output does not depend on the number of workers or on the
+order chunks finish in. Each chunk is written in one transaction (COPY on
+PostgreSQL). A chunk whose first id exists is skipped, which makes reruns
+resume where they stopped.
+"""
+import bisect
+import datetime
+import itertools
+import math
+import random
+from django.db import connection, transaction
+from crm.models import Client, Task, Note, Email
+from crm.services.email_content import bulk_body_fields
+
+# Row counts at scale 1
+BASE_SCALE = {'clients': 1_000_000, 'tasks': 10_000_000, 'notes': 5_000_000, 'emails': 5_000_000}
+MODELS = {'clients': Client, 'tasks': Task, 'notes': Note, 'emails': Email}
+# Clients go first, the other tables reference them
+PHASES = (('clients',), ('tasks', 'notes', 'emails'))
+
+# Data spans the last three years, growing towards the present
+HISTORY_DAYS = 3 * 365
+
+COMPANY_PREFIXES = [
+    'Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark', 'Wayne', 'Cyberdyne', 'Soylent', 'Massive',
+    'Vandelay', 'Wonka', 'Tyrell', 'Aperture', 'Gringotts', 'Oscorp', 'Monarch', 'Nakatomi', 'Dunder', 'Pied',
+    'Blue', 'Northern', 'Pacific', 'Summit', 'Atlas', 'Nova', 'Vertex', 'Pioneer', 'Evergreen', 'Silver',
+]
+COMPANY_SUFFIXES = ['Corp', 'Inc', 'Ltd', 'Group', 'Labs', 'Systems', 'Partners', 'Holdings', 'Industries', 'Solutions']
+STREETS = ['Elm', 'Oak', 'Pine', 'Maple', 'Birch', 'Cedar', 'Spruce', 'Walnut', 'Ash', 'Fir', 'Main', 'Park', 'Lake', 'Hill']
+STREET_TYPES = ['St', 'Ave', 'Ln', 'Dr', 'Rd', 'Blvd', 'Ct', 'Way', 'Pl']
+WORDS = (
+    'proposal contract renewal invoice payment meeting call demo follow up review scope pricing discount '
+    'integration support onboarding training feedback quarterly report budget timeline milestone delivery '
+    'launch migration account billing address signature legal approval team manager customer product '
+    'feature request issue bug dashboard export import schedule next week monday friday please confirm '
+    'thanks regards update status agenda notes summary attached document details question answer'
+).split()
+TASK_TITLES = [
+    'Follow up on proposal', 'Schedule demo call', 'Send contract for signature', 'Review requirements document',
+    'Update contact information', 'Prepare quarterly report', 'Send welcome email', 'Check payment status',
+    'Discuss renewal options', 'Organize site visit', 'Finalize project scope', 'Send product catalog',
+    'Request feedback on service', 'Update billing address', 'Schedule technical review',
+]
+# (value, weight)
+TASK_STATUSES = [('todo', 40), ('in_progress', 20), ('done', 40)]
+TASK_PRIORITIES = [('low', 30), ('medium', 50), ('high', 20)]
+
+def scaled_counts(scale, overrides):
+    counts = {table: int(count * scale) for table, count in BASE_SCALE.items()}
+    counts.update({table: count for table, count in overrides.items() if count is not None})
+    return counts
+
+def chunk_ranges(count, chunk_size):
+    return [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+
+def _mix(seed, k):
+    """
+    Deterministic uniform value in [0, 1) for (seed, k), cheap enough to
+    call per row (splitmix64 finalizer).
+    """
+    x = (k * 0x9E3779B97F4A7C15 + seed * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return ((x ^ (x >> 31)) >> 11) / float(1 << 53)
+
+def _weighted(choices):
+    values, weights = zip(*choices)
+    return list(values), list(itertools.accumulate(weights))
+
+class Generator:
+    """
+    Row factory for one chunk. Owners follow a Zipf distribution over the
+    users (a few reps own most clients), tasks and emails concentrate on a
+    minority of clients, and text lengths are log-normal.
+    """
+    def __init__(self, plan, table, chunk):
+        self.plan = plan
+        self.seed = plan['seed']
+        self.random = random.Random(f"{self.seed}:{table}:{chunk}")
+        self.now = datetime.datetime.fromisoformat(plan['now'])
+        self.user_ids = plan['user_ids']
+        self.user_emails = plan['user_emails']
+        self.client_count = plan['counts']['clients']
+        self.client_base = plan['bases']['clients']
+        weights = [1 / (i + 1) for i in range(len(self.user_ids))]
+        total = sum(weights)
+        self.owner_cumulative = list(itertools.accumulate(w / total for w in weights))
+        self.statuses = _weighted(TASK_STATUSES)
+        self.priorities = _weighted(TASK_PRIORITIES)
+
+    def _pick(self, weighted):
+        values, cumulative = weighted
+        return self.random.choices(values, cum_weights=cumulative)[0]
+
+    def owner_index(self, k):
+        # Stable per client, so tasks and emails can follow the client's owner
+        u = _mix(self.seed, k)
+        if u < 0.05:
+            return None
+        return min(bisect.bisect_right(self.owner_cumulative, (u - 0.05) / 0.95), len(self.user_ids) - 1)
+
+    def client_email(self, k):
+        # From the reserved id, so a dataset planned next to another one
+        # with the same seed gets new addresses
+        return f"client{self.client_base + k}.s{self.seed}@dataset.example"
+
+    def created_at(self, horizon=HISTORY_DAYS):
+        # sqrt skews towards recent dates, like a growing business
+        days = horizon * (1 - math.sqrt(self.random.random()))
+        return self.now - datetime.timedelta(days=days)
+
+    def text(self, median_words, sigma=0.8, limit=None):
+        n = max(1, int(self.random.lognormvariate(math.log(median_words), sigma)))
+        words = self.random.choices(WORDS, k=n)
+        text = ' '.join(words).capitalize() + '.'
+        return text[:limit] if limit else text
+
+    def client_index(self):
+        # Squaring concentrates activity on a minority of clients
+        return int(self.client_count * self.random.random() ** 2)
+
+    def clients(self, start, end):
+        r = self.random
+        for k in range(start, end):
+            owner = self.owner_index(k)
+            created = self.created_at()
+            yield (
+                self.client_base + k,
+                f"{r.choice(COMPANY_PREFIXES)} {r.choice(COMPANY_SUFFIXES)} {k}",
+                self.client_email(k),
+                f"555-{r.randrange(10000):04d}" if r.random() < 0.9 else None,
+                f"{r.randrange(1, 9999)} {r.choice(STREETS)} {r.choice(STREET_TYPES)}" if r.random() < 0.85 else None,
+                self.user_ids[owner] if owner is not None else None,
+                created,
+                created + datetime.timedelta(days=r.random() * (self.now - created).days) if r.random() < 0.3 else created,
+            )
+
+    def tasks(self, start, end):
+        r = self.random
+        base = self.plan['bases']['tasks']
+        for k in range(start, end):
+            client = self.client_index()
+            owner = self.owner_index(client)
+            if owner is None or r.random() < 0.2:
+                assigned = r.choice(self.user_ids) if r.random() < 0.8 else None
+            else:
+                assigned = self.user_ids[owner]
+            created = self.created_at()
+            status = self._pick(self.statuses)
+            # Due around two weeks after creation, some without a due date
+            due = created + datetime.timedelta(days=r.gauss(14, 10)) if r.random() < 0.9 else None
+            completed = created + datetime.timedelta(days=abs(r.gauss(10, 8))) if status == 'done' else None
+            yield (
+                base + k,
+                r.choice(TASK_TITLES),
+                self.text(25, limit=2000) if r.random() < 0.7 else None,
+                status,
+                self._pick(self.priorities),
+                due,
+                self.client_base + client,
+                assigned,
+                completed,
+                created,
+                completed or created,
+            )
+
+    def notes(self, start, end):
+        r = self.random
+        base = self.plan['bases']['notes']
+        for k in range(start, end):
+            client = self.client_index()
+            owner = self.owner_index(client)
+            created = self.created_at()
+            yield (
+                base + k,
+                self.text(40, sigma=1.0, limit=20000),
+                self.client_base + client,
+                self.user_ids[owner] if owner is not None else r.choice(self.user_ids),
+                created,
+                created,
+            )
+
+    def emails(self, start, end):
+        r = self.random
+        base = self.plan['bases']['emails']
+        for k in range(start, end):
+            client = self.client_index()
+            owner = self.owner_index(client)
+            user = owner if owner is not None else r.randrange(len(self.user_ids))
+            user_email, client_email = self.user_emails[user], self.client_email(client)
+            inbound = r.random() < 0.5
+            timestamp = self.created_at()
+            yield (
+                base + k,
+                f"gen-{self.seed}-{base + k}",
+                f"gen-{self.seed}-{self.client_base + client}-{r.randrange(8)}",
+                f"Re: {r.choice(TASK_TITLES)}" if r.random() < 0.6 else r.choice(TASK_TITLES),
+                # Bodies of a few hundred bytes up to tens of kilobytes
+                self.text(200, sigma=1.0, limit=60000),
+                client_email if inbound else user_email,
+                user_email if inbound else client_email,
+                timestamp,
+                # Some mail is not linked to a client
+                self.client_base + client if r.random() < 0.9 else None,
+                self.user_ids[user],
+                timestamp,
+            )
+
+COLUMNS = {
+    'clients': ['id', 'name', 'email', 'phone', 'address', 'owner_id', 'created_at', 'updated_at'],
+    'tasks': ['id', 'title', 'description', 'status', 'priority', 'due_date', 'client_id', 'assigned_to_id', 'completed_at', 'created_at', 'updated_at'],
+    'notes': ['id', 'content', 'client_id', 'author_id', 'created_at', 'updated_at'],
+    'emails': [
+        'id', 'message_id', 'thread_id', 'subject', 'text_content_id', 'snippet', 'from_email', 'to_email', 'timestamp',
+        'client_id', 'user_id', 'created_at',
+    ],
+}
+
+def _store_bodies(rows):
+    """
+    Email rows as generated (the body fifth) to COLUMNS['emails'] rows, the
+    bodies stored as EmailContent.
+    """
+    rows = list(rows)
+    fields = bulk_body_fields([(None, row[4]) for row in rows])
+    return [row[:4] + (body['text_content_id'], body['snippet']) + row[5:] for row, body in zip(rows, fields)]
+
+def _write(table, rows):
+    db_table = MODELS[table]._meta.db_table
+    columns = COLUMNS[table]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            with cursor.cursor.copy(f'COPY {db_table} ({", ".join(columns)}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+            return
+        adapt = connection.ops.adapt_datetimefield_value
+        prepared = [tuple(adapt(v) if isinstance(v, datetime.datetime) else v for v in row) for row in rows]
+        placeholders = ', '.join(['%s'] * len(columns))
+        cursor.executemany(f'INSERT INTO {db_table} ({", ".join(columns)}) VALUES ({placeholders})', prepared)
+
+def write_chunk(plan, table, chunk):
+    """
+    Generates and writes one chunk. Returns (table, chunk, rows written),
+    0 rows if the chunk was already written by an earlier run.
+    """
+    start, end = plan['chunks'][table][chunk]
+    model = MODELS[table]
+    first_id = plan['bases'][table] + start
+    with transaction.atomic():
+        if model.objects.filter(pk=first_id).exists():
+            return table, chunk, 0
+        generator = Generator(plan, table, chunk)
+        rows = getattr(generator, table)(start, end)
+        _write(table, _store_bodies(rows) if table == 'emails' else rows)
+    return table, chunk, end - start
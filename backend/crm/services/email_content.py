@@ -0,0 +1,91 @@
+"""
+Email bodies are stored apart from the Email rows, as EmailContent parts
+(HTML and plain text) deduplicated by sha256 and zlib-compressed. Email rows
+keep a precomputed snippet, so lists never read a body.
+"""
+import hashlib
+import html
+import re
+import zlib
+from crm.models.emails import EmailContent
+
+SNIPPET_LENGTH = 200
+COMPRESSION_LEVEL = 6
+# Tags that end a line of text, replaced by a space before the tags are stripped
+BLOCK_TAGS = re.compile(r'<\s*(br|/p|/div|/li|/tr|/h[1-6]|/blockquote)\b[^>]*>', re.IGNORECASE)
+TAGS = re.compile(r'<[^>]*>')
+INVISIBLE = re.compile(r'<(style|script|head)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+HTML_TAG = re.compile(r'<\s*/?\s*[a-zA-Z][a-zA-Z0-9]*(\s[^>]*)?/?>')
+
+def content_hash(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+def encode(value):
+    """
+    EmailContent fields (data, compressed, size) of a text.
+    """
+    raw = value.encode()
+    packed = zlib.compress(raw, COMPRESSION_LEVEL)
+    if len(packed) < len(raw):
+        return {'data': packed, 'compressed': True, 'size': len(raw)}
+    return {'data': raw, 'compressed': False, 'size': len(raw)}
+
+def looks_like_html(value):
+    return bool(value and HTML_TAG.search(value))
+
+def html_to_text(value):
+    value = INVISIBLE.sub(' ', value)
+    return html.unescape(TAGS.sub('', BLOCK_TAGS.sub(' ', value)))
+
+def make_snippet(html_body=None, text_body=None):
+    source = text_body if text_body else html_to_text(html_body or '')
+    # Only the start is shown, no need to normalize a whole long body
+    return ' '.join(source[:SNIPPET_LENGTH * 4].split())[:SNIPPET_LENGTH]
+
+def store_contents(values):
+    """
+    {content_hash: EmailContent id} of the non-empty values. Missing
+    contents are inserted, two queries when all of them exist already.
+    """
+    by_hash = {}
+    for value in values:
+        if value:
+            by_hash.setdefault(content_hash(value), value)
+    if not by_hash:
+        return {}
+    ids = dict(EmailContent.objects.filter(content_hash__in=list(by_hash)).values_list('content_hash', 'id'))
+    missing = [key for key in by_hash if key not in ids]
+    if missing:
+        # Conflicts are contents a concurrent writer inserted in the meantime
+        EmailContent.objects.bulk_create(
+            [EmailContent(content_hash=key, **encode(by_hash[key])) for key in missing], ignore_conflicts=True
+        )
+        ids.update(EmailContent.objects.filter(content_hash__in=missing).values_list('content_hash', 'id'))
+    return ids
+
+def bulk_body_fields(bodies):
+    """
+    Email fields (html_content_id, text_content_id, snippet) for a list of
+    (html, text) bodies, either part may be None.
+    """
+    ids = store_contents(part for body in bodies for part in body)
+    return [
+        {
+            'html_content_id': ids[content_hash(html_body)] if html_body else None,
+            'text_content_id': ids[content_hash(text_body)] if text_body else None,
+            'snippet': make_snippet(html_body, text_body),
+        }
+        for html_body, text_body in bodies
+    ]
+
+def body_fields(html_body=None, text_body=None):
+    return bulk_body_fields([(html_body, text_body)])[0]
+
+def split_body(body):
+    """
+    (html, text) of a body of unknown type, like the rich text the send
+    endpoint gets.
+    """
+    if not body:
+        return None, None
+    return (body, None) if looks_like_html(body) else (None, body)
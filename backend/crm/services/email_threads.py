@@ -0,0 +1,120 @@
+"""
+EmailThread aggregates (participants, message count, last activity,
+snippet). New emails are folded into their thread in the transaction that
+saves them, the thread rows locked, so thread lists are one indexed query.
+rebuild_threads() recomputes them from the emails, e.g. after
+generate_dataset.
+"""
+from email.utils import getaddresses
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from crm.models.emails import Email, EmailThread
+
+THREAD_FIELDS = ['client_id', 'subject', 'snippet', 'participants', 'message_count', 'last_message_at']
+BATCH_SIZE = 2000
+
+def addresses(email):
+    """
+    Lowercase addresses of the sender and recipients, without the "me" of sent mail.
+    """
+    found = {address.lower() for _, address in getaddresses([email.from_email or '', email.to_email or ''])}
+    return found - {'', 'me'}
+
+def fold(thread, email):
+    """
+    Adds one email to the thread aggregates.
+    """
+    thread.message_count += 1
+    thread.participants = sorted(set(thread.participants) | addresses(email))
+    if not thread.subject:
+        thread.subject = email.subject or ''
+    if thread.last_message_at is None or email.timestamp >= thread.last_message_at:
+        thread.last_message_at = email.timestamp
+        thread.snippet = email.snippet
+        if email.client_id:
+            thread.client_id = email.client_id
+
+def _locked_threads(keys):
+    by_user = {}
+    for user_id, thread_id in keys:
+        by_user.setdefault(user_id, []).append(thread_id)
+    q_obj = Q()
+    for user_id, thread_ids in by_user.items():
+        q_obj |= Q(user_id=user_id, thread_id__in=thread_ids)
+    return {(thread.user_id, thread.thread_id): thread for thread in EmailThread.objects.select_for_update().filter(q_obj)}
+
+def record_emails(emails):
+    """
+    Folds new, unsaved emails into their threads (created as needed) and
+    sets their email_thread. Returns the emails to save: those stored in the
+    meantime (e.g. a sent message the Gmail sync got first) are left out.
+    Call it in the transaction that saves them.
+    """
+    if not emails:
+        return []
+    keys = {(email.user_id, email.thread_id) for email in emails}
+    threads = _locked_threads(keys)
+    missing = keys - threads.keys()
+    if missing:
+        first = {}
+        for email in emails:
+            key = (email.user_id, email.thread_id)
+            first[key] = min(first.get(key, email.timestamp), email.timestamp)
+        # Conflicts are threads a concurrent sync created in the meantime
+        EmailThread.objects.bulk_create(
+            [EmailThread(user_id=user_id, thread_id=thread_id, last_message_at=first[(user_id, thread_id)])
+             for user_id, thread_id in missing],
+            ignore_conflicts=True
+        )
+        threads.update(_locked_threads(missing))
+    # Writers of a message lock its thread first, so this sees every copy stored
+    stored = set(Email.objects.filter(message_id__in=[email.message_id for email in emails]).values_list('message_id', flat=True))
+    emails = [email for email in emails if email.message_id not in stored]
+    for email in sorted(emails, key=lambda email: email.timestamp):
+        thread = threads[(email.user_id, email.thread_id)]
+        fold(thread, email)
+        email.email_thread = thread
+    EmailThread.objects.bulk_update(list(threads.values()), THREAD_FIELDS)
+    return emails
+
+def save_email(email):
+    # The stored copy wins when the message was saved in the meantime
+    with transaction.atomic():
+        if not record_emails([email]):
+            return Email.objects.get(message_id=email.message_id)
+        email.save()
+    return email
+
+def rebuild_threads(user_ids=None):
+    """
+    Recomputes the threads of user_ids (all users by default) from their
+    emails in one ordered pass and links the emails. Returns the number of
+    threads.
+    """
+    emails = Email.objects.all() if user_ids is None else Email.objects.filter(user_id__in=user_ids)
+    threads = EmailThread.objects.all() if user_ids is None else EmailThread.objects.filter(user_id__in=user_ids)
+    rows = emails.order_by('user_id', 'thread_id', 'timestamp', 'id').only(
+        'id', 'user_id', 'thread_id', 'subject', 'snippet', 'from_email', 'to_email', 'timestamp', 'client_id'
+    )
+    count = 0
+    with transaction.atomic():
+        emails.update(email_thread=None)
+        threads.delete()
+        batch = []
+        thread = None
+        for email in rows.iterator(chunk_size=BATCH_SIZE):
+            if thread is None or (thread.user_id, thread.thread_id) != (email.user_id, email.thread_id):
+                if len(batch) >= BATCH_SIZE:
+                    EmailThread.objects.bulk_create(batch)
+                    count += len(batch)
+                    batch = []
+                thread = EmailThread(user_id=email.user_id, thread_id=email.thread_id, last_message_at=None)
+                batch.append(thread)
+            fold(thread, email)
+        EmailThread.objects.bulk_create(batch)
+        count += len(batch)
+        # One correlated update links every email to its thread
+        emails.update(email_thread=Subquery(EmailThread.objects.filter(
+            user_id=OuterRef('user_id'), thread_id=OuterRef('thread_id')
+        ).values('id')[:1]))
+    return count
@@ -0,0 +1,380 @@
+"""
+Background client and task exports (python manage.py run_exports).
+
+POST export-view snapshots the list query into an ExportJob. The runner
+rebuilds the queryset through the list view's own get_queryset, reads it
+with one server-side cursor (iterator) and serializes and writes it a chunk
+at a time, recording progress after every chunk. Parquet and JSON Lines
+skip the serializer: they read typed values_list chunks, with column types
+taken from the model fields. Files are written to
+EXPORT_DIR under a temporary name and renamed when complete. An export with
+the same filter hash and data version as an earlier one reuses its job.
+"""
+import csv
+import datetime
+import hashlib
+import importlib.util
+import itertools
+import json
+import os
+from django.conf import settings
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from rest_framework.request import Request
+from crm.models.exports import ExportJob
+from crm.services.lookups import get_saved_view
+from crm.utils import build_q_object
+from crm.versioning import bump_versions, get_versions
+
+# List query params snapshotted into ExportJob.params
+QUERY_PARAMS = ('filters', 'search', 'sort', 'view', 'client_id')
+SHEET_NAMES = {'client': 'Clients', 'task': 'Tasks'}
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+    'jsonl': 'application/jsonl',
+}
+# Rows per Parquet row group, larger groups compress better
+PARQUET_ROW_GROUP_SIZE = 100_000
+
+INTEGER_FIELDS = {
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField',
+}
+# Internal type of a model field: kind of its export column (default "string")
+FIELD_KINDS = {
+    **{name: 'int' for name in INTEGER_FIELDS},
+    'FloatField': 'float',
+    'DecimalField': 'decimal',
+    'BooleanField': 'bool',
+    'DateTimeField': 'datetime',
+    'DateField': 'date',
+    'JSONField': 'json',
+}
+
+def _viewset(view_type):
+    # Imported here, the views enqueue jobs through this module
+    from crm.views.clients import ClientViewSet
+    from crm.views.tasks import TaskViewSet
+    return {'client': ClientViewSet, 'task': TaskViewSet}[view_type]
+
+def _sha256(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def export_columns(value):
+    """
+    Requested columns, from a JSON string (query param) or a list (body).
+    """
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except (json.JSONDecodeError, TypeError):
+            return []
+    return [column for column in value if isinstance(column, str)] if isinstance(value, list) else []
+
+def snapshot_params(params):
+    """
+    The list query params of an export, with the saved view (view_id)
+    copied in: its filters as view_filters, its sorting unless overridden.
+    """
+    snapshot = {key: str(params[key]) for key in QUERY_PARAMS if params.get(key)}
+    view_id = params.get('view_id')
+    saved_view = get_saved_view(view_id) if view_id else None
+    if saved_view:
+        snapshot['view_filters'] = saved_view['filters']
+        if 'sort' not in snapshot and saved_view['sorting']:
+            snapshot['sort'] = json.dumps(saved_view['sorting'])
+    return snapshot
+
+def data_version(view_type, user):
+    """
+    Hash of the DataVersion counters the list view depends on. Relative date
+    filters (today, past_n_days) change with the day, so the date is included.
+    """
+    scopes = [scope.format(user=user.pk) for scope in _viewset(view_type).version_scopes]
+    versions = get_versions(scopes)
+    return _sha256([sorted((scope, version) for scope, (version, _) in versions.items()), timezone.localdate()])
+
+def export_path(job):
+    return os.path.join(settings.EXPORT_DIR, job.file_name)
+
+def enqueue_export(user, view_type, file_format, params, columns):
+    """
+    Returns (job, created). An identical export of unchanged data that is
+    queued, running or completed (with its file still there) is reused.
+    """
+    params = snapshot_params(params)
+    filter_hash = _sha256([user.pk, user.is_staff, user.is_superuser, view_type, file_format, params, columns])
+    version = data_version(view_type, user)
+    existing = ExportJob.objects.filter(
+        owner=user, filter_hash=filter_hash, data_version=version, status__in=('queued', 'running', 'completed')
+    ).order_by('-created_at').first()
+    if existing and (existing.status != 'completed' or os.path.exists(export_path(existing))):
+        return existing, False
+    job = ExportJob.objects.create(
+        owner=user, view_type=view_type, file_format=file_format, params=params, columns=columns,
+        filter_hash=filter_hash, data_version=version,
+    )
+    return job, True
+
+def build_queryset(job):
+    """
+    (viewset, queryset) of the job, from the list view's get_queryset as
+    seen by the job's owner.
+    """
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    for key in QUERY_PARAMS:
+        if key in job.params:
+            http_request.GET[key] = job.params[key]
+    request = Request(http_request)
+    request.user = job.owner
+    viewset = _viewset(job.view_type)(request=request, format_kwarg=None, action='export', args=(), kwargs={})
+    queryset = viewset.get_queryset()
+    if job.params.get('view_filters'):
+        queryset = queryset.filter(build_q_object(job.params['view_filters'], job.owner, queryset.model))
+    return viewset, queryset
+
+def _cell(value):
+    # Serializers return JSON types; nested values go in as JSON text
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+class CsvExportWriter:
+    def __init__(self, path, sheet_name):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+
+    def write_row(self, values):
+        self.writer.writerow(['' if value is None else value for value in values])
+
+    def close(self):
+        self.file.close()
+
+class XlsxExportWriter:
+    """
+    Write-only workbooks stream rows to disk instead of keeping cells in
+    memory. They do not stop at Excel's row limit, so rows past a full sheet
+    go to a continuation sheet ("Clients (2)") under a copy of the header.
+    """
+    max_rows = 1048576
+
+    def __init__(self, path, sheet_name):
+        from openpyxl import Workbook
+        self.path = path
+        self.sheet_name = sheet_name
+        self.workbook = Workbook(write_only=True)
+        self.sheets = 0
+        self.header = None
+        self._add_sheet()
+
+    def _add_sheet(self):
+        self.sheets += 1
+        title = self.sheet_name if self.sheets == 1 else f"{self.sheet_name} ({self.sheets})"
+        self.sheet = self.workbook.create_sheet(title)
+        self.rows = 0
+        if self.header is not None:
+            self._append(self.header)
+
+    def _append(self, values):
+        self.sheet.append(values)
+        self.rows += 1
+
+    def write_row(self, values):
+        if self.header is None:
+            self.header = values
+        elif self.rows >= self.max_rows:
+            self._add_sheet()
+        self._append(values)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+class ExportColumn:
+    """
+    A typed export column: the serializer field name, the values_list path
+    it is read from and the kind of its values (int, datetime, json, ...).
+    """
+    def __init__(self, name, path, field):
+        self.name = name
+        self.path = path
+        self.field = field
+        self.kind = FIELD_KINDS.get(field.get_internal_type(), 'string')
+
+    def arrow_type(self):
+        import pyarrow as pa
+        if self.kind == 'decimal':
+            return pa.decimal128(self.field.max_digits, self.field.decimal_places)
+        return {
+            'int': pa.int64(),
+            'float': pa.float64(),
+            'bool': pa.bool_(),
+            'datetime': pa.timestamp('us', tz='UTC'),
+            'date': pa.date32(),
+        }.get(self.kind, pa.string())
+
+def typed_columns(model, serializer, header):
+    """
+    ExportColumns of the header, resolved through the serializer field
+    sources: "client.name" is read as client__name, a foreign key as its id.
+    """
+    columns = []
+    for name in header:
+        source = serializer.fields[name].source
+        if source == '*':
+            raise ValueError(f"Column {name} has no model field and cannot be exported as a typed column")
+        current = model
+        for part in source.split('.'):
+            field = current._meta.get_field(part)
+            if field.is_relation:
+                current = field.related_model
+        # Foreign keys are exported as the id of the related row
+        columns.append(ExportColumn(name, source.replace('.', '__'), field.target_field if field.is_relation else field))
+    return columns
+
+class JsonlExportWriter:
+    """
+    One JSON object per line. Dates and datetimes are ISO 8601 strings,
+    decimals are strings, numbers and JSON fields keep their types.
+    """
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.names = [column.name for column in columns]
+        self.converters = [
+            (lambda value: value.isoformat() if value is not None else None) if column.kind in ('datetime', 'date')
+            else (lambda value: str(value) if value is not None else None) if column.kind == 'decimal'
+            else None
+            for column in columns
+        ]
+
+    def write_rows(self, rows):
+        lines = []
+        for row in rows:
+            values = [convert(value) if convert else value for convert, value in zip(self.converters, row)]
+            lines.append(json.dumps(dict(zip(self.names, values)), ensure_ascii=False))
+        self.file.write('\n'.join(lines) + '\n')
+
+    def close(self):
+        self.file.close()
+
+class ParquetExportWriter:
+    """
+    Typed Parquet (zstd). Chunks are buffered into row groups of
+    PARQUET_ROW_GROUP_SIZE rows.
+    """
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.schema = pa.schema([pa.field(column.name, column.arrow_type()) for column in columns])
+        self.json_columns = [i for i, column in enumerate(columns) if column.kind == 'json']
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        self.batches = []
+        self.buffered = 0
+
+    def write_rows(self, rows):
+        values = [list(column) for column in zip(*rows)]
+        for i in self.json_columns:
+            values[i] = [json.dumps(value) if value is not None else None for value in values[i]]
+        arrays = [self.pa.array(column, type=field.type) for column, field in zip(values, self.schema)]
+        self.batches.append(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.buffered += len(rows)
+        if self.buffered >= PARQUET_ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.batches:
+            self.writer.write_table(self.pa.Table.from_batches(self.batches), row_group_size=self.buffered)
+            self.batches = []
+            self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+WRITERS = {'csv': CsvExportWriter, 'xlsx': XlsxExportWriter}
+# Written from values_list rows instead of serialized ones
+TYPED_WRITERS = {'parquet': ParquetExportWriter, 'jsonl': JsonlExportWriter}
+
+def format_unavailable(file_format):
+    """
+    Why file_format cannot be exported here, None if it can.
+    """
+    if file_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        return 'Parquet exports need pyarrow (pip install pyarrow)'
+    return None
+
+def _record_progress(job, **updates):
+    ExportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now(), **updates)
+    # Queryset updates skip signals, keep ETags of the job list honest
+    bump_versions(f'exportjob:{job.owner_id}')
+
+def run_export(job, chunk_size=None, stdout=None):
+    """
+    Renders the job to EXPORT_DIR and returns the final status.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    viewset, queryset = build_queryset(job)
+    serializer = viewset.get_serializer()
+    fields = [name for name, field in serializer.fields.items() if not field.write_only]
+    header = [column for column in job.columns if column in fields] or fields
+    _record_progress(job, status='running', started_at=timezone.now(), total_count=queryset.count(), rows_written=0)
+
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    file_name = f"{job.view_type}s-{job.pk}.{job.file_format}"
+    path = os.path.join(settings.EXPORT_DIR, file_name)
+    partial = f"{path}.part"
+    typed = job.file_format in TYPED_WRITERS
+    if typed:
+        columns = typed_columns(queryset.model, serializer, header)
+        writer = TYPED_WRITERS[job.file_format](partial, columns)
+        rows = queryset.values_list(*[column.path for column in columns]).iterator(chunk_size=chunk_size)
+    else:
+        writer = WRITERS[job.file_format](partial, SHEET_NAMES[job.view_type])
+        writer.write_row(header)
+        rows = queryset.iterator(chunk_size=chunk_size)
+    written = 0
+    try:
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            if typed:
+                writer.write_rows(chunk)
+            else:
+                for row in viewset.get_serializer(chunk, many=True).data:
+                    writer.write_row([_cell(row.get(column)) for column in header])
+            written += len(chunk)
+            _record_progress(job, rows_written=written)
+            if stdout:
+                stdout.write(f"Export {job.pk}: {written} rows")
+        writer.close()
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+
+    _record_progress(
+        job, status='completed', finished_at=timezone.now(), rows_written=written,
+        file_name=file_name, file_size=os.path.getsize(path),
+    )
+    return 'completed'
+
+def delete_expired_exports():
+    """
+    Removes jobs (and their files) finished more than EXPORT_RETENTION_HOURS ago.
+    """
+    cutoff = timezone.now() - datetime.timedelta(hours=settings.EXPORT_RETENTION_HOURS)
+    expired = list(ExportJob.objects.filter(finished_at__lt=cutoff))
+    for job in expired:
+        if job.file_name:
+            try:
+                os.remove(export_path(job))
+            except FileNotFoundError:
+                pass
+        job.delete()
+    return len(expired)
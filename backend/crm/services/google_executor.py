@@ -0,0 +1,38 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """
+    Dedicated pool for blocking Google calls, sized by GMAIL_MAX_CONCURRENCY.
+    Slow Gmail round-trips queue up here instead of occupying request workers.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.GMAIL_MAX_CONCURRENCY,
+                    thread_name_prefix='google'
+                )
+    return _executor
+
+def _call(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # Executor threads live outside the request cycle, so release their
+        # DB connections the same way request_finished would
+        close_old_connections()
+
+async def run_google(func, *args, **kwargs):
+    """
+    Awaits a blocking Google API call (and the ORM bookkeeping that goes with
+    it, e.g. GoogleService.fetch_emails) on the bounded executor.
+    """
+    return await sync_to_async(_call, thread_sensitive=False, executor=get_executor())(func, *args, **kwargs)
@@ -0,0 +1,34 @@
+from crm import cache
+from crm.models.clients import SavedView
+from crm.models.user_config import UserConfig
+
+def get_saved_view(view_id):
+    """
+    Returns the filters/sorting of a saved view as a dict, or None if it does not exist.
+    Cached in the "savedview" namespace, which is invalidated on any SavedView change,
+    unless the cache is the database itself.
+    """
+    try:
+        view_id = int(view_id)
+    except (TypeError, ValueError):
+        return None
+
+    def load():
+        return SavedView.objects.filter(id=view_id).values('id', 'view_type', 'filters', 'sorting').first()
+
+    if cache.is_database_backed():
+        return load()
+    return cache.get_or_compute('savedview', f'view:{view_id}', load)
+
+def get_visibility(user):
+    """
+    Returns the see_all_clients/see_all_tasks flags of a user, or None if the
+    user has no config yet. Cached per user in the "userconfig:<id>" namespace,
+    unless the cache is the database itself.
+    """
+    def load():
+        return UserConfig.objects.filter(user=user).values('see_all_clients', 'see_all_tasks').first()
+
+    if cache.is_database_backed():
+        return load()
+    return cache.get_or_compute(f'userconfig:{user.pk}', 'visibility', load)
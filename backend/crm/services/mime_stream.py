@@ -0,0 +1,92 @@
+import base64
+import mimetypes
+import uuid
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# 57 input bytes encode to one 76 character base64 line, so chunks that are a
+# multiple of 57 can be encoded independently and concatenated
+BASE64_CHUNK_SIZE = 57 * 1024
+
+def _write_headers(fp, message):
+    for name, value in message.items():
+        fp.write(message.policy.fold_binary(name, value))
+    fp.write(b'\n')
+
+def _iter_chunks(attachment, size):
+    if hasattr(attachment, 'chunks'):
+        # Django UploadedFile (in memory or spooled to a temporary file)
+        yield from attachment.chunks(size)
+        return
+    attachment.seek(0)
+    while True:
+        chunk = attachment.read(size)
+        if not chunk:
+            break
+        yield chunk
+
+def _write_base64(fp, attachment):
+    """
+    Streams the attachment into fp as base64, holding at most one chunk in memory.
+    """
+    pending = b''
+    for chunk in _iter_chunks(attachment, BASE64_CHUNK_SIZE):
+        pending += chunk
+        usable = len(pending) - len(pending) % 57
+        if usable:
+            fp.write(base64.encodebytes(pending[:usable]))
+            pending = pending[usable:]
+    if pending:
+        fp.write(base64.encodebytes(pending))
+
+def write_mime_message(fp, to_email, subject, body, attachments=None, in_reply_to=None):
+    """
+    Writes an RFC 822 message with an HTML body and optional attachments to the
+    binary file object fp and returns the number of bytes written.
+
+    Unlike MIMEMultipart.as_bytes(), attachments are never loaded whole: each one
+    is read and base64 encoded chunk by chunk straight into fp, which is
+    expected to be a (spooled) temporary file.
+    """
+    start = fp.tell()
+
+    if not attachments:
+        message = MIMEText(body, 'html')
+        message['to'] = to_email
+        message['subject'] = subject
+        if in_reply_to:
+            message['In-Reply-To'] = in_reply_to
+            message['References'] = in_reply_to
+        fp.write(message.as_bytes())
+        return fp.tell() - start
+
+    boundary = f"==============={uuid.uuid4().hex}=="
+    message = MIMEMultipart(boundary=boundary)
+    message['to'] = to_email
+    message['subject'] = subject
+    if in_reply_to:
+        message['In-Reply-To'] = in_reply_to
+        message['References'] = in_reply_to
+    _write_headers(fp, message)
+
+    delimiter = f"\n--{boundary}\n".encode()
+    fp.write(delimiter)
+    fp.write(MIMEText(body, 'html').as_bytes())
+
+    for attachment in attachments:
+        content_type, encoding = mimetypes.guess_type(attachment.name)
+        if content_type is None or encoding is not None:
+            content_type = 'application/octet-stream'
+        main_type, sub_type = content_type.split('/', 1)
+
+        part = MIMEBase(main_type, sub_type)
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment', filename=attachment.name)
+
+        fp.write(delimiter)
+        _write_headers(fp, part)
+        _write_base64(fp, attachment)
+
+    fp.write(f"\n--{boundary}--\n".encode())
+    return fp.tell() - start
@@ -0,0 +1,77 @@
+import json
+import re
+from django.conf import settings
+from django.db import connection, transaction
+
+SQLITE_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+
+def _walk(plan, nodes):
+    node = {
+        'node_type': plan.get('Node Type'),
+        'relation': plan.get('Relation Name'),
+        'index': plan.get('Index Name'),
+        'estimated_rows': plan.get('Plan Rows'),
+        'actual_rows': plan.get('Actual Rows'),
+        'filter': plan.get('Filter') or plan.get('Index Cond'),
+    }
+    nodes.append({key: value for key, value in node.items() if value is not None})
+    for child in plan.get('Plans', []):
+        _walk(child, nodes)
+
+def _explain_postgres(queryset, analyze):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # ANALYZE runs the query, keep a runaway filter from holding a connection
+            cursor.execute(f"SET LOCAL statement_timeout = {int(settings.EXPLAIN_STATEMENT_TIMEOUT_MS)}")
+        output = queryset.explain(format='json', analyze=analyze, buffers=analyze)
+
+    result = json.loads(output) if isinstance(output, str) else output
+    result = result[0]
+    plan = result['Plan']
+    nodes = []
+    _walk(plan, nodes)
+    return {
+        'plan': result,
+        'nodes': nodes,
+        'estimated_rows': plan.get('Plan Rows'),
+        'actual_rows': plan.get('Actual Rows'),
+        'estimated_cost': plan.get('Total Cost'),
+        'planning_ms': result.get('Planning Time'),
+        'execution_ms': result.get('Execution Time'),
+        'indexes': sorted({node['index'] for node in nodes if node.get('index')}),
+    }
+
+def _explain_generic(queryset):
+    # SQLite (development) only has a textual plan without row estimates
+    output = queryset.explain()
+    return {
+        'plan': output,
+        'nodes': [],
+        'estimated_rows': None,
+        'actual_rows': None,
+        'estimated_cost': None,
+        'planning_ms': None,
+        'execution_ms': None,
+        'indexes': sorted(set(SQLITE_INDEX.findall(output))),
+    }
+
+def explain_queryset(queryset, analyze=False, sample_size=20):
+    """
+    Describes how the database runs queryset: the SQL and its parameters, the
+    plan (EXPLAIN, optionally with ANALYZE), estimated vs actual rows, the
+    indexes used and a sample of matching primary keys.
+    """
+    sql, params = queryset.query.sql_with_params()
+    if connection.vendor == 'postgresql':
+        result = _explain_postgres(queryset, analyze)
+    else:
+        result = _explain_generic(queryset)
+
+    return {
+        'sql': sql,
+        'params': [str(param) for param in params],
+        'vendor': connection.vendor,
+        'analyzed': analyze and connection.vendor == 'postgresql',
+        **result,
+        'sample_ids': list(queryset.values_list('pk', flat=True)[:sample_size]),
+    }
@@ -0,0 +1,70 @@
+import threading
+import time
+from django.db import transaction
+from crm.models.campaigns import RateLimitBucket
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens are added per second up to
+    `capacity`; acquire() blocks until a token is available.
+    """
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError(f'Rate must be above 0, got {rate}')
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+class SharedTokenBucket:
+    """
+    Token bucket kept in a RateLimitBucket row, so processes sending for the
+    same key share one rate. Each acquire() reserves the next slot with a
+    locked read and an update (GCRA: the row holds the time the next token is
+    due, bursts of up to `capacity` are allowed) and sleeps until it.
+    """
+    def __init__(self, key, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError(f'Rate must be above 0, got {rate}')
+        self.key = key
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+
+    def reserve(self, tokens=1):
+        """Books tokens and returns how many seconds to wait before using them."""
+        interval = 1 / self.rate
+        with transaction.atomic():
+            bucket, _ = RateLimitBucket.objects.select_for_update().get_or_create(key=self.key)
+            now = time.time()
+            due = max(bucket.next_at, now)
+            bucket.next_at = due + tokens * interval
+            bucket.save(update_fields=['next_at'])
+        return max(0.0, due - (self.capacity - 1) * interval - now)
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+def get_bucket(key, rate):
+    """
+    Returns the bucket for key (e.g. a user id), shared by every campaign of
+    that user in every process.
+    """
+    return SharedTokenBucket(f'campaign:{key}', rate)
@@ -0,0 +1,108 @@
+import datetime
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from crm.models.clients import Client
+from crm.models.tasks import Task
+from crm.models.workflows import SchedulerWatermark
+from crm.services.view_counts import refresh_counts
+from crm.services.workflow_events import registry, dispatch, emit_task_overdue
+
+def _scan(queryset, field, start, start_id, end, batch_size):
+    """
+    Yields batches of rows with (start, start_id) < (field, id) and field < end,
+    in keyset order, so every batch is an index range scan.
+    """
+    cursor_time, cursor_id = start, start_id
+    while True:
+        batch = list(
+            queryset.filter(
+                Q(**{f'{field}__gt': cursor_time}) | Q(**{field: cursor_time, 'id__gt': cursor_id}),
+                **{f'{field}__lt': end}
+            ).order_by(field, 'id')[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        cursor_time, cursor_id = getattr(batch[-1], field), batch[-1].id
+
+def _process_window(name, queryset, field, end, handle, batch_size):
+    """
+    Hands every row whose field crossed into [watermark, end) to handle(), one
+    batch per transaction, advancing the watermark with each batch. Workflow
+    dispatch runs once the batch commits. Returns the number of rows handled.
+
+    A watermark seen for the first time starts at end, so enabling a trigger
+    does not fire for everything in the past. Watermarks only move forward:
+    a replay with an earlier end (run_scheduler --now) hands nothing off.
+    """
+    watermark, created = SchedulerWatermark.objects.get_or_create(name=name, defaults={'processed_until': end})
+    ahead = SchedulerWatermark.objects.filter(pk=watermark.pk, processed_until__lt=end)
+    if created or queryset is None:
+        ahead.update(processed_until=end, last_id=0)
+        return 0
+
+    handled = 0
+    for batch in _scan(queryset, field, watermark.processed_until, watermark.last_id, end, batch_size):
+        with transaction.atomic():
+            for row in batch:
+                handle(row)
+            SchedulerWatermark.objects.filter(pk=watermark.pk).update(
+                processed_until=getattr(batch[-1], field), last_id=batch[-1].id
+            )
+        handled += len(batch)
+
+    # Rows at exactly `end` belong to the next window, last_id 0 keeps them in it
+    ahead.update(processed_until=end, last_id=0)
+    return handled
+
+def emit_overdue_if_scanned(task):
+    """
+    Fires TASK_OVERDUE for an open task whose due date lies in a window the
+    scheduler already scanned: created overdue, moved back into the past or
+    reopened after its due date. The scan only sees due dates crossing now.
+    """
+    if task.due_date is None or task.status == 'done' or not registry.has_subscribers(task.assigned_to_id, 'TASK_OVERDUE'):
+        return
+    watermark = SchedulerWatermark.objects.filter(name='TASK_OVERDUE').values_list('processed_until', 'last_id').first()
+    if watermark and (task.due_date, task.pk) <= watermark:
+        emit_task_overdue(task)
+
+def run_scheduler(now=None, batch_size=None):
+    """
+    Runs one pass of the time-based triggers up to `now` (injectable for
+    tests and replays) and returns {watermark name: rows handed off}.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.SCHEDULER_BATCH_SIZE
+    results = {}
+
+    # TASK_OVERDUE: open tasks whose due date passed since the last run
+    owner_ids = {workflow.owner_id for workflow in registry.by_trigger('TASK_OVERDUE')}
+    overdue = None
+    if owner_ids:
+        overdue = Task.objects.filter(assigned_to_id__in=owner_ids).exclude(status='done').select_related('client')
+    results['TASK_OVERDUE'] = _process_window('TASK_OVERDUE', overdue, 'due_date', now, emit_task_overdue, batch_size)
+
+    # CLIENT_CREATED_DAYS_AGO: clients whose created_at + days passed since the last run
+    for workflow in registry.by_trigger('CLIENT_CREATED_DAYS_AGO'):
+        try:
+            days = int(workflow.trigger_config.get('days'))
+        except (TypeError, ValueError):
+            print(f"Workflow {workflow.name} has no valid trigger_config.days")
+            continue
+        # Changing the delay starts a new watermark instead of back-filling
+        name = f'CLIENT_CREATED_DAYS_AGO:{workflow.id}:{days}'
+        results[name] = _process_window(
+            name,
+            Client.objects.filter(owner_id=workflow.owner_id),
+            'created_at',
+            now - datetime.timedelta(days=days),
+            lambda client, workflow=workflow, days=days: dispatch([workflow], client, f'created+{days}d'),
+            batch_size
+        )
+
+    # Saved view counts with relative dates move with time
+    results['saved_view_counts'] = refresh_counts(now)
+    return results
@@ -0,0 +1,247 @@
+"""
+Email template language:
+
+    {{ client.name }}                      field of a context object
+    {{ client.owner.first_name }}          follows relations
+    {{ task.due_date|default:"soon" }}     fallback for empty values
+    {{ client.name|upper }}                filters: default, upper, lower, title, safe
+    {{ client_name }}                      legacy aliases used by existing templates
+
+Values are HTML-escaped in bodies unless the placeholder ends with |safe.
+Subjects are plain text and take the same placeholders as bodies.
+Placeholders that do not resolve to a known field are left untouched.
+"""
+import datetime
+import re
+import threading
+from collections import OrderedDict
+from django.utils import timezone
+
+
+PLACEHOLDER = re.compile(r'\{\{\s*(.*?)\s*\}\}')
+FILTER = re.compile(r'\|\s*(\w+)(?:\s*:\s*"([^"]*)")?')
+
+USER_FIELDS = ('username', 'first_name', 'last_name', 'email', 'full_name')
+
+# Fields reachable from each context root; relations point at another entry
+FIELDS = {
+    'client': {
+        'id': None, 'name': None, 'email': None, 'phone': None, 'address': None,
+        'created_at': None, 'owner': 'user',
+    },
+    'task': {
+        'id': None, 'title': None, 'description': None, 'status': None, 'priority': None,
+        'due_date': None, 'completed_at': None, 'created_at': None,
+        'client': 'client', 'assigned_to': 'user',
+    },
+    'email': {
+        'subject': None, 'from_email': None, 'to_email': None, 'timestamp': None,
+        'client': 'client',
+    },
+    'user': {name: None for name in USER_FIELDS},
+}
+
+# Context roots and the entry of FIELDS they use
+ROOTS = {'client': 'client', 'task': 'task', 'email': 'email', 'owner': 'user'}
+
+LEGACY_ALIASES = {
+    'client_name': 'client.name',
+    'client_email': 'client.email',
+    'client_phone': 'client.phone',
+    'client_address': 'client.address',
+}
+
+def _escape(text):
+    # Same output as django.utils.html.escape without the SafeString wrapping.
+    # Most values have nothing to escape, and looking for the characters is
+    # cheaper than the replaces (or a regex, or str.translate)
+    if '&' in text or '<' in text or '>' in text or '"' in text or "'" in text:
+        return (
+            text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            .replace('"', '&quot;').replace("'", '&#x27;')
+        )
+    return text
+
+FILTERS = {
+    'upper': str.upper,
+    'lower': str.lower,
+    'title': str.title,
+}
+
+def _format(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if timezone.is_aware(value) else value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value)
+
+def _resolve_path(path):
+    """
+    Validates a dotted path against FIELDS and returns (root, attrs),
+    or None if it is not a known field.
+    """
+    path = LEGACY_ALIASES.get(path, path)
+    if path == 'date':
+        return 'date', []
+    parts = path.split('.')
+    entry = ROOTS.get(parts[0])
+    if entry is None:
+        return None
+    attrs = []
+    for part in parts[1:]:
+        if entry is None or part not in FIELDS[entry]:
+            return None
+        attrs.append('get_full_name' if part == 'full_name' else part)
+        entry = FIELDS[entry][part]
+    # Whole clients/tasks/emails are not renderable, users render as their username
+    if entry in ('client', 'task', 'email'):
+        return None
+    if entry == 'user':
+        attrs.append('username')
+    return parts[0], attrs
+
+class CompiledTemplate:
+    """
+    A template compiled once into a Python function: each distinct
+    placeholder is resolved into a local with plain attribute access, then
+    the locals and the literal text between them are concatenated in a
+    single pass. Only attribute names validated against FIELDS end up in the
+    generated source; literal text, defaults and filters are passed in as
+    constants, so template text is never run as code.
+    """
+    def __init__(self, text, autoescape=True):
+        text = text or ''
+        self.namespace = {'_format': _format, '_escape': _escape, '_localdate': timezone.localdate}
+        self.roots = set()
+        lines = []
+        names = {}
+        parts = []
+        position = 0
+        for match in PLACEHOLDER.finditer(text):
+            expression = match.group(1)
+            if expression not in names:
+                name = f'v{len(names)}'
+                code = self._compile_placeholder(expression, name, autoescape)
+                if code is None:
+                    # Unknown placeholders stay in the output as written
+                    continue
+                names[expression] = name
+                lines.extend(code)
+            parts.append(self._literal(text[position:match.start()]))
+            parts.append(names[expression])
+            position = match.end()
+        parts.append(self._literal(text[position:]))
+
+        source = ['def render(context):']
+        source.extend(f"    r_{root} = context.get('{root}')" for root in sorted(self.roots))
+        source.extend(lines)
+        # An f-string of names only: one BUILD_STRING, no tuple to allocate
+        source.append("    return f'" + ''.join('{%s}' % part for part in parts if part) + "'")
+        exec(compile('\n'.join(source), '<email template>', 'exec'), self.namespace)
+        self.render = self.namespace['render']
+
+    def _literal(self, text):
+        if not text:
+            return None
+        name = f'_text{len(self.namespace)}'
+        self.namespace[name] = text
+        return name
+
+    def _compile_placeholder(self, expression, name, autoescape):
+        """
+        Source lines that leave the rendered text of expression in the local
+        name, or None if it is not a known field.
+        """
+        path, _, filter_source = expression.partition('|')
+        resolved = _resolve_path(path.strip())
+        if resolved is None:
+            return None
+        default = ''
+        filters = []
+        for filter_name, argument in FILTER.findall('|' + filter_source if filter_source else ''):
+            if filter_name == 'default':
+                default = argument
+            elif filter_name == 'safe':
+                autoescape = False
+            elif filter_name in FILTERS:
+                filters.append(FILTERS[filter_name])
+            else:
+                return None
+        post = filters + ([_escape] if autoescape else [])
+
+        root, attrs = resolved
+        if root == 'date':
+            lines = [f'    {name} = _localdate()']
+        else:
+            self.roots.add(root)
+            lines = [f'    {name} = r_{root}']
+            indent = '    '
+            # Which attributes are methods is known from FIELDS, so it is
+            # decided here rather than with callable() on every render
+            for attr in attrs:
+                lines.append(f'{indent}if {name} is not None:')
+                indent += '    '
+                call = '()' if attr == 'get_full_name' else ''
+                lines.append(f'{indent}{name} = {name}.{attr}{call}')
+
+        # The default goes through the filters now, once
+        rendered_default = default
+        for apply in post:
+            rendered_default = apply(rendered_default)
+        self.namespace[f'{name}_default'] = rendered_default
+        lines += [
+            f"    if {name} is None or {name} == '':",
+            f'        {name} = {name}_default',
+            '    else:',
+            f'        if {name}.__class__ is not str:',
+            f'            {name} = _format({name})',
+        ]
+        for index, apply in enumerate(filters):
+            self.namespace[f'{name}_filter{index}'] = apply
+            lines.append(f'        {name} = {name}_filter{index}({name})')
+        if autoescape:
+            # _escape's check inlined, most values have nothing to escape
+            lines += [
+                f"""        if '&' in {name} or '<' in {name} or '>' in {name} or '"' in {name} or "'" in {name}:""",
+                f'            {name} = _escape({name})',
+            ]
+        return lines
+
+def compile_template(text, autoescape=True):
+    """
+    Compiles template text; returns a render(context) callable where context
+    maps roots ("client", "task", "email", "owner") to model instances.
+    """
+    return CompiledTemplate(text, autoescape).render
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+COMPILED_CACHE_SIZE = 256
+
+def get_compiled(template):
+    """
+    Returns (render_subject, render_body) for an EmailTemplate, compiled once
+    and cached per process until the template's updated_at changes. Subjects
+    are plain text, bodies are HTML and autoescaped.
+    """
+    key = (template.pk, template.updated_at)
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+    compiled = (compile_template(template.subject, autoescape=False), compile_template(template.body))
+    with _compiled_lock:
+        _compiled[key] = compiled
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
+
+def render_email_template(template, **context):
+    """
+    Renders an EmailTemplate for one recipient, e.g.
+    render_email_template(template, client=client, owner=workflow.owner).
+    Returns (subject, body).
+    """
+    render_subject, render_body = get_compiled(template)
+    return render_subject(context), render_body(context)
@@ -0,0 +1,214 @@
+import datetime
+import functools
+import json
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import F, Q
+from django.utils import timezone
+from crm import cache
+from crm.filter_evaluator import compile_predicate, UnsupportedFilter
+from crm.models.clients import Client, SavedView, SavedViewCount
+from crm.models.tasks import Task
+from crm.services.lookups import get_visibility
+from crm.utils import build_q_object
+
+NAMESPACE = 'savedviewcount'
+
+VIEW_MODELS = {'client': Client, 'task': Task}
+# Non-admin users without the see_all flag only see their own rows
+VISIBILITY = {'client': ('see_all_clients', 'owner_id'), 'task': ('see_all_tasks', 'assigned_to_id')}
+
+RELATIVE_OPERATORS = {'today', 'yesterday', 'tomorrow', 'after_today', 'before_today', 'past_n_days', 'future_n_days'}
+
+def _conditions(node):
+    for cond in node.get('conditions', []) if isinstance(node, dict) else []:
+        if isinstance(cond, dict) and 'logic' in cond:
+            yield from _conditions(cond)
+        elif isinstance(cond, dict):
+            yield cond
+
+def is_relative(filters):
+    # The count changes with time, not only with rows
+    return any(cond.get('operator') in RELATIVE_OPERATORS for cond in _conditions(filters))
+
+def is_dependent(filters):
+    # Filters through a relation (client__name) change when the related row does
+    return any('__' in str(cond.get('field', '')) for cond in _conditions(filters))
+
+def related_fields(filters, relation):
+    # Fields of the relation the filters go through, {'name'} for client__name
+    return {
+        str(cond['field']).split('__')[1] for cond in _conditions(filters)
+        if str(cond.get('field', '')).startswith(f'{relation}__')
+    }
+
+def changed_fields(old, new):
+    return {field.name for field in new._meta.concrete_fields if getattr(old, field.attname) != getattr(new, field.attname)}
+
+def restricted_field(user, view_type):
+    """
+    The attname rows are restricted to the user by, or None if they see all.
+    """
+    if user.is_staff or user.is_superuser:
+        return None
+    flag, attname = VISIBILITY[view_type]
+    visibility = get_visibility(user)
+    return attname if visibility and not visibility[flag] else None
+
+def view_queryset(view, user):
+    """
+    The rows user sees in view, as the client/task list endpoints filter them.
+    """
+    model = VIEW_MODELS[view.view_type]
+    queryset = model.objects.all()
+    attname = restricted_field(user, view.view_type)
+    if attname:
+        queryset = queryset.filter(**{attname: user.pk})
+    return queryset.filter(build_q_object(view.filters, user, model))
+
+def compute_count(view, user, now=None):
+    count = view_queryset(view, user).count()
+    row, created = SavedViewCount.objects.update_or_create(
+        view=view, user=user, defaults={'count': count, 'computed_at': now or timezone.now()}
+    )
+    # Newly computed rows are followed by the signal handlers from now on
+    cache.invalidate(NAMESPACE)
+    return row
+
+def _is_expired(row, view, now):
+    if row.computed_at is None:
+        return True
+    age = now - row.computed_at
+    if age > datetime.timedelta(seconds=settings.SAVED_VIEW_COUNT_MAX_AGE):
+        return True
+    return is_relative(view.filters) and age > datetime.timedelta(seconds=settings.SAVED_VIEW_COUNT_RELATIVE_TTL)
+
+def get_counts(user, view_type=None):
+    """
+    Returns the SavedViewCount rows of every view user sees (own and system
+    views). Only missing or expired counts are computed, the rest is one query.
+    """
+    views = SavedView.objects.filter(Q(user=user) | Q(is_system=True))
+    if view_type:
+        views = views.filter(view_type=view_type)
+    views = list(views.order_by('position', 'id'))
+    rows = {row.view_id: row for row in SavedViewCount.objects.filter(user=user, view__in=views)}
+
+    now = timezone.now()
+    counts = []
+    for view in views:
+        row = rows.get(view.id)
+        if row is None or _is_expired(row, view, now):
+            row = compute_count(view, user, now)
+        counts.append(row)
+    return counts
+
+def refresh_counts(now=None):
+    """
+    Recomputes the stored counts that expired: relative-date views every
+    SAVED_VIEW_COUNT_RELATIVE_TTL seconds, all others after
+    SAVED_VIEW_COUNT_MAX_AGE as a guard against drift. Returns how many.
+    """
+    now = now or timezone.now()
+    refreshed = 0
+    for row in SavedViewCount.objects.select_related('view', 'user'):
+        if _is_expired(row, row.view, now):
+            compute_count(row.view, row.user, now)
+            refreshed += 1
+    return refreshed
+
+def _tracked(view_type):
+    """
+    (count id, view id, filters, user id, restricted attname) of the counts
+    kept up to date for view_type, shared through the cache.
+    """
+    def load():
+        tracked = []
+        for row in SavedViewCount.objects.filter(view__view_type=view_type, computed_at__isnull=False).select_related('view', 'user'):
+            tracked.append((row.pk, row.view_id, row.view.filters, row.user_id, restricted_field(row.user, view_type)))
+        return tracked
+
+    return cache.get_or_compute(NAMESPACE, f'tracked:{view_type}', load, depends_on=('savedview',))
+
+# Per process: view type -> monotonic time until which it is known tracked
+_known_tracked = {}
+
+def is_tracked(view_type):
+    """
+    Whether any count of view_type is kept up to date. A positive answer is
+    kept in process for SAVED_VIEW_COUNT_TRACKING_CHECK seconds, so saves
+    skip the cache while counts exist. A negative one is not: this worker
+    would miss the changes a count just computed by another worker needs.
+    """
+    now = time.monotonic()
+    if _known_tracked.get(view_type, 0) > now:
+        return True
+    if not _tracked(view_type):
+        return False
+    _known_tracked[view_type] = now + settings.SAVED_VIEW_COUNT_TRACKING_CHECK
+    return True
+
+@functools.lru_cache(maxsize=1024)
+def _predicate(view_type, filters_json, user_id):
+    try:
+        return compile_predicate(json.loads(filters_json), User(pk=user_id), VIEW_MODELS[view_type])
+    except UnsupportedFilter:
+        return None
+
+def _member(obj, predicate, user_id, attname):
+    if obj is None:
+        return False
+    if attname and getattr(obj, attname) != user_id:
+        return False
+    return predicate(obj)
+
+def apply_change(view_type, old, new):
+    """
+    Adjusts the tracked counts of view_type for a row that changed from old
+    to new (None when created or deleted) by evaluating both versions against
+    every view in Python. Views the evaluator cannot follow are marked for a
+    recompute instead.
+    """
+    deltas = defaultdict(list)
+    stale = []
+    for count_id, view_id, filters, user_id, attname in _tracked(view_type):
+        if is_dependent(filters):
+            stale.append(count_id)
+            continue
+        predicate = _predicate(view_type, json.dumps(filters, sort_keys=True), user_id)
+        if predicate is None:
+            stale.append(count_id)
+            continue
+        try:
+            delta = _member(new, predicate, user_id, attname) - _member(old, predicate, user_id, attname)
+        except (UnsupportedFilter, TypeError, ValueError):
+            stale.append(count_id)
+            continue
+        if delta:
+            deltas[delta].append(count_id)
+
+    for delta, count_ids in deltas.items():
+        SavedViewCount.objects.filter(pk__in=count_ids).update(count=F('count') + delta)
+    if stale:
+        SavedViewCount.objects.filter(pk__in=stale).update(computed_at=None)
+
+def mark_dependent_stale(view_type, relation=None, fields=None):
+    """
+    Marks the views of view_type that filter through a relation for a
+    recompute, e.g. task views on client__name when a client changes. With
+    fields, only the views going through one of these fields of relation.
+    """
+    stale = [
+        count_id for count_id, _, filters, _, _ in _tracked(view_type)
+        if is_dependent(filters) and (fields is None or related_fields(filters, relation) & fields)
+    ]
+    if stale:
+        SavedViewCount.objects.filter(pk__in=stale).update(computed_at=None)
+
+def reset_counts(**lookups):
+    # Recomputed on the next read
+    SavedViewCount.objects.filter(**lookups).delete()
+    cache.invalidate(NAMESPACE)
+    _known_tracked.clear()
@@ -0,0 +1,215 @@
+import threading
+import time
+from django.db import IntegrityError, transaction
+from crm import cache
+from crm.models.clients import Client
+from crm.models.workflows import Workflow, WorkflowExecution
+from crm.filter_evaluator import compile_predicate, UnsupportedFilter
+from crm.utils import build_q_object
+from crm.services.workflow_service import execute_workflow_action
+from crm.transactions import commit_batch
+
+REGISTRY_NAMESPACE = 'workflow_registry'
+# How long a process trusts its registry before checking the shared generation
+REGISTRY_CHECK_INTERVAL = 2.0
+
+class WorkflowRegistry:
+    """
+    Active workflows indexed by (owner_id, trigger_type), loaded with a single
+    query and kept in process memory. Saving or deleting a workflow resets the
+    local index and bumps a generation in the shared cache that other
+    processes read at most every REGISTRY_CHECK_INTERVAL seconds, so an event
+    nobody subscribed to costs nothing in between and one cache read (one or
+    two queries on the "db" cache backend) when the check is due.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._generation = None
+        self._checked_at = 0.0
+
+    def _load(self):
+        index = {}
+        for workflow in Workflow.objects.filter(is_active=True).select_related('owner').order_by('id'):
+            index.setdefault((workflow.owner_id, workflow.trigger_type), []).append(workflow)
+        return index
+
+    def _get_index(self):
+        index = self._index
+        if index is not None and time.monotonic() - self._checked_at < REGISTRY_CHECK_INTERVAL:
+            return index
+        with self._lock:
+            generation = cache.get_generations([REGISTRY_NAMESPACE])[REGISTRY_NAMESPACE]
+            if self._index is None or generation != self._generation:
+                self._index = self._load()
+                self._generation = generation
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def subscribers(self, owner_id, trigger):
+        if owner_id is None:
+            return ()
+        return self._get_index().get((owner_id, trigger), ())
+
+    def by_trigger(self, trigger):
+        return [
+            workflow
+            for (owner_id, trigger_type), workflows in self._get_index().items() if trigger_type == trigger
+            for workflow in workflows
+        ]
+
+    def has_subscribers(self, owner_id, trigger):
+        return bool(self.subscribers(owner_id, trigger))
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+        cache.invalidate(REGISTRY_NAMESPACE)
+
+registry = WorkflowRegistry()
+
+# Client ids per batch when matching filters and claiming executions
+EXECUTE_CHUNK_SIZE = 500
+
+def _committed_ids(client_ids, known):
+    """
+    The subset of client_ids that exist (committed), querying only ids not
+    in known, a {pk: exists} dict shared by the workflows of one batch.
+    """
+    missing = client_ids - known.keys()
+    if missing:
+        found = set(Client.objects.filter(pk__in=missing).values_list('pk', flat=True))
+        known.update((pk, pk in found) for pk in missing)
+    return {pk for pk in client_ids if known[pk]}
+
+def _matching_client_ids(workflow, clients, known):
+    """
+    The pks of the loaded clients that exist and match the workflow filters.
+    Filters are evaluated in Python on the instances; those the evaluator
+    cannot handle are matched with one query.
+    """
+    client_ids = {client.pk for client in clients}
+    try:
+        predicate = compile_predicate(workflow.filters, workflow.owner, Client)
+        committed = _committed_ids(client_ids, known)
+        return {client.pk for client in clients if client.pk in committed and predicate(client)}
+    except (UnsupportedFilter, TypeError):
+        queryset = Client.objects.filter(pk__in=client_ids)
+        if workflow.filters:
+            queryset = queryset.filter(build_q_object(workflow.filters, workflow.owner, Client))
+        return set(queryset.values_list('pk', flat=True))
+
+def _claim(workflow, client, event_key):
+    try:
+        with transaction.atomic():
+            WorkflowExecution.objects.create(workflow=workflow, client=client, event_key=event_key)
+        return True
+    except IntegrityError:
+        # An execution whose action failed is claimed again, by one caller only
+        return WorkflowExecution.objects.filter(
+            workflow=workflow, client=client, event_key=event_key
+        ).exclude(error='').update(error='') == 1
+
+def execute_events(events):
+    """
+    Runs (workflow, client, event_key, context) events. Per workflow the
+    clients are matched against its filters (in Python, with one query for
+    the ids that exist), events that already ran are skipped with a query,
+    and every remaining execution is claimed through the unique constraint
+    before its action runs, so concurrent or repeated deliveries run an
+    action at most once. Executions whose action failed keep the error and
+    run again when their event is delivered again (or on run_matches).
+    Returns the number of actions run.
+    """
+    by_workflow = {}
+    for workflow, client, event_key, context in events:
+        by_workflow.setdefault(id(workflow), (workflow, []))[1].append((client, event_key, context))
+
+    executed = 0
+    known = {}
+    for workflow, items in by_workflow.values():
+        for offset in range(0, len(items), EXECUTE_CHUNK_SIZE):
+            chunk = items[offset:offset + EXECUTE_CHUNK_SIZE]
+            try:
+                matching = _matching_client_ids(workflow, [client for client, _, _ in chunk], known)
+            except Exception as e:
+                print(f"Error evaluating filters for workflow {workflow.name}: {e}")
+                break
+            done = set(
+                WorkflowExecution.objects.filter(
+                    workflow=workflow, client_id__in=matching, event_key__in={key for _, key, _ in chunk}, error=''
+                ).values_list('client_id', 'event_key')
+            )
+            for client, event_key, context in chunk:
+                if client.pk not in matching or (client.pk, event_key) in done:
+                    continue
+                if not _claim(workflow, client, event_key):
+                    continue
+                done.add((client.pk, event_key))
+                try:
+                    execute_workflow_action(workflow, client, context)
+                    executed += 1
+                except Exception as e:
+                    print(f"Error executing workflow {workflow.name}: {e}")
+                    WorkflowExecution.objects.filter(
+                        workflow=workflow, client=client, event_key=event_key
+                    ).update(error=str(e))
+    return executed
+
+def dispatch(workflows, client, event_key, context=None):
+    """
+    Queues the workflows for client until the current transaction commits;
+    nothing runs if it rolls back. Events raised in one transaction are run
+    together as one batch. Outside a transaction they run immediately.
+    """
+    events = [(workflow, client, event_key, context) for workflow in workflows]
+    pending = commit_batch('workflow_events', execute_events)
+    if pending is None:
+        execute_events(events)
+    else:
+        pending.extend(events)
+
+def emit(trigger, owner_id, client, event_key, context=None, accept=None):
+    """
+    Publishes an event to the owner's active workflows for trigger.
+    accept(workflow) narrows the subscribers using their trigger_config.
+    """
+    workflows = registry.subscribers(owner_id, trigger)
+    if not workflows or client is None:
+        return
+    if accept:
+        workflows = [workflow for workflow in workflows if accept(workflow)]
+    dispatch(workflows, client, event_key, context)
+
+def emit_client_created(client):
+    # Shared with retroactive runs: a workflow runs once per client
+    emit('CLIENT_CREATED', client.owner_id, client, 'client')
+
+def emit_client_updated(client, changed_fields):
+    def accept(workflow):
+        fields = workflow.trigger_config.get('fields')
+        return not fields or bool(changed_fields.intersection(fields))
+
+    emit('CLIENT_UPDATED', client.owner_id, client, f'updated:{client.updated_at.isoformat()}', accept=accept)
+
+def emit_task_status_changed(task, previous_status):
+    # Task events go to the workflows of the assignee
+    def accept(workflow):
+        config = workflow.trigger_config
+        if config.get('from_status') and config['from_status'] != previous_status:
+            return False
+        return not config.get('to_status') or config['to_status'] == task.status
+
+    # Resolving task.client costs a query, only do it for subscribed owners
+    if registry.has_subscribers(task.assigned_to_id, 'TASK_STATUS_CHANGED'):
+        event_key = f'task:{task.pk}:{task.status}:{task.updated_at.isoformat()}'
+        emit('TASK_STATUS_CHANGED', task.assigned_to_id, task.client, event_key, {'task': task}, accept=accept)
+
+def emit_task_overdue(task):
+    if registry.has_subscribers(task.assigned_to_id, 'TASK_OVERDUE'):
+        event_key = f'task:{task.pk}:overdue:{task.due_date.isoformat()}'
+        emit('TASK_OVERDUE', task.assigned_to_id, task.client, event_key, {'task': task})
+
+def emit_email_received(email):
+    if email.client_id and registry.has_subscribers(email.user_id, 'EMAIL_RECEIVED'):
+        emit('EMAIL_RECEIVED', email.user_id, email.client, f'email:{email.pk}', {'email': email})
@@ -3,8 +3,13 @@ import datetime
 from crm.models.tasks import Task
 from crm.models.emails import EmailTemplate
 from crm.google_service import GoogleService
+from crm.services.templating import render_email_template
 
-def execute_workflow_action(workflow, client):
+def execute_workflow_action(workflow, client, context=None):
+    """
+    Runs the workflow's action for client. context carries the objects of the
+    triggering event (e.g. {'task': task}) for email templates.
+    """
     config = workflow.action_config
     
     if workflow.action_type == 'CREATE_TASK':
@@ -29,14 +34,8 @@ def execute_workflow_action(workflow, client):
             
         try:
             template = EmailTemplate.objects.get(id=template_id, owner=workflow.owner)
-            
-            # Simple variable replacement
-            subject = template.subject.replace('{{client_name}}', client.name)
-            body = template.body.replace('{{client_name}}', client.name)
-            body = body.replace('{{client_email}}', client.email or '')
-            body = body.replace('{{client_phone}}', client.phone or '')
-            # Add more replacements as needed
-            
+            subject, body = render_email_template(template, client=client, owner=workflow.owner, **(context or {}))
+
             if client.email:
                 service = GoogleService(workflow.owner)
                 service.send_email(client.email, subject, body)
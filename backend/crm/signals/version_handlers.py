@@ -0,0 +1,56 @@
+from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import User
+from crm.models.clients import Client, SavedView
+from crm.models.tasks import Task
+from crm.models.notes import Note
+from crm.models.emails import Email, EmailTemplate, EmailThread
+from crm.models.user_config import UserConfig
+from crm.models.workflows import Workflow
+from crm.models.campaigns import Campaign
+from crm.models.exports import ExportJob
+from crm.versioning import bump_versions
+from crm.transactions import commit_batch
+from crm import cache
+
+# Which DataVersion scopes (and cache namespaces) a change to each model invalidates
+VERSION_SCOPES = {
+    Client: lambda instance: ['client'],
+    Task: lambda instance: ['task'],
+    Note: lambda instance: ['note'],
+    # System views are shared between users, so saved views use one global scope
+    SavedView: lambda instance: ['savedview'],
+    Email: lambda instance: [f'email:{instance.user_id}'],
+    EmailThread: lambda instance: [f'email:{instance.user_id}'],
+    EmailTemplate: lambda instance: [f'emailtemplate:{instance.owner_id}'],
+    UserConfig: lambda instance: [f'userconfig:{instance.user_id}'],
+    Workflow: lambda instance: [f'workflow:{instance.owner_id}'],
+    Campaign: lambda instance: [f'campaign:{instance.owner_id}'],
+    ExportJob: lambda instance: [f'exportjob:{instance.owner_id}'],
+    User: lambda instance: ['user'],
+}
+
+def _publish(scopes):
+    bump_versions(*sorted(scopes))
+    cache.invalidate(*scopes)
+
+def handle_versioned_change(sender, instance, **kwargs):
+    """
+    Bumps the scopes of the change once its transaction commits, once per
+    transaction however many rows it changed, so the shared DataVersion rows
+    ("client", "task") are locked for a single statement instead of until
+    the end of every writing transaction. The cache is also invalidated right
+    away, for reads later in the same transaction.
+    """
+    scopes = set(VERSION_SCOPES[sender](instance))
+    pending = commit_batch('versions', _publish, set)
+    if pending is None:
+        _publish(scopes)
+        return
+    new = scopes - pending
+    if new:
+        cache.invalidate(*new)
+        pending.update(new)
+
+for model in VERSION_SCOPES:
+    post_save.connect(handle_versioned_change, sender=model, dispatch_uid=f'crm_version_save_{model.__name__}')
+    post_delete.connect(handle_versioned_change, sender=model, dispatch_uid=f'crm_version_delete_{model.__name__}')
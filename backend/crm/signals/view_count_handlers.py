@@ -0,0 +1,55 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from crm.models.clients import Client, SavedView
+from crm.models.tasks import Task
+from crm.models.user_config import UserConfig
+from crm.services.view_counts import apply_change, changed_fields, is_tracked, mark_dependent_stale, reset_counts
+
+VIEW_TYPES = {Client: 'client', Task: 'task'}
+# Counts of these view types depend on the rows of the model
+DEPENDENT_TYPES = {Client: ('client', 'task'), Task: ('task',)}
+# Fields that decide which rows a saved view counts
+VIEW_COUNT_FIELDS = ('view_type', 'filters')
+
+@receiver(pre_save, sender=Client, dispatch_uid='crm_view_count_client_pre_save')
+@receiver(pre_save, sender=Task, dispatch_uid='crm_view_count_task_pre_save')
+def remember_previous_row(sender, instance, **kwargs):
+    # The previous row is only fetched while someone has counts for this type
+    if instance.pk is None or not any(is_tracked(view_type) for view_type in DEPENDENT_TYPES[sender]):
+        return
+    instance._view_count_previous = sender.objects.filter(pk=instance.pk).first()
+
+@receiver(post_save, sender=Client, dispatch_uid='crm_view_count_client_save')
+@receiver(post_save, sender=Task, dispatch_uid='crm_view_count_task_save')
+def update_counts_on_save(sender, instance, created, **kwargs):
+    previous = instance.__dict__.pop('_view_count_previous', None)
+    if created or previous is not None:
+        apply_change(VIEW_TYPES[sender], previous, instance)
+    # A new client has no tasks yet, a known change only affects the task
+    # views that filter on the changed fields
+    if sender is Client and not created and is_tracked('task'):
+        mark_dependent_stale('task', 'client', changed_fields(previous, instance) if previous is not None else None)
+
+@receiver(post_delete, sender=Client, dispatch_uid='crm_view_count_client_delete')
+@receiver(post_delete, sender=Task, dispatch_uid='crm_view_count_task_delete')
+def update_counts_on_delete(sender, instance, **kwargs):
+    apply_change(VIEW_TYPES[sender], instance, None)
+    if sender is Client:
+        mark_dependent_stale('task')
+
+@receiver(pre_save, sender=SavedView, dispatch_uid='crm_view_count_view_pre_save')
+def remember_view_filters(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._view_count_previous = SavedView.objects.filter(pk=instance.pk).values(*VIEW_COUNT_FIELDS).first()
+
+@receiver(post_save, sender=SavedView, dispatch_uid='crm_view_count_view_save')
+def reset_view_counts(sender, instance, created, **kwargs):
+    # Renames and reorders (position) keep the counts
+    previous = instance.__dict__.pop('_view_count_previous', None)
+    if not created and previous != {field: getattr(instance, field) for field in VIEW_COUNT_FIELDS}:
+        reset_counts(view=instance)
+
+@receiver(post_save, sender=UserConfig, dispatch_uid='crm_view_count_userconfig_save')
+def reset_user_counts(sender, instance, **kwargs):
+    # Visibility flags change which rows the user's counts include
+    reset_counts(user_id=instance.user_id)
@@ -1,48 +1,60 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
 from crm.models.clients import Client
 from crm.models.tasks import Task
 from crm.models.workflows import Workflow
-from crm.models.emails import EmailTemplate
-from django.utils import timezone
-import datetime
-from crm.google_service import GoogleService
+from crm.services.scheduler import emit_overdue_if_scanned
+from crm.services.workflow_events import (
+    registry, emit_client_created, emit_client_updated, emit_task_status_changed,
+)
 
-from crm.utils import build_q_object
-from crm.services.workflow_service import execute_workflow_action
+# Fields whose changes can trigger CLIENT_UPDATED workflows
+CLIENT_TRACKED_FIELDS = ('name', 'email', 'phone', 'address', 'owner_id')
 
-@receiver(post_save, sender=Client)
-def handle_client_created(sender, instance, created, **kwargs):
-    if not created:
+@receiver(pre_save, sender=Client)
+def remember_client_values(sender, instance, **kwargs):
+    # The previous row is only fetched when someone subscribed to updates
+    if instance.pk is None or not registry.has_subscribers(instance.owner_id, 'CLIENT_UPDATED'):
         return
+    instance._previous_values = Client.objects.filter(pk=instance.pk).values(*CLIENT_TRACKED_FIELDS).first()
 
-    # Find active workflows for this trigger
-    workflows = Workflow.objects.filter(
-        owner=instance.owner, 
-        trigger_type='CLIENT_CREATED', 
-        is_active=True
-    )
+@receiver(post_save, sender=Client)
+def handle_client_saved(sender, instance, created, **kwargs):
+    if created:
+        emit_client_created(instance)
+        return
 
-    for workflow in workflows:
-        # Check filters if they exist
-        if workflow.filters:
-            try:
-                # We need to check if this specific instance matches the filters.
-                # Since build_q_object returns a Q object designed for filtering a QuerySet,
-                # we can use it to filter a QuerySet containing only this instance.
-                q_obj = build_q_object(workflow.filters, workflow.owner)
-                matches = Client.objects.filter(pk=instance.pk).filter(q_obj).exists()
-                if not matches:
-                    continue
-            except Exception as e:
-                print(f"Error evaluating filters for workflow {workflow.name}: {e}")
-                continue
+    previous = instance.__dict__.pop('_previous_values', None)
+    if not previous:
+        return
+    changed_fields = {
+        field.removesuffix('_id') for field in CLIENT_TRACKED_FIELDS
+        if getattr(instance, field) != previous[field]
+    }
+    if changed_fields:
+        emit_client_updated(instance, changed_fields)
 
-        try:
-            execute_workflow_action(workflow, instance)
-        except Exception as e:
-            print(f"Error executing workflow {workflow.name}: {e}")
+@receiver(pre_save, sender=Task)
+def remember_task_values(sender, instance, **kwargs):
+    if instance.pk is None or not (
+        registry.has_subscribers(instance.assigned_to_id, 'TASK_STATUS_CHANGED')
+        or registry.has_subscribers(instance.assigned_to_id, 'TASK_OVERDUE')
+    ):
+        return
+    instance._previous_values = Task.objects.filter(pk=instance.pk).values('status', 'due_date').first()
 
+@receiver(post_save, sender=Task)
+def handle_task_saved(sender, instance, created, **kwargs):
+    previous = instance.__dict__.pop('_previous_values', None)
+    if previous and previous['status'] != instance.status:
+        emit_task_status_changed(instance, previous['status'])
+    if created or previous and (previous['due_date'] != instance.due_date or previous['status'] == 'done'):
+        emit_overdue_if_scanned(instance)
 
+@receiver(post_save, sender=Workflow, dispatch_uid='crm_workflow_registry_save')
+@receiver(post_delete, sender=Workflow, dispatch_uid='crm_workflow_registry_delete')
+def refresh_workflow_registry(sender, **kwargs):
+    registry.invalidate()
+    # Reload again once the change is visible to other connections
+    transaction.on_commit(registry.invalidate)
@@ -0,0 +1,141 @@
+"""
+Query-count regression checks for the API, used by crm/tests.py and
+accounts/tests.py.
+
+discover_routes() lists every endpoint of a urls module: one Route per
+router-registered ViewSet, with the actions it supports, and one per named
+path. QueryCountMixin runs an action against N and then 10N rows and fails
+when the number of queries grows with the data (or exceeds a budget),
+showing which statements changed.
+"""
+import difflib
+import re
+from collections import Counter
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+
+# Actions exercised on router ViewSets, extra GET actions are added per ViewSet
+STANDARD_ACTIONS = {
+    'list': ('list', 'get', False),
+    'retrieve': ('retrieve', 'get', True),
+    'create': ('create', 'post', False),
+    'update': ('partial_update', 'patch', True),
+}
+
+class Route:
+    """
+    A router ViewSet (viewset is set) or a named path (view is set). actions
+    maps an action name to (HTTP method, detail, url_path).
+    """
+    def __init__(self, name, url, viewset=None, view=None):
+        self.name = name
+        self.url = url
+        self.viewset = viewset
+        self.view = view
+        self.actions = {}
+        if viewset is None:
+            return
+        for action, (method_name, method, detail) in STANDARD_ACTIONS.items():
+            if hasattr(viewset, method_name):
+                self.actions[action] = (method, detail, '')
+        for extra in viewset.get_extra_actions():
+            if 'get' in extra.mapping:
+                self.actions[extra.url_path] = ('get', extra.detail, extra.url_path)
+
+    def action_url(self, action, pk=None):
+        _, detail, url_path = self.actions[action]
+        url = f"{self.url}{pk}/" if detail else self.url
+        return f"{url}{url_path}/" if url_path else url
+
+    def __repr__(self):
+        return f"<Route {self.name} {self.url}>"
+
+def discover_routes(urls_module, prefix):
+    """
+    {key: Route} of every endpoint in urls_module (which must expose its
+    DefaultRouter as `router`), mounted under prefix (e.g. "/api/crm/").
+    ViewSets are keyed by basename, named paths by their pattern ("config/").
+    """
+    routes = {}
+    for url_prefix, viewset, basename in urls_module.router.registry:
+        routes[basename] = Route(basename, f"{prefix}{url_prefix}/", viewset=viewset)
+    for pattern in urls_module.urlpatterns:
+        if isinstance(pattern, URLPattern) and pattern.name:
+            routes[str(pattern.pattern)] = Route(pattern.name, f"{prefix}{pattern.pattern}", view=pattern.callback)
+    return routes
+
+_LITERALS = [
+    # Long column lists hide what the query is about
+    (re.compile(r'SELECT ("[^"]+"\."[^"]+")(?:, "[^"]+"\."[^"]+")+ FROM'), r'SELECT \1, ... FROM'),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(\.\d+)?\b'), '?'),
+    (re.compile(r'\bIN \((?:\?|%s)(?:, (?:\?|%s))*\)'), 'IN (...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+def normalize_sql(sql):
+    # Queries that only differ in their parameters compare equal
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+def _collapse(statements):
+    # Runs of the same statement, the usual shape of an N+1, become one line
+    lines = []
+    for statement in statements:
+        if lines and lines[-1][1] == statement:
+            lines[-1][0] += 1
+        else:
+            lines.append([1, statement])
+    return [f"{f'[x{count}] ' if count > 1 else ''}{statement}" for count, statement in lines]
+
+def sql_diff(small, large, small_label='N rows', large_label='10N rows'):
+    """
+    Readable comparison of two captured query lists: the statements whose
+    count changed, then a unified diff of both sequences.
+    """
+    small = [normalize_sql(query['sql']) for query in small]
+    large = [normalize_sql(query['sql']) for query in large]
+    before, after = Counter(small), Counter(large)
+    lines = [f"{len(small)} queries with {small_label}, {len(large)} with {large_label}:"]
+    for statement in sorted(set(before) | set(after), key=lambda s: before[s] - after[s]):
+        if before[statement] != after[statement]:
+            lines.append(f"  {before[statement]:>4} -> {after[statement]:<4} {statement}")
+    lines.extend(difflib.unified_diff(
+        _collapse(small), _collapse(large), small_label, large_label, lineterm='', n=1
+    ))
+    return '\n'.join(lines)
+
+class QueryCountMixin:
+    """
+    TestCase mixin. assertConstantQueries(populate, request) grows the data
+    with populate(n) and fails when request() runs more queries at 10N rows
+    than at N. Each measured request follows an unmeasured one, so caches
+    filled by the first request do not count as growth.
+    """
+    query_rows = 2
+
+    def capture_queries(self, request):
+        with CaptureQueriesContext(connection) as captured:
+            response = request()
+        return response, captured.captured_queries
+
+    def assertConstantQueries(self, populate, request, label='', budget=None):
+        counts = (self.query_rows, self.query_rows * 10)
+        captured = []
+        for rows in counts:
+            populate(rows)
+            response = request()
+            self.assertLess(response.status_code, 400, f"{label}: HTTP {response.status_code} {response.content[:300]!r}")
+            response, queries = self.capture_queries(request)
+            self.assertLess(response.status_code, 400, f"{label}: HTTP {response.status_code} {response.content[:300]!r}")
+            captured.append(queries)
+
+        small, large = captured
+        if len(large) > len(small):
+            self.fail(f"{label}: query count grows with the data\n" + sql_diff(small, large, f"{counts[0]} rows", f"{counts[1]} rows"))
+        if budget is not None and len(large) > budget:
+            statements = _collapse(normalize_sql(query['sql']) for query in large)
+            self.fail(f"{label}: {len(large)} queries, budget is {budget}\n" + '\n'.join(f"  {line}" for line in statements))
+        return len(large)
@@ -0,0 +1,46 @@
+from django.db import transaction
+
+class _CommitBatch:
+    """
+    The on_commit hook of one batch: hands the collected items to publish
+    once, then drops the batch so later changes start a new one.
+    """
+    def __init__(self, batches, key, publish, items):
+        self.batches = batches
+        self.key = key
+        self.publish = publish
+        self.items = items
+        self.ran = False
+
+    def __call__(self):
+        self.ran = True
+        if self.batches.get(self.key) is self:
+            del self.batches[self.key]
+        self.publish(self.items)
+
+def commit_batch(name, publish, factory=list):
+    """
+    Returns the items collected under name in the current transaction (one
+    collection per savepoint), created with factory() on first use together
+    with a single on_commit hook that calls publish(items). Items added to
+    a savepoint that rolls back are dropped with it. Returns None outside a
+    transaction, where the caller should publish right away.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return None
+
+    # Django offers no rollback hook, so a batch is only reused while its
+    # hook is still queued and has not run. The batches live on the
+    # connection wrapper, which belongs to one thread.
+    batches = connection.__dict__.setdefault('crm_commit_batches', {})
+    key = (name, tuple(connection.savepoint_ids))
+    batch = batches.get(key)
+    queued = {id(hook) for _, hook, _ in connection.run_on_commit}
+    if batch is None or batch.ran or id(batch) not in queued:
+        # Forget batches left behind by rolled back transactions
+        for stale in [other for other, pending in batches.items() if id(pending) not in queued]:
+            del batches[stale]
+        batch = batches[key] = _CommitBatch(batches, key, publish, factory())
+        transaction.on_commit(batch, robust=True)
+    return batch.items
@@ -0,0 +1,23 @@
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+class RequestSizeLimitHandler(FileUploadHandler):
+    """
+    Stops multipart parsing as soon as the uploaded file data exceeds max_size,
+    for requests whose Content-Length could not be trusted up front. Must run
+    before the memory/temporary file handlers; check `exceeded` afterwards.
+    """
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.received = 0
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ClientViewSet, SavedViewViewSet, TaskViewSet, NoteViewSet, GoogleAuthView, GoogleCallbackView, EmailViewSet, EmailTemplateViewSet, UserConfigView, WorkflowViewSet
+from .views import ClientViewSet, SavedViewViewSet, TaskViewSet, NoteViewSet, GoogleAuthView, EmailViewSet, EmailThreadViewSet, EmailTemplateViewSet, UserConfigView, WorkflowViewSet, CampaignViewSet, ExportJobViewSet
+from .views import sync_emails, send_email, google_auth_url, google_callback, metrics, profiles, profile_download
 
 router = DefaultRouter()
 router.register(r'clients', ClientViewSet, basename='client')
@@ -8,12 +9,22 @@ router.register(r'tasks', TaskViewSet, basename='task')
 router.register(r'notes', NoteViewSet, basename='note')
 router.register(r'saved-views', SavedViewViewSet, basename='saved-view')
 router.register(r'google/auth', GoogleAuthView, basename='google-auth')
-router.register(r'google/callback', GoogleCallbackView, basename='google-callback')
 router.register(r'emails', EmailViewSet, basename='email')
+router.register(r'email-threads', EmailThreadViewSet, basename='email-thread')
 router.register(r'email-templates', EmailTemplateViewSet, basename='email-template')
 router.register(r'workflows', WorkflowViewSet, basename='workflow')
+router.register(r'campaigns', CampaignViewSet, basename='campaign')
+router.register(r'export-jobs', ExportJobViewSet, basename='export-job')
 
 urlpatterns = [
     path('config/', UserConfigView.as_view(), name='user-config'),
+    path('metrics/', metrics, name='metrics'),
+    path('profiles/', profiles, name='profiles'),
+    path('profiles/<str:profile_id>/<str:file_format>/', profile_download, name='profile-download'),
+    # Async views for Gmail-bound endpoints, declared before the router routes
+    path('emails/sync/', sync_emails, name='email-sync'),
+    path('emails/send/', send_email, name='email-send'),
+    path('google/auth/', google_auth_url, name='google-auth'),
+    path('google/callback/', google_callback, name='google-callback'),
     path('', include(router.urls)),
 ]
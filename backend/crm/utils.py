@@ -1,10 +1,18 @@
 from django.db.models import Q
+from crm.filter_optimizer import optimize_filters
 
-def build_q_object(filters, user=None):
+def build_q_object(filters, user=None, model=None):
     """
-    Recursively builds a Q object from a nested filter structure.
+    Builds a Q object from a nested filter structure, normalized first by
+    optimize_filters (model enables its value-aware rules).
     Structure: { 'logic': 'AND'|'OR', 'conditions': [ {field, operator, value} | {logic, conditions} ] }
     """
+    return compile_q_object(optimize_filters(filters, model), user)
+
+def compile_q_object(filters, user=None):
+    """
+    Recursively builds a Q object from a nested filter structure, as is.
+    """
     if not filters or not isinstance(filters, dict):
         return Q()
 
@@ -16,7 +24,7 @@ def build_q_object(filters, user=None):
     for cond in conditions:
         if 'logic' in cond:
             # Nested group
-            sub_q = build_q_object(cond, user)
+            sub_q = compile_q_object(cond, user)
             if logic == 'OR':
                 q_obj |= sub_q
             else:
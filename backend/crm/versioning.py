@@ -0,0 +1,32 @@
+from django.db.models import F
+from django.utils import timezone
+from crm.models.versions import DataVersion
+
+def bump_versions(*scopes):
+    """
+    Increments the change counter of every given scope, creating it on first use.
+    Bulk operations that bypass model signals (queryset.update, bulk_create)
+    must call this explicitly.
+    """
+    now = timezone.now()
+    for scope in scopes:
+        updated = DataVersion.objects.filter(scope=scope).update(version=F('version') + 1, updated_at=now)
+        if not updated:
+            _, created = DataVersion.objects.get_or_create(
+                scope=scope,
+                defaults={'version': 1, 'updated_at': now}
+            )
+            if not created:
+                # Someone else created the row in between, bump it again
+                DataVersion.objects.filter(scope=scope).update(version=F('version') + 1, updated_at=now)
+
+def get_versions(scopes):
+    """
+    Returns {scope: (version, updated_at)} for the given scopes in a single query.
+    Scopes that were never bumped are reported as (0, None).
+    """
+    versions = {scope: (0, None) for scope in scopes}
+    rows = DataVersion.objects.filter(scope__in=list(scopes)).values_list('scope', 'version', 'updated_at')
+    for scope, version, updated_at in rows:
+        versions[scope] = (version, updated_at)
+    return versions
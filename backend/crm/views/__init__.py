@@ -1,7 +1,11 @@
 from .clients import ClientViewSet, SavedViewViewSet
 from .tasks import TaskViewSet
 from .notes import NoteViewSet
-from .emails import EmailViewSet, EmailTemplateViewSet
-from .google_auth import GoogleAuthView, GoogleCallbackView
+from .emails import EmailViewSet, EmailThreadViewSet, EmailTemplateViewSet, sync_emails, send_email
+from .google_auth import GoogleAuthView, google_auth_url, google_callback
 from .user_config import UserConfigView
 from .workflows import WorkflowViewSet
+from .campaigns import CampaignViewSet
+from .exports import ExportJobViewSet
+from .metrics import metrics
+from .profiles import profiles, profile_download
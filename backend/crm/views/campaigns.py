@@ -0,0 +1,46 @@
+from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from crm.models.campaigns import Campaign
+from crm.serializers.campaigns import CampaignSerializer
+from crm.mixins import ConditionalGetMixin
+from crm.services.campaign_service import campaign_recipients
+
+class CampaignViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    """
+    Bulk templated email campaigns. Starting a campaign only queues it;
+    `python manage.py run_campaigns` does the sending.
+    """
+    serializer_class = CampaignSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    version_scopes = ('campaign:{user}',)
+
+    def get_queryset(self):
+        return Campaign.objects.filter(owner=self.request.user).select_related('template').order_by('-created_at')
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    @action(detail=True, methods=['post'])
+    def start(self, request, pk=None):
+        campaign = self.get_object()
+        if campaign.status not in ('draft', 'paused', 'failed'):
+            return Response({'error': f'Campaign is {campaign.status}'}, status=400)
+        campaign.status = 'queued'
+        campaign.save(update_fields=['status', 'updated_at'])
+        return Response(self.get_serializer(campaign).data)
+
+    @action(detail=True, methods=['post'])
+    def pause(self, request, pk=None):
+        campaign = self.get_object()
+        if campaign.status not in ('queued', 'running'):
+            return Response({'error': f'Campaign is {campaign.status}'}, status=400)
+        # The runner checks the status between batches
+        campaign.status = 'paused'
+        campaign.save(update_fields=['status', 'updated_at'])
+        return Response(self.get_serializer(campaign).data)
+
+    @action(detail=True, methods=['get'])
+    def preview(self, request, pk=None):
+        campaign = self.get_object()
+        return Response({'count': campaign_recipients(campaign).count()})
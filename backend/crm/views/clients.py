@@ -4,17 +4,26 @@ from rest_framework.decorators import action
 from django.db.models import Q
 from django.http import HttpResponse
 import json
-import pandas as pd
 import io
 from crm.models.clients import Client, SavedView
-from crm.serializers.clients import ClientSerializer, SavedViewSerializer
+from crm.serializers.clients import ClientSerializer, SavedViewSerializer, SavedViewCountSerializer
 from crm.pagination import StandardResultsSetPagination
 from crm.utils import build_q_object
+from crm.mixins import ConditionalGetMixin
+from crm.services.lookups import get_saved_view, get_visibility
+from crm.views.exports import queue_export
+from crm.services.query_explain import explain_queryset
+from crm.services.view_counts import get_counts
+from crm.lazy import lazy_import
 
-class ClientViewSet(viewsets.ModelViewSet):
+# Only the in-request exports use pandas
+pd = lazy_import('pandas')
+
+class ClientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     pagination_class = StandardResultsSetPagination
+    version_scopes = ('client', 'savedview', 'userconfig:{user}')
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
@@ -25,27 +34,24 @@ class ClientViewSet(viewsets.ModelViewSet):
 
         # Apply visibility permissions for non-admins
         if not user.is_superuser and not user.is_staff:
-            config = getattr(user, 'config', None)
-            if config and not config.see_all_clients:
+            visibility = get_visibility(user)
+            if visibility and not visibility['see_all_clients']:
                 queryset = queryset.filter(owner=user)
         
         # 1. Handle Saved View ID
         view_id = self.request.query_params.get('view_id', None)
-        if view_id:
-            try:
-                saved_view = SavedView.objects.get(id=view_id)
-                # Apply filters from saved view
-                q_obj = build_q_object(saved_view.filters, self.request.user)
-                queryset = queryset.filter(q_obj)
-            except SavedView.DoesNotExist:
-                pass
+        saved_view = get_saved_view(view_id) if view_id else None
+        if saved_view:
+            # Apply filters from saved view
+            q_obj = build_q_object(saved_view['filters'], self.request.user, Client)
+            queryset = queryset.filter(q_obj)
         
         # 2. Handle direct filters (JSON string)
         filters_json = self.request.query_params.get('filters', None)
         if filters_json:
             try:
                 filters = json.loads(filters_json)
-                q_obj = build_q_object(filters, self.request.user)
+                q_obj = build_q_object(filters, self.request.user, Client)
                 queryset = queryset.filter(q_obj)
             except (json.JSONDecodeError, TypeError):
                 pass
@@ -68,14 +74,9 @@ class ClientViewSet(viewsets.ModelViewSet):
         sort_direction = 'asc'
 
         # Try to get sorting from saved view first
-        if view_id:
-            try:
-                saved_view = SavedView.objects.get(id=view_id)
-                if saved_view.sorting:
-                    sort_field = saved_view.sorting.get('field', 'name')
-                    sort_direction = saved_view.sorting.get('direction', 'asc')
-            except SavedView.DoesNotExist:
-                pass
+        if saved_view and saved_view['sorting']:
+            sort_field = saved_view['sorting'].get('field', 'name')
+            sort_direction = saved_view['sorting'].get('direction', 'asc')
 
         # Override with direct sorting if provided
         sort_json = self.request.query_params.get('sort', None)
@@ -92,8 +93,20 @@ class ClientViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-    @action(detail=False, methods=['GET'], url_path='export-view')
+    @action(detail=False, methods=['GET'])
+    def explain(self, request):
+        # Same query params as the list (view_id, filters, search, sort)
+        analyze = request.query_params.get('analyze', '').lower() == 'true'
+        try:
+            return Response(explain_queryset(self.get_queryset(), analyze=analyze))
+        except Exception as e:
+            return Response({'error': str(e)}, status=400)
+
+    @action(detail=False, methods=['GET', 'POST'], url_path='export-view')
     def export(self, request):
+        # POST queues a background export, GET renders small ones in the request
+        if request.method == 'POST':
+            return queue_export(request, 'client')
         try:
             queryset = self.get_queryset()
             file_format = request.query_params.get('file_format', 'csv')
@@ -134,8 +147,9 @@ class ClientViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class SavedViewViewSet(viewsets.ModelViewSet):
+class SavedViewViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = SavedViewSerializer
+    version_scopes = ('savedview',)
 
     def get_queryset(self):
         # Return user's views + system views, ordered by position
@@ -147,6 +161,14 @@ class SavedViewViewSet(viewsets.ModelViewSet):
             
         return queryset.order_by('position', 'id')
 
+    @action(detail=False, methods=['get'])
+    def counts(self, request):
+        """
+        Row count of every view for the sidebar, from the stored counts.
+        """
+        counts = get_counts(request.user, request.query_params.get('view_type'))
+        return Response(SavedViewCountSerializer(counts, many=True).data)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -1,85 +1,153 @@
-from rest_framework import viewsets, parsers
-from rest_framework.response import Response
+import json
+from asgiref.sync import sync_to_async
+from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.response import Response
+from django.http import JsonResponse
 from django.utils import timezone
-from crm.models.emails import Email, EmailTemplate
+from django.views.decorators.http import require_POST
+from crm.models.emails import Email, EmailTemplate, EmailThread
 from crm.models.clients import Client
-from crm.serializers.emails import EmailSerializer, EmailTemplateSerializer
+from crm.serializers.emails import EmailListSerializer, EmailSerializer, EmailTemplateSerializer, EmailThreadSerializer
 from crm.google_service import GoogleService
+from crm.mixins import ConditionalGetMixin
+from crm.pagination import ActivityCursorPagination
+from crm.decorators import async_login_required, max_request_size
+from crm.models.user_config import UserConfig
+from crm.services.email_content import body_fields, split_body
+from crm.services.email_threads import save_email
+from crm.services.google_executor import run_google
 
-class EmailViewSet(viewsets.ReadOnlyModelViewSet):
+class EmailViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Email.objects.all()
     serializer_class = EmailSerializer
-    parser_classes = (parsers.MultiPartParser, parsers.FormParser, parsers.JSONParser)
+    version_scopes = ('email:{user}',)
+
+    def get_serializer_class(self):
+        # Lists show the snippet, bodies are only loaded for one email
+        return EmailListSerializer if self.action == 'list' else EmailSerializer
 
     def get_queryset(self):
         queryset = Email.objects.filter(user=self.request.user)
+        if self.action != 'list':
+            queryset = queryset.select_related('html_content', 'text_content')
         client_id = self.request.query_params.get('client_id', None)
         if client_id:
             queryset = queryset.filter(client_id=client_id)
         return queryset.order_by('-timestamp')
 
-    @action(detail=False, methods=['post'])
-    def sync(self, request):
-        service = GoogleService(request.user)
-        emails = service.fetch_emails()
-        return Response({"status": "synced", "count": len(emails)})
-
-    @action(detail=False, methods=['post'])
-    def send(self, request):
-        to_email = request.data.get('to_email')
-        subject = request.data.get('subject')
-        body = request.data.get('body')
-        thread_id = request.data.get('thread_id')
-        in_reply_to = request.data.get('in_reply_to')
-        client_id = request.data.get('client_id')
-        include_signature = request.data.get('include_signature', False)
-        attachments = request.FILES.getlist('attachments')
-
-        if not all([to_email, subject, body]):
-            return Response({"error": "Required fields missing"}, status=400)
-
-        final_body = body
-        if include_signature:
-            from crm.models.user_config import UserConfig
-            config = UserConfig.objects.filter(user=request.user).first()
-            if config and config.email_signature:
-                # Add a couple of line breaks and the signature
-                final_body = f"{body}<br><br>{config.email_signature}"
-
-        service = GoogleService(request.user)
-        sent_message = service.send_email(
-            to_email, 
-            subject, 
-            final_body, 
-            attachments=attachments,
-            thread_id=thread_id,
-            in_reply_to=in_reply_to
-        )
+class EmailThreadViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    The mailbox as threads, most recent activity first (cursor pages).
+    """
+    serializer_class = EmailThreadSerializer
+    pagination_class = ActivityCursorPagination
+    version_scopes = ('email:{user}',)
 
-        if sent_message:
-            # Create Email record in DB
-            client = Client.objects.filter(id=client_id).first() if client_id else None
-            email_obj = Email.objects.create(
-                message_id=sent_message['id'],
-                thread_id=sent_message['threadId'],
-                subject=subject,
-                body=body,
-                from_email="me", # Gmail API specific, can be refined
-                to_email=to_email,
-                timestamp=timezone.now(),
-                client=client,
-                user=request.user
-            )
-            return Response(EmailSerializer(email_obj).data)
-        else:
-            return Response({"error": "Failed to send email"}, status=500)
+    def get_queryset(self):
+        queryset = EmailThread.objects.filter(user=self.request.user)
+        client_id = self.request.query_params.get('client_id', None)
+        if client_id:
+            queryset = queryset.filter(client_id=client_id)
+        return queryset
+
+    @action(detail=True, methods=['GET'])
+    def emails(self, request, pk=None):
+        # Messages of the thread, oldest first, as in the email list
+        emails = self.get_object().emails.order_by('timestamp', 'id')
+        return Response(EmailListSerializer(emails, many=True).data)
 
-class EmailTemplateViewSet(viewsets.ModelViewSet):
+class EmailTemplateViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = EmailTemplateSerializer
+    version_scopes = ('emailtemplate:{user}',)
 
     def get_queryset(self):
         return EmailTemplate.objects.filter(owner=self.request.user).order_by('-updated_at')
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
+
+# Gmail-bound endpoints are plain async views: the Google round-trip runs on
+# the bounded executor in crm.services.google_executor, so a slow Gmail API
+# does not hold a request worker while it waits.
+
+@require_POST
+@async_login_required
+async def sync_emails(request):
+    user = request.user
+    try:
+        emails = await run_google(lambda: GoogleService(user).fetch_emails())
+    except Exception as e:
+        # Revoked tokens (RefreshError) and Gmail API errors
+        print(f"Error syncing emails: {e}")
+        return JsonResponse({"error": f"Failed to sync emails: {e}"}, status=502)
+    return JsonResponse({"status": "synced", "count": len(emails)})
+
+@max_request_size('EMAIL_MAX_REQUEST_SIZE')
+@require_POST
+@async_login_required
+async def send_email(request):
+    # Oversized requests were rejected by RequestSizeLimitMiddleware
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+    else:
+        data = request.POST
+    user = request.user
+
+    to_email = data.get('to_email')
+    subject = data.get('subject')
+    body = data.get('body')
+    thread_id = data.get('thread_id')
+    in_reply_to = data.get('in_reply_to')
+    client_id = data.get('client_id')
+    # Multipart forms send booleans as "true"/"false"
+    include_signature = str(data.get('include_signature', False)).lower() == 'true'
+    attachments = request.FILES.getlist('attachments')
+
+    if not all([to_email, subject, body]):
+        return JsonResponse({"error": "Required fields missing"}, status=400)
+
+    final_body = body
+    if include_signature:
+        config = await UserConfig.objects.filter(user=user).afirst()
+        if config and config.email_signature:
+            # Add a couple of line breaks and the signature
+            final_body = f"{body}<br><br>{config.email_signature}"
+
+    try:
+        sent_message = await run_google(
+            lambda: GoogleService(user).send_email(
+                to_email,
+                subject,
+                final_body,
+                attachments=attachments,
+                thread_id=thread_id,
+                in_reply_to=in_reply_to
+            )
+        )
+    except Exception as e:
+        print(f"Error sending email: {e}")
+        return JsonResponse({"error": f"Failed to send email: {e}"}, status=502)
+
+    if sent_message:
+        # Create Email record in DB
+        client = await Client.objects.filter(id=client_id).afirst() if client_id else None
+        content = await sync_to_async(body_fields)(*split_body(body))
+        email_obj = await sync_to_async(save_email)(Email(
+            message_id=sent_message['id'],
+            thread_id=sent_message['threadId'],
+            subject=subject,
+            from_email="me", # Gmail API specific, can be refined
+            to_email=to_email,
+            timestamp=timezone.now(),
+            client=client,
+            user=user,
+            **content
+        ))
+        email_obj = await Email.objects.select_related('html_content', 'text_content').aget(pk=email_obj.pk)
+        return JsonResponse(EmailSerializer(email_obj).data)
+    else:
+        return JsonResponse({"error": "Failed to send email"}, status=500)
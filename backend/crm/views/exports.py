@@ -0,0 +1,96 @@
+import os
+import re
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from crm.models.exports import ExportJob
+from crm.serializers.exports import ExportJobSerializer
+from crm.mixins import ConditionalGetMixin
+from crm.services.export_service import CONTENT_TYPES, enqueue_export, export_columns, export_path, format_unavailable
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+def queue_export(request, view_type):
+    """
+    POST export-view of the client and task lists: queues an ExportJob for
+    the list query (query params, overridden by the body). 202 while the job
+    is pending, 200 when an identical export is already complete.
+    """
+    data = request.data.dict() if hasattr(request.data, 'dict') else dict(request.data)
+    params = {**request.query_params.dict(), **data}
+    file_format = params.get('file_format', 'csv')
+    if file_format not in dict(ExportJob.FORMAT_CHOICES):
+        return Response({'detail': f'Unsupported file_format {file_format}'}, status=status.HTTP_400_BAD_REQUEST)
+    if format_unavailable(file_format):
+        return Response({'detail': format_unavailable(file_format)}, status=status.HTTP_400_BAD_REQUEST)
+    job, _ = enqueue_export(request.user, view_type, file_format, params, export_columns(params.get('columns')))
+    serializer = ExportJobSerializer(job, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_200_OK if job.status == 'completed' else status.HTTP_202_ACCEPTED)
+
+def ranged_file_response(request, path, content_type, filename, etag):
+    """
+    The file, or the part asked for by a single "Range: bytes=start-end"
+    header as 206 Partial Content, so interrupted downloads can resume.
+    """
+    size = os.path.getsize(path)
+    match = RANGE.match(request.META.get('HTTP_RANGE', '').strip())
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not match or not any(match.groups()) or (if_range and if_range != etag):
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        return response
+
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        # "bytes=-500" is the last 500 bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    def stream():
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                block = f.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+
+    response = StreamingHttpResponse(stream(), status=status.HTTP_206_PARTIAL_CONTENT, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
+
+class ExportJobViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    The user's export jobs with their progress. Jobs are created by POST
+    export-view on the client and task lists and rendered by
+    `python manage.py run_exports`.
+    """
+    serializer_class = ExportJobSerializer
+    version_scopes = ('exportjob:{user}',)
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(owner=self.request.user).order_by('-created_at')
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'completed' or not os.path.exists(export_path(job)):
+            return Response({'detail': f'Export is {job.status}'}, status=status.HTTP_409_CONFLICT)
+        filename = f"{job.view_type}s_export.{job.file_format}"
+        etag = f'"{job.data_version[:16]}-{job.pk}"'
+        return ranged_file_response(request, export_path(job), CONTENT_TYPES[job.file_format], filename, etag)
@@ -1,18 +1,14 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.conf import settings
-from google_auth_oauthlib.flow import Flow
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from crm.models.tokens import GoogleToken
 from crm.google_service import GoogleService
+from crm.decorators import async_login_required
+from crm.services.google_executor import run_google
 
 class GoogleAuthView(viewsets.ViewSet):
-    def list(self, request):
-        auth_url, state = GoogleService.get_auth_url()
-        # Save state in session for verification if needed
-        request.session['google_oauth_state'] = state
-        return Response({"url": auth_url})
-
     @action(detail=False, methods=['GET'])
     def check(self, request):
         has_token = GoogleToken.objects.filter(user=request.user).exists()
@@ -23,46 +19,51 @@ class GoogleAuthView(viewsets.ViewSet):
         GoogleToken.objects.filter(user=request.user).delete()
         return Response({"status": "success"})
 
-class GoogleCallbackView(viewsets.ViewSet):
-    def list(self, request):
-        code = request.query_params.get('code')
-        if not code:
-            return Response({"error": "No code provided"}, status=400)
+@require_GET
+@async_login_required
+async def google_auth_url(request):
+    try:
+        auth_url, state = await run_google(GoogleService.get_auth_url)
+    except Exception as e:
+        return JsonResponse({"error": f"Failed to build the Google auth URL: {e}"}, status=500)
+    # Save state in session for verification if needed. The session was
+    # loaded by async_login_required, so this does not query.
+    request.session['google_oauth_state'] = state
+    return JsonResponse({"url": auth_url})
 
-        flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": settings.GOOGLE_CLIENT_ID,
-                    "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                }
-            },
-            scopes=['https://www.googleapis.com/auth/gmail.readonly', 'https://www.googleapis.com/auth/gmail.send'],
-            redirect_uri=settings.GOOGLE_REDIRECT_URI
-        )
-        flow.fetch_token(code=code)
-        creds = flow.credentials
+@require_GET
+@async_login_required
+async def google_callback(request):
+    code = request.GET.get('code')
+    if not code:
+        return JsonResponse({"error": "No code provided"}, status=400)
 
-        defaults = {
-            "access_token": creds.token,
-            "expires_at": creds.expiry
-        }
+    try:
+        creds = await run_google(GoogleService.exchange_code, code)
+    except Exception as e:
+        # Expired or reused codes, unreachable Google
+        return JsonResponse({"error": f"Failed to exchange code: {e}"}, status=400)
+    user = request.user
 
-        if creds.refresh_token:
-            defaults["refresh_token"] = creds.refresh_token
+    defaults = {
+        "access_token": creds.token,
+        "expires_at": creds.expiry
+    }
 
-        try:
-            # Try to get existing token to preserve refresh_token if missing in new creds
-            existing_token = GoogleToken.objects.filter(user=request.user).first()
-            if not creds.refresh_token and existing_token:
-                defaults["refresh_token"] = existing_token.refresh_token
-            
-            GoogleToken.objects.update_or_create(
-                user=request.user,
-                defaults=defaults
-            )
-        except Exception as e:
-            return Response({"error": f"Failed to save tokens: {str(e)}"}, status=500)
+    if creds.refresh_token:
+        defaults["refresh_token"] = creds.refresh_token
 
-        return Response({"status": "success"})
+    try:
+        # Try to get existing token to preserve refresh_token if missing in new creds
+        existing_token = await GoogleToken.objects.filter(user=user).afirst()
+        if not creds.refresh_token and existing_token:
+            defaults["refresh_token"] = existing_token.refresh_token
+
+        await GoogleToken.objects.aupdate_or_create(
+            user=user,
+            defaults=defaults
+        )
+    except Exception as e:
+        return JsonResponse({"error": f"Failed to save tokens: {str(e)}"}, status=500)
+
+    return JsonResponse({"status": "success"})
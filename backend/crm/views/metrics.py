@@ -0,0 +1,13 @@
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from crm.metrics import render_prometheus
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics(request):
+    """
+    Request metrics of every worker (see crm.metrics) in the Prometheus
+    text format.
+    """
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
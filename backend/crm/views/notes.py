@@ -1,13 +1,15 @@
 from rest_framework import viewsets
 from crm.models.notes import Note
 from crm.serializers.notes import NoteSerializer
+from crm.mixins import ConditionalGetMixin
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Note.objects.all()
     serializer_class = NoteSerializer
+    version_scopes = ('note', 'user')
 
     def get_queryset(self):
-        queryset = Note.objects.all()
+        queryset = Note.objects.select_related('author')
         client_id = self.request.query_params.get('client_id', None)
         if client_id:
             queryset = queryset.filter(client_id=client_id)
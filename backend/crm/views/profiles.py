@@ -0,0 +1,27 @@
+from django.http import FileResponse, Http404
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from crm import profiling
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def profiles(request):
+    """
+    Stored request profiles, newest first.
+    """
+    return Response(profiling.list_profiles())
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def profile_download(request, profile_id, file_format):
+    """
+    A stored profile as a pstats file (python -m pstats, snakeviz) or a
+    speedscope file (https://www.speedscope.app).
+    """
+    path = profiling.profile_file(profile_id, file_format)
+    if path is None:
+        raise Http404
+    filename = f"{profile_id}.prof" if file_format == 'pstats' else f"{profile_id}.speedscope.json"
+    content_type = 'application/octet-stream' if file_format == 'pstats' else 'application/json'
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
@@ -5,45 +5,50 @@ from django.utils import timezone
 from django.db.models import Q
 from django.http import HttpResponse
 import json
-import pandas as pd
 import io
 from crm.models.tasks import Task
-from crm.models.clients import SavedView
 from crm.serializers.tasks import TaskSerializer
 from crm.pagination import StandardResultsSetPagination
 from crm.utils import build_q_object
+from crm.mixins import ConditionalGetMixin
+from crm.services.lookups import get_saved_view, get_visibility
+from crm.views.exports import queue_export
+from crm.lazy import lazy_import
 
-class TaskViewSet(viewsets.ModelViewSet):
+# Only the in-request exports use pandas
+pd = lazy_import('pandas')
+
+class TaskViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     pagination_class = StandardResultsSetPagination
+    # client_name and assigned_to_name are denormalized into the payload
+    version_scopes = ('task', 'client', 'user', 'savedview', 'userconfig:{user}')
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Task.objects.all()
+        # client_name and assigned_to_name are read from the joined rows
+        queryset = Task.objects.select_related('client', 'assigned_to')
 
         # Apply visibility permissions for non-admins
         if not user.is_superuser and not user.is_staff:
-            config = getattr(user, 'config', None)
-            if config and not config.see_all_tasks:
+            visibility = get_visibility(user)
+            if visibility and not visibility['see_all_tasks']:
                 queryset = queryset.filter(assigned_to=user)
 
         # 1. Handle Saved View ID
         view_id = self.request.query_params.get('view_id', None)
-        if view_id:
-            try:
-                saved_view = SavedView.objects.get(id=view_id)
-                q_obj = build_q_object(saved_view.filters, self.request.user)
-                queryset = queryset.filter(q_obj)
-            except SavedView.DoesNotExist:
-                pass
+        saved_view = get_saved_view(view_id) if view_id else None
+        if saved_view:
+            q_obj = build_q_object(saved_view['filters'], self.request.user, Task)
+            queryset = queryset.filter(q_obj)
         
         # 2. Handle direct filters
         filters_json = self.request.query_params.get('filters', None)
         if filters_json:
             try:
                 filters = json.loads(filters_json)
-                q_obj = build_q_object(filters, self.request.user)
+                q_obj = build_q_object(filters, self.request.user, Task)
                 queryset = queryset.filter(q_obj)
             except (json.JSONDecodeError, TypeError):
                 pass
@@ -62,14 +67,9 @@ class TaskViewSet(viewsets.ModelViewSet):
         sort_field = 'created_at'
         sort_direction = 'desc'
 
-        if view_id:
-            try:
-                saved_view = SavedView.objects.get(id=view_id)
-                if saved_view.sorting:
-                    sort_field = saved_view.sorting.get('field', sort_field)
-                    sort_direction = saved_view.sorting.get('direction', sort_direction)
-            except SavedView.DoesNotExist:
-                pass
+        if saved_view and saved_view['sorting']:
+            sort_field = saved_view['sorting'].get('field', sort_field)
+            sort_direction = saved_view['sorting'].get('direction', sort_direction)
 
         sort_json = self.request.query_params.get('sort', None)
         if sort_json:
@@ -92,8 +92,11 @@ class TaskViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-    @action(detail=False, methods=['GET'], url_path='export-view')
+    @action(detail=False, methods=['GET', 'POST'], url_path='export-view')
     def export(self, request):
+        # POST queues a background export, GET renders small ones in the request
+        if request.method == 'POST':
+            return queue_export(request, 'task')
         try:
             queryset = self.get_queryset()
             file_format = request.query_params.get('file_format', 'csv')
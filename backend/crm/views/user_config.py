@@ -1,10 +1,12 @@
 from rest_framework import generics, permissions
 from ..models.user_config import UserConfig
 from ..serializers.user_config import UserConfigSerializer
+from ..mixins import ConditionalGetMixin
 
-class UserConfigView(generics.RetrieveUpdateAPIView):
+class UserConfigView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserConfigSerializer
     permission_classes = [permissions.IsAuthenticated]
+    version_scopes = ('userconfig:{user}',)
 
     def get_object(self):
         config, created = UserConfig.objects.get_or_create(user=self.request.user)
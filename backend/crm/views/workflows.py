@@ -1,14 +1,26 @@
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from crm.models.workflows import Workflow
+import hashlib
+import json
+from django.utils import timezone
+from crm.models.workflows import Workflow, WorkflowExecution
 from crm.models.clients import Client
 from crm.serializers.workflows import WorkflowSerializer
 from crm.utils import build_q_object
+from crm.mixins import ConditionalGetMixin
+from crm.services.query_explain import explain_queryset
+from crm.services.view_counts import is_relative
+from crm import cache
 
-class WorkflowViewSet(viewsets.ModelViewSet):
+def matching_clients(filters, user):
+    # Match behavior of main Client list: check ALL clients, not just owned ones
+    return Client.objects.filter(build_q_object(filters, user, Client))
+
+class WorkflowViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = WorkflowSerializer
     permission_classes = [permissions.IsAuthenticated]
+    version_scopes = ('workflow:{user}',)
 
     def get_queryset(self):
         return Workflow.objects.filter(owner=self.request.user).order_by('-created_at')
@@ -20,45 +32,77 @@ class WorkflowViewSet(viewsets.ModelViewSet):
     def preview_count(self, request):
         filters = request.data.get('filters', {})
         try:
-            q_obj = build_q_object(filters, request.user)
-            # Match behavior of main Client list: check ALL clients, not just owned ones
-            count = Client.objects.filter(q_obj).count()
+            queryset = matching_clients(filters, request.user)
+            # 'me' resolves per user, so the user is part of the cache key,
+            # and relative dates (today, past_n_days) move with the day
+            key = [filters, timezone.now().date().isoformat() if is_relative(filters) else None]
+            digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+            count = cache.get_or_compute(
+                'client',
+                f'preview_count:{request.user.pk}:{digest}',
+                queryset.count
+            )
             return Response({'count': count})
         except Exception as e:
             return Response({'error': str(e)}, status=400)
 
+    @action(detail=False, methods=['post'])
+    def explain(self, request):
+        """
+        Dry run of a filter: SQL, query plan (with "analyze": true the query is
+        executed for actual row counts), indexes used and sample client ids.
+        """
+        filters = request.data.get('filters', {})
+        analyze = request.data.get('analyze', False) is True
+        try:
+            sample_size = min(int(request.data.get('sample_size', 20)), 100)
+            return Response(explain_queryset(matching_clients(filters, request.user).order_by('id'), analyze, sample_size))
+        except Exception as e:
+            return Response({'error': str(e)}, status=400)
+
     @action(detail=True, methods=['post'])
     def run_matches(self, request, pk=None):
         workflow = self.get_object()
         
         # Override with request data if provided (allows running unsaved changes)
-        filters = request.data.get('filters', workflow.filters)
-        action_config = request.data.get('action_config', workflow.action_config)
-        action_type = request.data.get('action_type', workflow.action_type)
-        
-        if not filters:
+        overrides = {
+            field: request.data.get(field, getattr(workflow, field))
+            for field in ('filters', 'action_config', 'action_type')
+        }
+        if not overrides['filters']:
             return Response({'error': 'Workflow has no filters'}, status=400)
 
+        # Runs of unsaved changes are recorded under a key of their own, so
+        # they are idempotent too but do not count as runs of the saved workflow
+        event_key = 'client'
+        if any(value != getattr(workflow, field) for field, value in overrides.items()):
+            digest = hashlib.sha1(json.dumps(overrides, sort_keys=True).encode()).hexdigest()
+            event_key = f'draft:{digest}'
+
         # Update instance in memory only
-        workflow.filters = filters
-        workflow.action_config = action_config
-        workflow.action_type = action_type
+        for field, value in overrides.items():
+            setattr(workflow, field, value)
 
         try:
-            from crm.services.workflow_service import execute_workflow_action
-            
-            q_obj = build_q_object(workflow.filters, request.user)
-            # Find matching clients (all clients, matching preview logic)
-            clients = Client.objects.filter(q_obj)
-            
+            from crm.services.workflow_events import execute_events, EXECUTE_CHUNK_SIZE
+
+            # Find matching clients (all clients, matching preview logic) that
+            # this workflow has not run for yet, or failed for, so reruns are
+            # incremental and retry failures
+            clients = matching_clients(workflow.filters, request.user).exclude(
+                pk__in=WorkflowExecution.objects.filter(workflow=workflow, event_key=event_key, error='').values('client_id')
+            ).order_by('id')
+
             count = 0
-            for client in clients:
-                try:
-                    execute_workflow_action(workflow, client)
-                    count += 1
-                except Exception as e:
-                    print(f"Error executing retroactive workflow for client {client.id}: {e}")
-            
+            chunk = []
+            for client in clients.iterator(chunk_size=EXECUTE_CHUNK_SIZE):
+                chunk.append((workflow, client, event_key, None))
+                if len(chunk) == EXECUTE_CHUNK_SIZE:
+                    count += execute_events(chunk)
+                    chunk = []
+            if chunk:
+                count += execute_events(chunk)
+
             return Response({'count': count, 'message': f'Workflow executed for {count} clients'})
         except Exception as e:
             return Response({'error': str(e)}, status=400)
@@ -0,0 +1,32 @@
+"""
+Gunicorn settings for the production serving profile.
+
+Run with: gunicorn config.asgi:application -c gunicorn.conf.py
+
+Every value can be overridden from the environment, e.g. WEB_CONCURRENCY=4.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# (2 x cores) + 1 is the usual starting point for I/O bound Django apps. The cap
+# keeps large hosts from opening more DB connections than Postgres allows.
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY',
+    min(multiprocessing.cpu_count() * 2 + 1, int(os.environ.get('GUNICORN_MAX_WORKERS', 9)))
+))
+
+# ASGI workers so async views (Gmail sync/send) do not pin a worker while waiting
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn_worker.UvicornWorker')
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth from long-lived processes
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
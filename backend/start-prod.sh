@@ -0,0 +1,18 @@
+#!/bin/sh
+# Production entry point: prepare static files, cache table and metrics
+# directory, verify the environment, then hand the process over to gunicorn.
+set -e
+
+python manage.py collectstatic --noinput
+if [ "${CRM_CACHE_BACKEND:-locmem}" = "db" ]; then
+    python manage.py createcachetable
+fi
+python manage.py selfcheck
+
+# Workers share their metrics through this directory; series start over
+# with the container
+export METRICS_DIR="${METRICS_DIR:-/tmp/crm-metrics}"
+rm -rf "$METRICS_DIR"
+mkdir -p "$METRICS_DIR"
+
+exec gunicorn config.asgi:application -c gunicorn.conf.py
@@ -1,10 +1,11 @@
 import React, { useState, useRef, useEffect } from 'react';
-import { Download, ChevronDown, FileText, Table as TableIcon } from 'lucide-react';
+import { Download, ChevronDown, FileText, Table as TableIcon, Database, Braces } from 'lucide-react';
 import api from '../../api';
 
 const ExportButton = ({ endpoint, filters, sort, columns, filename = 'export' }) => {
     const [isOpen, setIsOpen] = useState(false);
     const [exporting, setExporting] = useState(false);
+    const [progress, setProgress] = useState(null);
     const dropdownRef = useRef(null);
 
     useEffect(() => {
@@ -21,29 +22,28 @@ const ExportButton = ({ endpoint, filters, sort, columns, filename = 'export' })
         setExporting(true);
         setIsOpen(false);
         try {
-            const params = {
-                format,
-                filters: filters ? JSON.stringify(filters) : undefined,
-                sort: sort ? JSON.stringify(sort) : undefined,
-                columns: columns ? JSON.stringify(columns) : undefined,
-            };
-
             const normalizedEndpoint = endpoint.endsWith('/') ? endpoint : `${endpoint}/`;
             const exportUrl = `${normalizedEndpoint}export-view/`;
 
-            const response = await api.get(exportUrl, {
-                params: {
-                    ...params,
-                    file_format: format,
-                    format: undefined, // Remove the original format param
-                },
-                responseType: 'blob',
+            // Exports render in the background, poll the job until its file is ready
+            let { data: job } = await api.post(exportUrl, {
+                file_format: format,
+                filters: filters ? JSON.stringify(filters) : undefined,
+                sort: sort ? JSON.stringify(sort) : undefined,
+                columns: columns || undefined,
             });
+            while (job.status === 'queued' || job.status === 'running') {
+                setProgress(job.progress);
+                await new Promise((resolve) => setTimeout(resolve, 1000));
+                ({ data: job } = await api.get(`/crm/export-jobs/${job.id}/`));
+            }
+            if (job.status !== 'completed') {
+                throw new Error(job.last_error || `Export ${job.status}`);
+            }
 
-            const url = window.URL.createObjectURL(new Blob([response.data]));
             const link = document.createElement('a');
-            link.href = url;
-            link.setAttribute('download', `${filename}.${format === 'xlsx' ? 'xlsx' : 'csv'}`);
+            link.href = job.download_url;
+            link.setAttribute('download', `${filename}.${format}`);
             document.body.appendChild(link);
             link.click();
             link.remove();
@@ -52,6 +52,7 @@ const ExportButton = ({ endpoint, filters, sort, columns, filename = 'export' })
             alert('Error exporting data. Please try again.');
         } finally {
             setExporting(false);
+            setProgress(null);
         }
     };
 
@@ -67,12 +68,12 @@ const ExportButton = ({ endpoint, filters, sort, columns, filename = 'export' })
                 ) : (
                     <Download size={16} className="mr-2" />
                 )}
-                Export
+                {exporting && progress ? `Export ${Math.round(progress * 100)}%` : 'Export'}
                 <ChevronDown size={14} className={`ml-2 transition-transform ${isOpen ? 'rotate-180' : ''}`} />
             </button>
 
             {isOpen && (
-                <div className="absolute right-0 mt-2 w-40 bg-white rounded-md shadow-lg border border-gray-200 z-50 py-1">
+                <div className="absolute right-0 mt-2 w-48 bg-white rounded-md shadow-lg border border-gray-200 z-50 py-1">
                     <button
                         onClick={() => handleExport('csv')}
                         className="flex items-center w-full px-4 py-2 text-sm text-gray-700 hover:bg-gray-50 transition-colors"
@@ -87,6 +88,20 @@ const ExportButton = ({ endpoint, filters, sort, columns, filename = 'export' })
                         <TableIcon size={14} className="mr-3 text-gray-400" />
                         Excel (.xlsx)
                     </button>
+                    <button
+                        onClick={() => handleExport('parquet')}
+                        className="flex items-center w-full px-4 py-2 text-sm text-gray-700 hover:bg-gray-50 transition-colors"
+                    >
+                        <Database size={14} className="mr-3 text-gray-400" />
+                        Parquet (.parquet)
+                    </button>
+                    <button
+                        onClick={() => handleExport('jsonl')}
+                        className="flex items-center w-full px-4 py-2 text-sm text-gray-700 hover:bg-gray-50 transition-colors"
+                    >
+                        <Braces size={14} className="mr-3 text-gray-400" />
+                        JSON Lines (.jsonl)
+                    </button>
                 </div>
             )}
         </div>
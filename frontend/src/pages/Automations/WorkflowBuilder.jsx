@@ -6,7 +6,19 @@ import FilterBuilder from '../../components/CRM/FilterBuilder';
 
 const TRIGGER_TYPES = [
     { value: 'CLIENT_CREATED', label: 'Client Created' },
-    // Add more triggers
+    { value: 'CLIENT_UPDATED', label: 'Client Updated' },
+    { value: 'TASK_STATUS_CHANGED', label: 'Task Status Changed' },
+    { value: 'TASK_OVERDUE', label: 'Task Overdue' },
+    { value: 'EMAIL_RECEIVED', label: 'Email Received' },
+    { value: 'CLIENT_CREATED_DAYS_AGO', label: 'Days After Client Created' },
+];
+
+const TRACKED_CLIENT_FIELDS = ['name', 'email', 'phone', 'address', 'owner'];
+
+const TASK_STATUSES = [
+    { value: 'todo', label: 'To Do' },
+    { value: 'in_progress', label: 'In Progress' },
+    { value: 'done', label: 'Done' },
 ];
 
 const ACTION_TYPES = [
@@ -33,6 +45,7 @@ const WorkflowBuilder = () => {
     const [name, setName] = useState('');
     const [description, setDescription] = useState('');
     const [triggerType, setTriggerType] = useState('CLIENT_CREATED');
+    const [triggerConfig, setTriggerConfig] = useState({});
     const [actionType, setActionType] = useState('CREATE_TASK');
     const [actionConfig, setActionConfig] = useState({});
     const [isActive, setIsActive] = useState(true);
@@ -45,6 +58,7 @@ const WorkflowBuilder = () => {
     const [triggerMode, setTriggerMode] = useState('ALL'); // 'ALL' or 'CONDITION'
 
     const [matchCount, setMatchCount] = useState(null);
+    const [explanation, setExplanation] = useState(null);
 
     // Email templates data
     const [emailTemplates, setEmailTemplates] = useState([]);
@@ -70,6 +84,16 @@ const WorkflowBuilder = () => {
         }
     };
 
+    const fetchExplanation = async (analyze) => {
+        try {
+            const response = await api.post('/crm/workflows/explain/', { filters, analyze });
+            setExplanation(response.data);
+        } catch (error) {
+            console.error('Error explaining filters:', error);
+            alert(error.response?.data?.error || 'Error explaining filters');
+        }
+    };
+
     const fetchWorkflow = async () => {
         try {
             const response = await api.get(`/crm/workflows/${id}/`);
@@ -77,6 +101,7 @@ const WorkflowBuilder = () => {
             setName(data.name);
             setDescription(data.description);
             setTriggerType(data.trigger_type);
+            setTriggerConfig(data.trigger_config || {});
             setActionType(data.action_type);
             setActionConfig(data.action_config);
             setIsActive(data.is_active);
@@ -116,6 +141,7 @@ const WorkflowBuilder = () => {
             name,
             description,
             trigger_type: triggerType,
+            trigger_config: triggerConfig,
             action_type: actionType,
             action_config: actionConfig,
             is_active: isActive,
@@ -137,6 +163,67 @@ const WorkflowBuilder = () => {
         }
     };
 
+    const toggleTrackedField = (field) => {
+        const fields = triggerConfig.fields || [];
+        const next = fields.includes(field) ? fields.filter(f => f !== field) : [...fields, field];
+        setTriggerConfig({ ...triggerConfig, fields: next });
+    };
+
+    const renderTriggerConfig = () => {
+        if (triggerType === 'CLIENT_UPDATED') {
+            return (
+                <div>
+                    <label className="block text-sm font-medium text-gray-700">Only when these fields change</label>
+                    <div className="mt-2 flex flex-wrap gap-3">
+                        {TRACKED_CLIENT_FIELDS.map(field => (
+                            <label key={field} className="flex items-center text-sm text-gray-700">
+                                <input
+                                    type="checkbox"
+                                    className="mr-1"
+                                    checked={(triggerConfig.fields || []).includes(field)}
+                                    onChange={() => toggleTrackedField(field)}
+                                />
+                                {field}
+                            </label>
+                        ))}
+                    </div>
+                    <p className="mt-1 text-sm text-gray-500">Leave all unchecked to run on any change.</p>
+                </div>
+            );
+        } else if (triggerType === 'TASK_STATUS_CHANGED') {
+            return (
+                <div>
+                    <label className="block text-sm font-medium text-gray-700">New status</label>
+                    <select
+                        value={triggerConfig.to_status || ''}
+                        onChange={(e) => setTriggerConfig({ ...triggerConfig, to_status: e.target.value })}
+                        className="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-indigo-500 focus:ring-indigo-500 sm:text-sm p-2 border"
+                    >
+                        <option value="">Any status</option>
+                        {TASK_STATUSES.map(status => (
+                            <option key={status.value} value={status.value}>{status.label}</option>
+                        ))}
+                    </select>
+                    <p className="mt-1 text-sm text-gray-500">Runs for tasks assigned to you, against the task's client.</p>
+                </div>
+            );
+        } else if (triggerType === 'CLIENT_CREATED_DAYS_AGO') {
+            return (
+                <div>
+                    <label className="block text-sm font-medium text-gray-700">Days after creation</label>
+                    <input
+                        type="number"
+                        min="0"
+                        value={triggerConfig.days ?? ''}
+                        onChange={(e) => setTriggerConfig({ ...triggerConfig, days: e.target.value === '' ? undefined : parseInt(e.target.value, 10) })}
+                        className="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-indigo-500 focus:ring-indigo-500 sm:text-sm p-2 border"
+                    />
+                </div>
+            );
+        }
+        return null;
+    };
+
     const renderActionConfig = () => {
         if (actionType === 'CREATE_TASK') {
             return (
@@ -275,10 +362,27 @@ const WorkflowBuilder = () => {
                                 </div>
 
                                 <div className="space-y-4">
+                                    <div>
+                                        <label className="block text-sm font-medium text-gray-700">Event</label>
+                                        <select
+                                            value={triggerType}
+                                            onChange={(e) => {
+                                                setTriggerType(e.target.value);
+                                                setTriggerConfig({});
+                                            }}
+                                            className="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-indigo-500 focus:ring-indigo-500 sm:text-sm p-2 border"
+                                        >
+                                            {TRIGGER_TYPES.map(trigger => (
+                                                <option key={trigger.value} value={trigger.value}>{trigger.label}</option>
+                                            ))}
+                                        </select>
+                                    </div>
+
+                                    {renderTriggerConfig()}
+
                                     <div className="grid grid-cols-1 sm:grid-cols-2 gap-4">
                                         <button
                                             onClick={() => {
-                                                setTriggerType('CLIENT_CREATED');
                                                 setTriggerMode('ALL');
                                             }}
                                             className={`p-4 border rounded-lg text-left transition-all ${triggerMode === 'ALL'
@@ -286,13 +390,12 @@ const WorkflowBuilder = () => {
                                                 : 'border-gray-200 hover:border-gray-300'
                                                 }`}
                                         >
-                                            <div className="font-medium text-gray-900">Client Created</div>
-                                            <div className="text-sm text-gray-500 mt-1">Run for every new client</div>
+                                            <div className="font-medium text-gray-900">Every Client</div>
+                                            <div className="text-sm text-gray-500 mt-1">Run whenever the event happens</div>
                                         </button>
 
                                         <button
                                             onClick={() => {
-                                                setTriggerType('CLIENT_CREATED');
                                                 setTriggerMode('CONDITION');
                                                 if (!filters || Object.keys(filters).length === 0) {
                                                     setShowFilterBuilder(true);
@@ -362,13 +465,46 @@ const WorkflowBuilder = () => {
                                                         <span className="text-gray-500 italic">No filters applied (runs for all)</span>
                                                     )}
                                                 </div>
-                                                <button
-                                                    onClick={() => setShowFilterBuilder(true)}
-                                                    className="text-sm text-indigo-600 hover:text-indigo-800 font-medium underline"
-                                                >
-                                                    {filters && Object.keys(filters).length > 0 ? 'Edit Filters' : 'Add Filters'}
-                                                </button>
+                                                <div className="flex items-center space-x-3">
+                                                    {filters && Object.keys(filters).length > 0 && (
+                                                        <button
+                                                            onClick={() => fetchExplanation(false)}
+                                                            className="text-sm text-gray-600 hover:text-gray-800 font-medium underline"
+                                                            type="button"
+                                                        >
+                                                            Explain
+                                                        </button>
+                                                    )}
+                                                    <button
+                                                        onClick={() => setShowFilterBuilder(true)}
+                                                        className="text-sm text-indigo-600 hover:text-indigo-800 font-medium underline"
+                                                    >
+                                                        {filters && Object.keys(filters).length > 0 ? 'Edit Filters' : 'Add Filters'}
+                                                    </button>
+                                                </div>
                                             </div>
+                                            {explanation && (
+                                                <div className="mt-4 border-t border-gray-100 pt-4 text-sm space-y-2">
+                                                    <div className="flex flex-wrap gap-4 text-gray-700">
+                                                        <span>Estimated rows: {explanation.estimated_rows ?? 'n/a'}</span>
+                                                        <span>Actual rows: {explanation.actual_rows ?? 'n/a'}</span>
+                                                        {explanation.execution_ms != null && <span>Execution: {explanation.execution_ms} ms</span>}
+                                                        <span>Indexes: {explanation.indexes.length > 0 ? explanation.indexes.join(', ') : 'none (sequential scan)'}</span>
+                                                    </div>
+                                                    <div className="text-gray-500">Sample client ids: {explanation.sample_ids.join(', ') || 'none'}</div>
+                                                    <pre className="bg-gray-50 border rounded p-2 text-xs overflow-x-auto whitespace-pre-wrap">{explanation.sql}</pre>
+                                                    <div className="flex space-x-3">
+                                                        {!explanation.analyzed && explanation.vendor === 'postgresql' && (
+                                                            <button onClick={() => fetchExplanation(true)} className="text-xs text-indigo-600 underline" type="button">
+                                                                Run with ANALYZE (executes the query)
+                                                            </button>
+                                                        )}
+                                                        <button onClick={() => setExplanation(null)} className="text-xs text-gray-500 underline" type="button">
+                                                            Hide
+                                                        </button>
+                                                    </div>
+                                                </div>
+                                            )}
                                         </div>
                                     )}
                                 </div>
@@ -83,7 +83,7 @@ const WorkflowsPage = () => {
                                     <h3 className="font-semibold text-gray-900">{workflow.name}</h3>
                                     <div className="flex items-center space-x-2 text-sm text-gray-500 mt-1">
                                         <span className="bg-gray-100 px-2 py-0.5 rounded text-xs font-medium uppercase tracking-wide">
-                                            IF {workflow.trigger_type.replace('_', ' ')}
+                                            IF {workflow.trigger_type.replaceAll('_', ' ')}
                                         </span>
                                         <span>→</span>
                                         <span className="bg-gray-100 px-2 py-0.5 rounded text-xs font-medium uppercase tracking-wide">
@@ -18,7 +18,7 @@ const ClientDetailPage = () => {
     const [loadingNotes, setLoadingNotes] = useState(true);
     const [newNoteContent, setNewNoteContent] = useState('');
     const [addingNote, setAddingNote] = useState(false);
-    const [emails, setEmails] = useState([]);
+    const [threads, setThreads] = useState([]);
     const [loadingEmails, setLoadingEmails] = useState(true);
     const [syncingEmails, setSyncingEmails] = useState(false);
     const [showEmailModal, setShowEmailModal] = useState(false);
@@ -159,8 +159,9 @@ const ClientDetailPage = () => {
 
     const fetchEmails = async () => {
         try {
-            const response = await api.get('/crm/emails/', { params: { client_id: id } });
-            setEmails(response.data.results || response.data);
+            // Threads by last activity, aggregated on the server
+            const response = await api.get('/crm/email-threads/', { params: { client_id: id } });
+            setThreads(response.data.results || response.data);
             setLoadingEmails(false);
         } catch (error) {
             console.error('Error fetching emails:', error);
@@ -248,12 +249,12 @@ const ClientDetailPage = () => {
                 formData.append('attachments', file);
             });
 
-            const response = await api.post('/crm/emails/send/', formData, {
+            await api.post('/crm/emails/send/', formData, {
                 headers: {
                     'Content-Type': 'multipart/form-data',
                 },
             });
-            setEmails(prev => [response.data, ...prev]);
+            fetchEmails();
             setShowEmailModal(false);
             setEmailForm({ subject: '', body: '', attachments: [], includeSignature: true, thread_id: null, in_reply_to: null });
             setSendingEmail(false);
@@ -264,15 +265,29 @@ const ClientDetailPage = () => {
         }
     };
 
-    const stripHtml = (html) => {
-        if (!html) return '';
-        const doc = new DOMParser().parseFromString(html, 'text/html');
-        return doc.body.textContent || "";
-    };
-
-    const handleViewEmail = (email) => {
+    const handleViewEmail = async (email) => {
+        // The list only has snippets, the body comes with the email itself
         setSelectedEmail(email);
         setShowViewEmailModal(true);
+        try {
+            const response = await api.get(`/crm/emails/${email.id}/`);
+            setSelectedEmail(current => (current && current.id === email.id ? response.data : current));
+        } catch (error) {
+            console.error('Error fetching email:', error);
+        }
+    };
+
+    const handleViewThread = async (thread) => {
+        // Opens the newest message of the thread
+        try {
+            const response = await api.get(`/crm/email-threads/${thread.id}/emails/`);
+            const messages = response.data;
+            if (messages.length > 0) {
+                handleViewEmail(messages[messages.length - 1]);
+            }
+        } catch (error) {
+            console.error('Error fetching thread:', error);
+        }
     };
 
     const handleReply = (email) => {
@@ -281,7 +296,7 @@ const ClientDetailPage = () => {
             : `Re: ${email.subject}`;
 
         // Simple quoting: wrap original body in a blockquote-like structure
-        const quotedBody = `<br><br>On ${new Date(email.timestamp).toLocaleString()}, ${email.from_email} wrote:<br><blockquote>${email.body}</blockquote>`;
+        const quotedBody = `<br><br>On ${new Date(email.timestamp).toLocaleString()}, ${email.from_email} wrote:<br><blockquote>${email.body || email.snippet}</blockquote>`;
 
         setEmailForm({
             subject: replySubject,
@@ -406,27 +421,30 @@ const ClientDetailPage = () => {
                                 <div className="flex justify-center py-4">
                                     <div className="animate-spin rounded-full h-5 w-5 border-b-2 border-indigo-600"></div>
                                 </div>
-                            ) : emails.length > 0 ? (
+                            ) : threads.length > 0 ? (
                                 <div className="space-y-3">
-                                    {emails.map(email => (
+                                    {threads.map(thread => (
                                         <div
-                                            key={email.id}
-                                            onClick={() => handleViewEmail(email)}
+                                            key={thread.id}
+                                            onClick={() => handleViewThread(thread)}
                                             className="p-3 bg-gray-50 rounded-lg border border-gray-100 hover:border-indigo-200 hover:bg-white cursor-pointer transition-all group"
                                         >
                                             <div className="flex justify-between items-start mb-1">
                                                 <h4 className="text-[11px] font-bold text-gray-900 line-clamp-1 group-hover:text-indigo-600 transition-colors">
-                                                    {email.subject || '(No Subject)'}
+                                                    {thread.subject || '(No Subject)'}
                                                 </h4>
+                                                {thread.message_count > 1 && (
+                                                    <span className="ml-2 text-[9px] font-bold text-gray-400">{thread.message_count}</span>
+                                                )}
                                             </div>
                                             <p className="text-[10px] text-gray-500 line-clamp-2 italic">
-                                                {email.body ? stripHtml(email.body).substring(0, 100) : 'No content available.'}
+                                                {thread.snippet || 'No content available.'}
                                             </p>
                                             <div className="mt-2 flex justify-between items-center text-[9px] text-gray-400">
                                                 <span className="truncate max-w-[100px]">
-                                                    {email.from_email === 'me' ? 'Sent' : 'From: ' + email.from_email}
+                                                    {thread.participants.length > 0 ? thread.participants.join(', ') : 'Sent'}
                                                 </span>
-                                                <span>{new Date(email.timestamp).toLocaleDateString()}</span>
+                                                <span>{new Date(thread.last_message_at).toLocaleDateString()}</span>
                                             </div>
                                         </div>
                                     ))}
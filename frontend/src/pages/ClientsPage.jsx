@@ -19,6 +19,7 @@ const ClientsPage = () => {
     const navigate = useNavigate();
     const [clients, setClients] = useState([]);
     const [views, setViews] = useState([]);
+    const [viewCounts, setViewCounts] = useState({});
     const [currentViewId, setCurrentViewId] = useState(null);
     const [showFilterBuilder, setShowFilterBuilder] = useState(false);
     const [activeFilters, setActiveFilters] = useState(null);
@@ -46,6 +47,10 @@ const ClientsPage = () => {
         fetchViews();
     }, []);
 
+    useEffect(() => {
+        if (views.length > 0) fetchViewCounts();
+    }, [views, refreshTrigger]);
+
     useEffect(() => {
         const controller = new AbortController();
         fetchClients(controller.signal);
@@ -69,6 +74,15 @@ const ClientsPage = () => {
         }
     };
 
+    const fetchViewCounts = async () => {
+        try {
+            const response = await api.get('/crm/saved-views/counts/', { params: { view_type: 'client' } });
+            setViewCounts(Object.fromEntries(response.data.map(c => [c.view, c.count])));
+        } catch (error) {
+            console.error('Error fetching view counts:', error);
+        }
+    };
+
     const fetchViews = async () => {
         try {
             const response = await api.get('/crm/saved-views/', { params: { view_type: 'client' } });
@@ -337,6 +351,9 @@ const ClientsPage = () => {
                                                 <>
                                                     <GripVertical size={14} className="mr-1 text-gray-300 opacity-0 group-hover:opacity-100 transition-opacity" />
                                                     {view.name}
+                                                    {viewCounts[view.id] !== undefined && (
+                                                        <span className="ml-2 px-1.5 py-0.5 text-xs rounded-full bg-gray-100 text-gray-600">{viewCounts[view.id]}</span>
+                                                    )}
                                                     {!view.is_system && (
                                                         <div className="ml-2 flex items-center space-x-1 opacity-0 group-hover:opacity-100 transition-opacity">
                                                             <button
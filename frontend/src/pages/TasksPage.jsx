@@ -36,6 +36,7 @@ const TasksPage = () => {
     const [searchParams] = useSearchParams();
     const [tasks, setTasks] = useState([]);
     const [views, setViews] = useState([]);
+    const [viewCounts, setViewCounts] = useState({});
     const [currentViewId, setCurrentViewId] = useState(null);
     const [showFilterBuilder, setShowFilterBuilder] = useState(false);
     const [activeFilters, setActiveFilters] = useState(null);
@@ -63,6 +64,10 @@ const TasksPage = () => {
         fetchViews();
     }, []);
 
+    useEffect(() => {
+        if (views.length > 0) fetchViewCounts();
+    }, [views, refreshTrigger]);
+
     useEffect(() => {
         const controller = new AbortController();
         fetchTasks(controller.signal);
@@ -98,6 +103,15 @@ const TasksPage = () => {
         }
     };
 
+    const fetchViewCounts = async () => {
+        try {
+            const response = await api.get('/crm/saved-views/counts/', { params: { view_type: 'task' } });
+            setViewCounts(Object.fromEntries(response.data.map(c => [c.view, c.count])));
+        } catch (error) {
+            console.error('Error fetching view counts:', error);
+        }
+    };
+
     const fetchViews = async () => {
         try {
             const response = await api.get('/crm/saved-views/', { params: { view_type: 'task' } });
@@ -348,6 +362,9 @@ const TasksPage = () => {
                                                 <>
                                                     <GripVertical size={14} className="mr-1 text-gray-300 opacity-0 group-hover:opacity-100 transition-opacity" />
                                                     {view.name}
+                                                    {viewCounts[view.id] !== undefined && (
+                                                        <span className="ml-2 px-1.5 py-0.5 text-xs rounded-full bg-gray-100 text-gray-600">{viewCounts[view.id]}</span>
+                                                    )}
                                                     {!view.is_system && (
                                                         <div className="ml-2 flex items-center space-x-1 opacity-0 group-hover:opacity-100 transition-opacity">
                                                             <button